@@ -0,0 +1,179 @@
+"""
+Benchmark harness used by the ``benchmark`` management command.
+
+Scenarios are registered with the @scenario decorator in each app's
+benchmarks.py module. Every scenario runs against a throwaway database
+seeded with seed_dataset(), using concurrent in-process test clients, and
+is reported with throughput, latency percentiles and queries per request.
+"""
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+
+SCENARIOS = {}
+
+
+class Scenario:
+    def __init__(self, name, func, login=False, prepare=None, requests=None):
+        self.name = name
+        self.func = func
+        self.login = login
+        self.prepare = prepare
+        self.requests = requests
+
+
+def scenario(name, login=False, prepare=None, requests=None):
+    """
+    Register func(client, data, i) as a benchmark scenario. The function
+    performs one timed operation and returns the response. prepare(client,
+    data, i), if given, runs untimed before each operation. With login=True
+    each worker's client is logged in as a different seeded user.
+    """
+    def decorator(func):
+        SCENARIOS[name] = Scenario(name, func, login=login, prepare=prepare, requests=requests)
+        return func
+    return decorator
+
+
+def isolated_caches(directory):
+    """
+    CACHES with every alias moved out of the project's way: file caches into
+    directory, local-memory caches to their own location and any other
+    backend to a key prefix of its own. Pages built from the benchmark
+    database then never reach a server running against the real one.
+    """
+    isolated = {}
+    for alias, config in settings.CACHES.items():
+        config = dict(config)
+        backend = config['BACKEND']
+        if backend.endswith('.FileBasedCache'):
+            config['LOCATION'] = os.path.join(directory, 'cache', alias)
+        elif backend.endswith('.LocMemCache'):
+            config['LOCATION'] = f"benchmark-{os.path.basename(directory)}-{alias}"
+        else:
+            config['KEY_PREFIX'] = f"benchmark-{os.path.basename(directory)}"
+        isolated[alias] = config
+    return isolated
+
+
+def seed_dataset(products=2000, users=50, orders=500, seed=42):
+    """
+    Fill the (empty) database with a deterministic dataset (see
+    fitpowerhub.datagen) and return the ids scenarios need.
+    """
+    from store.models import Category, Order, Product
+    from .datagen import PASSWORD, WORDS, generate_data
+
+    generate_data(products=products, users=users, orders=orders, seed=seed)
+    return {
+        'product_ids': list(Product.objects.filter(is_active=True).values_list('id', flat=True)),
+        'user_ids': list(User.objects.values_list('id', flat=True)),
+        'order_ids': list(Order.objects.values_list('id', 'user_id')),
+        'category_slugs': list(Category.objects.values_list('slug', flat=True)),
+        'search_terms': [w.lower() for w in WORDS],
+        'password': PASSWORD,
+    }
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def run_scenario(scenario, data, requests=200, concurrency=4):
+    """Run one scenario and return its result summary"""
+    requests = scenario.requests or requests
+    latencies = []
+    queries = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(worker_id):
+        # Server errors (e.g. "database is locked") count as errors instead of raising
+        client = Client(raise_request_exception=False)
+        if scenario.login:
+            user = User.objects.get(id=data['user_ids'][worker_id % len(data['user_ids'])])
+            client.force_login(user)
+        local_latencies = []
+        local_queries = []
+        local_errors = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            if scenario.prepare:
+                scenario.prepare(client, data, i)
+            query_counter = _QueryCounter()
+            with connection.execute_wrapper(query_counter):
+                start = time.perf_counter()
+                response = scenario.func(client, data, i)
+                elapsed = time.perf_counter() - start
+            if response is not None and response.status_code >= 400:
+                local_errors += 1
+            local_latencies.append(elapsed)
+            local_queries.append(query_counter.queries)
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            queries.extend(local_queries)
+            errors[0] += local_errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'errors': errors[0],
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies) * 1000, 3) if latencies else 0.0,
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+        },
+        'queries_per_request': {
+            'mean': round(statistics.mean(queries), 2) if queries else 0.0,
+            'max': max(queries) if queries else 0,
+        },
+    }
+
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def compare_results(current, previous):
+    """Yield (scenario, metric, old, new) for metrics present in both runs"""
+    for name, result in current['scenarios'].items():
+        old = previous.get('scenarios', {}).get(name)
+        if not old:
+            continue
+        yield name, 'throughput_rps', old['throughput_rps'], result['throughput_rps']
+        yield name, 'p95_ms', old['latency_ms']['p95'], result['latency_ms']['p95']
+        yield name, 'queries', old['queries_per_request']['mean'], result['queries_per_request']['mean']
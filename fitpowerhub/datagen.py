@@ -0,0 +1,341 @@
+"""
+Synthetic data generator used by the ``generate_data`` management command.
+
+Rows are built in fixed-size chunks with primary keys assigned up front, so
+every chunk can be generated and inserted on its own (optionally in a worker
+process) and the result only depends on the seed, never on the number of
+workers. Each chunk gets its own random.Random seeded from (seed, table,
+chunk number).
+"""
+import bisect
+import itertools
+import multiprocessing
+import random
+import time
+import uuid
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils.text import slugify
+
+from nutrition.calculators import calculate_bmr, calculate_target_calories, calculate_tdee
+from nutrition.models import MealPlan
+from store.models import Cart, CartItem, Category, Order, OrderItem, Product, UserProfile
+
+PASSWORD = 'generated-pass-123'
+
+CATEGORY_NAMES = ['Protein', 'Pre-Workout', 'Vitamins', 'Snacks', 'Apparel', 'Weights', 'Cardio']
+
+# Share of the catalog per product type, and the Category rows each type uses
+TYPE_WEIGHTS = [
+    (Product.SUPPLEMENT, 0.40, ['Protein', 'Pre-Workout', 'Vitamins']),
+    (Product.FOOD, 0.20, ['Snacks']),
+    (Product.CLOTHING, 0.25, ['Apparel']),
+    (Product.EQUIPMENT, 0.15, ['Weights', 'Cardio']),
+]
+
+# Median price and spread (lognormal) per product type
+PRICES = {
+    Product.SUPPLEMENT: (35, 0.4),
+    Product.FOOD: (8, 0.5),
+    Product.CLOTHING: (30, 0.5),
+    Product.EQUIPMENT: (80, 0.8),
+}
+
+WORDS = ['Whey', 'Iso', 'Power', 'Lean', 'Mass', 'Pro', 'Elite', 'Pure', 'Max', 'Core', 'Fit', 'Ultra']
+
+# Exponent of the Zipf distribution of product popularity in carts and orders
+POPULARITY_EXPONENT = 1.1
+
+# Set in the parent before workers are forked: {'prices': {...}, 'cum_weights': [...], 'ranked_ids': [...]}
+_shared = {}
+
+
+def _rng(seed, table, chunk):
+    return random.Random(f"{seed}:{table}:{chunk}")
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _pick_popular(rng, k):
+    """k distinct product ids drawn with power-law popularity"""
+    ranked = _shared['ranked_ids']
+    cum_weights = _shared['cum_weights']
+    total = cum_weights[-1]
+    picked = {}
+    for _ in range(k * 3):
+        index = bisect.bisect_left(cum_weights, rng.random() * total)
+        picked[ranked[min(index, len(ranked) - 1)]] = True
+        if len(picked) == k:
+            break
+    return list(picked)
+
+
+def _product(rng, pk, category_ids):
+    roll = rng.random()
+    for code, weight, names in TYPE_WEIGHTS:
+        roll -= weight
+        if roll <= 0:
+            break
+    median, sigma = PRICES[code]
+    price = Decimal(round(min(rng.lognormvariate(0, sigma) * median, 9999), 2)).quantize(Decimal('0.01'))
+
+    nutrition = {}
+    if code == Product.SUPPLEMENT:
+        protein, carbs, fat = rng.randint(15, 30), rng.randint(0, 10), rng.randint(0, 5)
+    elif code == Product.FOOD:
+        protein, carbs, fat = rng.randint(2, 25), rng.randint(5, 45), rng.randint(1, 20)
+    else:
+        protein = None
+    if protein is not None:
+        nutrition = {
+            'protein_per_serving': protein,
+            'carbs_per_serving': carbs,
+            'fat_per_serving': fat,
+            'calories_per_serving': protein * 4 + carbs * 4 + fat * 9,
+        }
+
+    name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {pk}"
+    product = Product(
+        pk=pk,
+        name=name,
+        slug=f"{slugify(name)}-{pk}",
+        description=f"{name}: {rng.choice(WORDS).lower()} {rng.choice(WORDS).lower()} for your training",
+        price=max(price, Decimal('0.50')),
+        category=code,
+        main_category_id=category_ids[rng.choice(names)],
+        stock=min(int(rng.paretovariate(1.5) * 10), 1000) if rng.random() > 0.05 else 0,
+        is_active=rng.random() > 0.02,
+        **nutrition
+    )
+    # bulk_create skips save()
+    product.update_value_metrics()
+    return product
+
+
+def _users_chunk(seed, chunk, start, count, password):
+    rng = _rng(seed, 'users', chunk)
+    users = []
+    profiles = []
+    for pk in range(start, start + count):
+        users.append(User(
+            pk=pk, username=f"gen{pk}", email=f"gen{pk}@example.com", password=password,
+            first_name=rng.choice(WORDS), last_name=rng.choice(WORDS)
+        ))
+        gender = rng.choice('MF')
+        height = round(rng.gauss(178 if gender == 'M' else 165, 8), 1)
+        profiles.append(UserProfile(
+            user_id=pk, gender=gender, height=height,
+            weight=round(max(rng.gauss(height - 100, 12), 40), 1),
+            fitness_goal=rng.choice(['Lose weight', 'Build muscle', 'Stay fit', 'Run a marathon'])
+        ))
+    User.objects.bulk_create(users)
+    # bulk_create skips post_save, so profiles are inserted here
+    UserProfile.objects.bulk_create(profiles)
+    return {'users': len(users), 'profiles': len(profiles)}
+
+
+def _products_chunk(seed, chunk, start, count, category_ids):
+    rng = _rng(seed, 'products', chunk)
+    products = [_product(rng, pk, category_ids) for pk in range(start, start + count)]
+    Product.objects.bulk_create(products)
+    return {'products': len(products)}
+
+
+def _order_size(rng):
+    # Most orders hold one to three products, a few hold many more
+    return min(1 + int(rng.expovariate(0.7)), 12)
+
+
+def _orders_chunk(seed, chunk, start, count, user_ids):
+    rng = _rng(seed, 'orders', chunk)
+    prices = _shared['prices']
+    orders = []
+    items = []
+    for pk in range(start, start + count):
+        total = Decimal('0.00')
+        for product_id in _pick_popular(rng, _order_size(rng)):
+            quantity = 1 + int(rng.expovariate(1.5))
+            items.append(OrderItem(order_id=pk, product_id=product_id, quantity=quantity, price=prices[product_id]))
+            total += prices[product_id] * quantity
+        orders.append(Order(
+            pk=pk,
+            # Random high bits, pk in the low ones: reproducible per seed, yet
+            # unique when the same seed is generated into a table again
+            order_number=uuid.UUID(int=rng.getrandbits(64) << 64 | pk, version=4),
+            user_id=rng.choice(user_ids),
+            status=rng.choices([s for s, _ in Order.STATUS_CHOICES], weights=[10, 10, 15, 60, 5])[0],
+            total_amount=total,
+            shipping_address=f"{rng.randint(1, 999)} {rng.choice(WORDS)} Street",
+        ))
+    Order.objects.bulk_create(orders)
+    OrderItem.objects.bulk_create(items)
+    return {'orders': len(orders), 'order_items': len(items)}
+
+
+def _carts_chunk(seed, chunk, start, count, user_ids):
+    rng = _rng(seed, 'carts', chunk)
+    carts = []
+    items = []
+    for pk, user_id in zip(range(start, start + count), user_ids):
+        carts.append(Cart(pk=pk, user_id=user_id))
+        for product_id in _pick_popular(rng, rng.randint(1, 6)):
+            items.append(CartItem(cart_id=pk, product_id=product_id, quantity=rng.randint(1, 3)))
+    Cart.objects.bulk_create(carts)
+    CartItem.objects.bulk_create(items)
+    return {'carts': len(carts), 'cart_items': len(items)}
+
+
+def _meal_plans_chunk(seed, chunk, start, count, user_ids):
+    rng = _rng(seed, 'meal_plans', chunk)
+    goals = [code for code, _ in MealPlan.GOAL_CHOICES]
+    levels = [level for level, _ in MealPlan.ACTIVITY_CHOICES]
+    plans = []
+    for pk in range(start, start + count):
+        age = rng.randint(16, 70)
+        height = round(min(max(rng.gauss(172, 10), 140), 210), 1)
+        weight = round(min(max(rng.gauss(height - 100, 14), 45), 180), 1)
+        goal = rng.choice(goals)
+        activity_level = rng.choice(levels)
+        bmr = calculate_bmr(age, weight, height, rng.choice('MF'))
+        tdee = calculate_tdee(bmr, activity_level)
+        plans.append(MealPlan(
+            pk=pk, user_id=rng.choice(user_ids), name=f"Plan {pk}", goal=goal,
+            activity_level=activity_level, age=age, weight=weight, height=height,
+            bmr=bmr, tdee=tdee, target_calories=calculate_target_calories(tdee, goal),
+        ))
+    MealPlan.objects.bulk_create(plans)
+    return {'meal_plans': len(plans)}
+
+
+def _run_chunk(task):
+    func, args = task
+    connections.close_all()
+    with transaction.atomic():
+        return func(*args)
+
+
+def _chunks(total, batch_size, first_pk):
+    for chunk, offset in enumerate(range(0, total, batch_size)):
+        yield chunk, first_pk + offset, min(batch_size, total - offset)
+
+
+def _run_phase(tasks, workers):
+    counts = {}
+    if workers > 1:
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            results = pool.map(_run_chunk, tasks, chunksize=1)
+    else:
+        results = map(_run_chunk, tasks)
+    for result in results:
+        for table, n in result.items():
+            counts[table] = counts.get(table, 0) + n
+    return counts
+
+
+def _reset_sequences(models):
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def _remove_generated(first_ids):
+    """Delete the rows a failed run inserted, newest tables first"""
+    for model in reversed(list(first_ids)):
+        model.objects.filter(pk__gte=first_ids[model]).delete()
+
+
+def generate_data(products=10000, users=1000, orders=20000, carts=None, meal_plans=None,
+                  seed=42, batch_size=5000, workers=1, report=None):
+    """
+    Insert synthetic rows and return {'counts': {table: rows}, 'seconds': s}.
+    carts defaults to a quarter of the users and meal_plans to half of them.
+    report(phase, counts, seconds), if given, is called after every phase.
+    Rows are added to whatever is already in the database; if a phase fails,
+    the rows inserted by earlier phases are deleted again.
+    """
+    carts = users // 4 if carts is None else carts
+    meal_plans = users // 2 if meal_plans is None else meal_plans
+    if (orders or carts) and not products and not Product.objects.exists():
+        raise ValueError("Orders and carts need at least one product")
+    if (orders or meal_plans) and not users and not User.objects.exists():
+        raise ValueError("Orders and meal plans need at least one user")
+    started = time.perf_counter()
+    counts = {}
+    # Chunks commit on their own (possibly in other processes), so a failed
+    # run is undone by deleting from the first id each table got
+    first_ids = {}
+
+    def phase(name, tasks):
+        phase_start = time.perf_counter()
+        phase_counts = _run_phase(list(tasks), workers)
+        for table, n in phase_counts.items():
+            counts[table] = counts.get(table, 0) + n
+        if report:
+            report(name, phase_counts, time.perf_counter() - phase_start)
+
+    def first_id(model):
+        first_ids[model] = _next_id(model)
+        return first_ids[model]
+
+    category_ids = {}
+    for name in CATEGORY_NAMES:
+        category, _ = Category.objects.get_or_create(slug=slugify(name), defaults={'name': name})
+        category_ids[name] = category.pk
+
+    password = make_password(PASSWORD)
+    try:
+        first_user = first_id(User)
+        phase('users', (
+            (_users_chunk, (seed, chunk, start, count, password))
+            for chunk, start, count in _chunks(users, batch_size, first_user)
+        ))
+        new_user_ids = list(range(first_user, first_user + users))
+        # Carts are one per user, so only users without one can get a new cart
+        cart_user_ids = new_user_ids[:carts]
+
+        phase('products', (
+            (_products_chunk, (seed, chunk, start, count, category_ids))
+            for chunk, start, count in _chunks(products, batch_size, first_id(Product))
+        ))
+        _reset_sequences([User, Product])
+
+        # Product popularity follows a Zipf law over a seeded shuffle of the catalog
+        _shared['prices'] = dict(Product.objects.values_list('id', 'price').iterator(chunk_size=10000))
+        ranked = sorted(_shared['prices'])
+        random.Random(f"{seed}:popularity").shuffle(ranked)
+        _shared['ranked_ids'] = ranked
+        _shared['cum_weights'] = list(itertools.accumulate(
+            1 / (rank ** POPULARITY_EXPONENT) for rank in range(1, len(ranked) + 1)
+        ))
+        all_user_ids = new_user_ids or list(User.objects.values_list('id', flat=True))
+
+        phase('orders', (
+            (_orders_chunk, (seed, chunk, start, count, all_user_ids))
+            for chunk, start, count in _chunks(orders, batch_size, first_id(Order))
+        ))
+        first_cart = first_id(Cart)
+        phase('carts', (
+            (_carts_chunk, (seed, chunk, start, count, cart_user_ids[start - first_cart:start - first_cart + count]))
+            for chunk, start, count in _chunks(len(cart_user_ids), batch_size, first_cart)
+        ))
+        phase('meal_plans', (
+            (_meal_plans_chunk, (seed, chunk, start, count, all_user_ids))
+            for chunk, start, count in _chunks(meal_plans, batch_size, first_id(MealPlan))
+        ))
+    except BaseException:
+        _remove_generated(first_ids)
+        raise
+    finally:
+        _shared.clear()
+    _reset_sequences([Order, Cart, MealPlan])
+
+    return {'counts': counts, 'seconds': time.perf_counter() - started}
@@ -0,0 +1,32 @@
+"""
+SQLite connection tuning. configure_sqlite() runs on every new connection
+and applies the pragmas of the active DB_PROFILE (see SQLITE_PRAGMAS in
+settings). Connected in StoreConfig.ready().
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+# Pragmas that change the database file rather than the connection; replicas
+# are read-only copies refreshed by sync_replicas and keep their own mode
+FILE_PRAGMAS = {'journal_mode'}
+
+
+def sqlite_pragmas(alias=None):
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {}).get(getattr(settings, 'DB_PROFILE', None), {})
+    if alias in getattr(settings, 'DATABASE_REPLICAS', []):
+        pragmas = {name: value for name, value in pragmas.items() if name not in FILE_PRAGMAS}
+    return pragmas
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(connection.alias)
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+connection_created.connect(configure_sqlite, dispatch_uid='fitpowerhub.db.configure_sqlite')
@@ -0,0 +1,240 @@
+import json
+import os
+import socket
+import threading
+import time
+
+# Values up to 2 * SUB_BUCKETS are counted exactly; above that every power
+# of two is split into SUB_BUCKETS linear buckets, so the relative error of
+# a reported quantile stays under 1 / SUB_BUCKETS (about 6%).
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_BIT_LENGTH = 40
+BUCKET_COUNT = 2 * SUB_BUCKETS + (MAX_BIT_LENGTH - SUB_BUCKET_BITS - 1) * SUB_BUCKETS
+
+
+def bucket_index(value):
+    value = max(int(value), 0)
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = min(value.bit_length(), MAX_BIT_LENGTH) - SUB_BUCKET_BITS - 1
+    sub = min(value >> shift, 2 * SUB_BUCKETS - 1) - SUB_BUCKETS
+    return 2 * SUB_BUCKETS + (shift - 1) * SUB_BUCKETS + sub
+
+
+def bucket_bounds(index):
+    """(lowest, highest) integer value counted in a bucket"""
+    if index < 2 * SUB_BUCKETS:
+        return index, index
+    shift = (index - 2 * SUB_BUCKETS) // SUB_BUCKETS + 1
+    sub = (index - 2 * SUB_BUCKETS) % SUB_BUCKETS + SUB_BUCKETS
+    return sub << shift, ((sub + 1) << shift) - 1
+
+
+class Histogram:
+    """
+    Fixed-memory histogram of non-negative integers (HDR-style log-linear
+    buckets). Record microseconds for timings and plain counts otherwise.
+    """
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        value = max(int(value), 0)
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for index, n in enumerate(other.counts):
+            if n:
+                self.counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                low, high = bucket_bounds(index)
+                return min((low + high) / 2, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'counts': {index: n for index, n in enumerate(self.counts) if n},
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for index, n in data['counts'].items():
+            histogram.counts[int(index)] = n
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.max = data['max']
+        return histogram
+
+
+SERIES = ('duration_us', 'db_time_us', 'queries')
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, but owned by another user
+    return True
+
+
+class RequestMetrics:
+    """
+    Per-view request histograms for this process. publish() writes them to
+    a per-process JSON file (<host>-<pid>.json) in a shared directory;
+    load_all() merges the files of every live worker. A process removes its
+    file when it exits (see unpublish()); files left by processes that died
+    without doing so are deleted by load_all(): on this host once the PID
+    is gone, from other hosts once they are stale_after seconds old.
+    """
+
+    def __init__(self, directory, publish_interval=5.0, extra=None, stale_after=3600):
+        self.directory = directory
+        self.publish_interval = publish_interval
+        self.stale_after = stale_after
+        # Callable returning extra JSON-serializable data to publish
+        self.extra = extra
+        self.views = {}
+        self._lock = threading.Lock()
+        self._last_publish = 0
+
+    def record(self, view, duration, db_time, queries):
+        with self._lock:
+            series = self.views.get(view)
+            if series is None:
+                series = self.views[view] = {name: Histogram() for name in SERIES}
+            series['duration_us'].record(duration * 1e6)
+            series['db_time_us'].record(db_time * 1e6)
+            series['queries'].record(queries)
+
+        if time.monotonic() - self._last_publish >= self.publish_interval:
+            self.publish()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view: {name: histogram.to_dict() for name, histogram in series.items()}
+                for view, series in self.views.items()
+            }
+
+    def publish(self):
+        self._last_publish = time.monotonic()
+        if not self.views:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        data = {'views': self.snapshot(), 'extra': self.extra() if self.extra else {}}
+        filename = self._filename()
+        tmp = f"{filename}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, filename)
+
+    def unpublish(self):
+        """Remove this process's file, e.g. at exit; its numbers leave the merged totals"""
+        try:
+            os.remove(self._filename())
+        except FileNotFoundError:
+            pass
+
+    def _filename(self):
+        return os.path.join(self.directory, f"{socket.gethostname()}-{os.getpid()}.json")
+
+    def _is_stale(self, path, name):
+        """True for the file of a process that is gone (or, on another host, silent too long)"""
+        host, _, pid = name[:-len('.json')].rpartition('-')
+        if host == socket.gethostname() and pid.isdigit():
+            return not _process_alive(int(pid))
+        try:
+            return time.time() - os.path.getmtime(path) > self.stale_after
+        except OSError:
+            return True
+
+    def load_all(self):
+        """Merge the published metrics of every process: ({view: {series: Histogram}}, [extra, ...])"""
+        merged = {}
+        extras = []
+        if not os.path.isdir(self.directory):
+            return merged, extras
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            if self._is_stale(path, name):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            extras.append(data.get('extra', {}))
+            for view, series in data['views'].items():
+                target = merged.setdefault(view, {name: Histogram() for name in SERIES})
+                for series_name, histogram in series.items():
+                    target[series_name].merge(Histogram.from_dict(histogram))
+        return merged, extras
+
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(views, cache_stats=None):
+    """Render merged view histograms (and cache counters) in Prometheus text format"""
+    lines = []
+    metrics = [
+        ('fitpowerhub_request_duration_seconds', 'Request wall time per view', 'duration_us', 1e-6),
+        ('fitpowerhub_request_db_seconds', 'Database time per request per view', 'db_time_us', 1e-6),
+        ('fitpowerhub_request_db_queries', 'Database queries per request per view', 'queries', 1),
+    ]
+    for metric, help_text, series, scale in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} summary")
+        for view in sorted(views):
+            histogram = views[view][series]
+            label = f'view="{_label(view)}"'
+            for q in QUANTILES:
+                lines.append(f'{metric}{{{label},quantile="{q}"}} {histogram.quantile(q) * scale:g}')
+            lines.append(f"{metric}_sum{{{label}}} {histogram.total * scale:g}")
+            lines.append(f"{metric}_count{{{label}}} {histogram.count}")
+
+    if cache_stats:
+        lines.append("# HELP fitpowerhub_cache_lookups_total Tiered cache lookups by namespace and result")
+        lines.append("# TYPE fitpowerhub_cache_lookups_total counter")
+        for namespace in sorted(cache_stats):
+            for result in ('local_hits', 'shared_hits', 'misses'):
+                value = cache_stats[namespace].get(result, 0)
+                lines.append(
+                    f'fitpowerhub_cache_lookups_total{{namespace="{_label(namespace)}",result="{result}"}} {value}'
+                )
+    return "\n".join(lines) + "\n"
@@ -1,19 +1,377 @@
+import atexit
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.messages.storage.session import SessionStorage
+from django.core import signing
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
 from django.utils import timezone
-from store.models import UserActivity
+from store.cache import tiered_cache
+from store.models import Cart, UserActivity
+from .metrics import RequestMetrics
+from .page_cache import pack, page_cache_key, unpack
+from .routers import disable_replica_reads, enable_replica_reads, is_replica_view, reset_replica_reads
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """
+    In-memory buffer of UserActivity rows written with bulk_create.
+
+    A background thread flushes the buffer every flush_interval seconds, or
+    sooner once batch_size rows are waiting. When max_size rows are already
+    queued new rows are dropped and counted instead of blocking the request.
+    Pending rows are flushed when the process exits.
+    """
+
+    def __init__(self, max_size=10000, batch_size=500, flush_interval=2.0, background=True):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self.dropped = 0
+        self.written = 0
+        self._items = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def add(self, activity):
+        """Queue an activity; returns False if it was dropped"""
+        with self._lock:
+            if len(self._items) >= self.max_size:
+                self.dropped += 1
+                return False
+            self._items.append(activity)
+            batch_ready = len(self._items) >= self.batch_size
+
+        if self.background:
+            self._ensure_thread()
+            if batch_ready:
+                self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Write every queued activity to the database"""
+        with self._lock:
+            items, self._items = self._items, []
+
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            try:
+                UserActivity.objects.bulk_create(batch)
+            except DatabaseError:
+                logger.exception("Could not write %s user activities", len(batch))
+                with self._lock:
+                    self.dropped += len(batch)
+            else:
+                with self._lock:
+                    self.written += len(batch)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                if self._pid is None:
+                    atexit.register(self.flush)
+                # Forked worker: the parent's thread doesn't exist here
+                self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                connections.close_all()
+
+
+_buffer_config = getattr(settings, 'USER_ACTIVITY_BUFFER', {})
+
+activity_buffer = ActivityBuffer(
+    max_size=_buffer_config.get('MAX_SIZE', 10000),
+    batch_size=_buffer_config.get('BATCH_SIZE', 500),
+    flush_interval=_buffer_config.get('FLUSH_INTERVAL', 2.0),
+)
+
+
+def skip_activity_tracking(view):
+    """Mark a view whose requests are not recorded, so it never loads the session or user"""
+    view.skip_activity_tracking = True
+    return view
+
 
 class UserActivityMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
-        
+
     def __call__(self, request):
+        request._skip_activity_tracking = False
         response = self.get_response(request)
-        
-        if request.user.is_authenticated:
-            UserActivity.objects.create(
-                user=request.user,
-                path=request.path,
+
+        if not request._skip_activity_tracking and request.user.is_authenticated:
+            activity_buffer.add(UserActivity(
+                user_id=request.user.pk,
+                path=request.path[:255],
                 method=request.method,
                 timestamp=timezone.now()
-            )
-        
-        return response
\ No newline at end of file
+            ))
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._skip_activity_tracking = getattr(view_func, 'skip_activity_tracking', False)
+
+
+_metrics_config = getattr(settings, 'REQUEST_METRICS', {})
+
+request_metrics = RequestMetrics(
+    directory=_metrics_config.get('DIRECTORY', 'metrics'),
+    publish_interval=_metrics_config.get('PUBLISH_INTERVAL', 5.0),
+    extra=lambda: {'cache': tiered_cache.stats()['namespaces']},
+    stale_after=_metrics_config.get('STALE_AFTER', 3600),
+)
+atexit.register(request_metrics.unpublish)
+
+
+class QueryCounter:
+    """execute_wrapper that counts queries and the time spent in them"""
+
+    def __init__(self):
+        self.queries = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.queries += 1
+
+
+class RequestMetricsMiddleware:
+    """
+    Record wall time, query count and query time of every request, keyed by
+    the resolved URL name, into request_metrics (see fitpowerhub.metrics).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else '<unresolved>'
+        request_metrics.record(view, duration, counter.time, counter.queries)
+
+        return response
+
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_SALT = 'fitpowerhub.profile'
+
+
+def make_profile_token():
+    """Signed value for the X-Profile header that forces a request to be profiled"""
+    return signing.TimestampSigner(salt=PROFILE_SALT).sign('profile')
+
+
+def save_profile(profiler, directory, view, max_files):
+    """
+    Dump a profile to <directory>/<view>/ and delete the oldest files of
+    that view beyond max_files.
+    """
+    view_dir = os.path.join(directory, view.replace('/', '_').replace(':', '_'))
+    os.makedirs(view_dir, exist_ok=True)
+    filename = os.path.join(view_dir, f"{time.time():.6f}-{os.getpid()}.prof")
+    profiler.dump_stats(filename)
+
+    files = sorted(
+        (os.path.join(view_dir, name) for name in os.listdir(view_dir) if name.endswith('.prof')),
+        key=os.path.getmtime
+    )
+    for old in files[:-max_files]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return filename
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of requests with cProfile (opt-in, see PROFILING in
+    settings). A request carrying a valid signed X-Profile header (see
+    make_profile_token) is always profiled. Summarize the results with the
+    profile_summary management command.
+    """
+
+    def __init__(self, get_response):
+        config = getattr(settings, 'PROFILING', {})
+        self.get_response = get_response
+        self.enabled = config.get('ENABLED', False)
+        self.sample_rate = config.get('SAMPLE_RATE', 0.0)
+        self.directory = config.get('DIRECTORY', 'profiles')
+        self.max_files = config.get('MAX_FILES_PER_VIEW', 50)
+        self.token_max_age = config.get('TOKEN_MAX_AGE', 3600)
+
+    def should_profile(self, request):
+        token = request.META.get(PROFILE_HEADER)
+        if token:
+            try:
+                signing.TimestampSigner(salt=PROFILE_SALT).unsign(token, max_age=self.token_max_age)
+                return True
+            except signing.BadSignature:
+                pass
+        return self.enabled and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        try:
+            save_profile(profiler, self.directory, view, self.max_files)
+        except OSError:
+            logger.exception("Could not save profile for %s", view)
+        return response
+
+
+PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Enable replica reads (see fitpowerhub.routers) for safe requests to
+    replica-eligible views. Any other request pins the client to the
+    primary for REPLICA_PIN_SECONDS so it reads its own writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+
+    def __call__(self, request):
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                reset_replica_reads(request._replica_token)
+
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+                and is_replica_view(view_func)):
+            request._replica_token = enable_replica_reads()
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Serve views marked with @cache_anonymous_page from the page cache (see
+    fitpowerhub.page_cache) for anonymous GET/HEAD requests that have no
+    pending messages and no non-empty cart. Must come after the session,
+    CSRF, authentication, replica routing and messages middleware.
+    """
+
+    def __init__(self, get_response):
+        config = getattr(settings, 'PAGE_CACHE', {})
+        self.get_response = get_response
+        self.enabled = config.get('ENABLED', True)
+        self.timeout = config.get('TIMEOUT', 300)
+        self.cache = caches[config.get('CACHE_ALIAS', 'default')]
+
+    def __call__(self, request):
+        request._page_cache_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._page_cache_token is not None:
+                reset_replica_reads(request._page_cache_token)
+
+        key = getattr(request, '_page_cache_key', None)
+        if key is not None and self.is_cacheable(request, response):
+            self.cache.set(key, pack(response), self.timeout)
+            response['X-Page-Cache'] = 'miss'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not (self.enabled and request.method in ('GET', 'HEAD')
+                and getattr(view_func, 'cache_anonymous_page', False)
+                and self.is_stateless_visitor(request)):
+            return None
+
+        key = page_cache_key(request, tiered_cache.get_version('catalog'))
+        entry = self.cache.get(key)
+        if entry is None:
+            request._page_cache_key = key
+            # The page is stored under the current catalog version, so build
+            # it from the primary rather than a replica that may lag behind
+            request._page_cache_token = disable_replica_reads()
+            return None
+
+        response = HttpResponse(unpack(entry, get_token(request)), content_type=entry['content_type'])
+        response['X-Page-Cache'] = 'hit'
+        return response
+
+    def is_stateless_visitor(self, request):
+        """Anonymous, with nothing visitor-specific to show (messages, cart)"""
+        if request.user.is_authenticated or CookieStorage.cookie_name in request.COOKIES:
+            return False
+        session = request.session
+        if session.session_key is None:
+            # No session: no session messages and no anonymous cart
+            return True
+        if SessionStorage.session_key in session:
+            return False
+        return not Cart.objects.filter(
+            session_key=session.session_key, user=None, items__isnull=False
+        ).exists()
+
+    def is_cacheable(self, request, response):
+        messages = getattr(request, '_messages', None)
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and 'private' not in response.get('Cache-Control', '')
+            and not request.user.is_authenticated
+            and not getattr(request.session, 'modified', False)
+            and not getattr(messages, 'added_new', False)
+        )
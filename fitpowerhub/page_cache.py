@@ -0,0 +1,52 @@
+"""
+Full-page cache for anonymous visitors, used by AnonymousPageCacheMiddleware.
+
+Views opt in with @cache_anonymous_page. Pages are keyed by host, path and
+normalized query string under the current 'catalog' namespace version of
+store.cache.tiered_cache, so the Product/Category signals that invalidate
+the catalog also retire every cached page. Bodies are stored
+zlib-compressed, with CSRF tokens replaced by a placeholder that is filled
+in per request.
+"""
+import hashlib
+import re
+import zlib
+from urllib.parse import urlencode
+
+CSRF_PLACEHOLDER = b'__page_cache_csrf_token__'
+
+_CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[A-Za-z0-9]+(")')
+
+
+def cache_anonymous_page(view):
+    """Mark a view whose anonymous GET responses may be served from the page cache"""
+    view.cache_anonymous_page = True
+    return view
+
+
+def normalized_query(query_dict):
+    """Sorted query string without empty values, so equivalent URLs share a key"""
+    items = sorted(
+        (key, value)
+        for key, values in query_dict.lists()
+        for value in values
+        if value != ''
+    )
+    return urlencode(items)
+
+
+def page_cache_key(request, version):
+    raw = f"{request.get_host()}:{request.path}?{normalized_query(request.GET)}"
+    return f"page:{version}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def pack(response):
+    body = _CSRF_INPUT.sub(rb'\g<1>' + CSRF_PLACEHOLDER + rb'\g<2>', response.content)
+    return {
+        'content_type': response['Content-Type'],
+        'body': zlib.compress(body, 6),
+    }
+
+
+def unpack(entry, csrf_token):
+    return zlib.decompress(entry['body']).replace(CSRF_PLACEHOLDER, csrf_token.encode())
@@ -0,0 +1,226 @@
+"""
+Query budgets for every named route.
+
+QUERY_BUDGETS maps a URL name to the most queries (and milliseconds) a
+request may take on a cold cache against the small seeded dataset used by
+the tests (see fitpowerhub.datagen). QueryBudgetMixin.assertWithinBudget()
+fails with the offending SQL listed, and the EXPLAIN QUERY PLAN of every
+query when QUERY_BUDGET_EXPLAIN is set; full table scans are flagged.
+"""
+import json
+import re
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from store.cache import tiered_cache
+
+# Namespaces whose routes are not budgeted
+EXEMPT_NAMESPACES = {'admin'}
+
+
+class Budget:
+    """
+    args names objects from budget_objects() passed to reverse(); params is
+    the query string; data is sent as a form (or JSON with json=True).
+    """
+
+    def __init__(self, queries, ms, method='GET', args=(), params=None, data=None, json=False,
+                 login=False, staff=False):
+        self.queries = queries
+        self.ms = ms
+        self.method = method
+        self.args = args
+        self.params = params
+        self.data = data
+        self.json = json
+        self.login = login or staff
+        self.staff = staff
+
+
+QUERY_BUDGETS = {
+    # fitpowerhub.urls
+    'home': Budget(queries=3, ms=500),
+    'metrics': Budget(queries=2, ms=500, staff=True),
+    'login': Budget(queries=0, ms=300),
+    'logout': Budget(queries=4, ms=300, method='POST', login=True),
+    'register': Budget(queries=0, ms=300),
+
+    # store.urls
+    'product_list': Budget(queries=2, ms=1000),
+    'product_detail': Budget(queries=2, ms=500, args=('product',)),
+    'cart': Budget(queries=5, ms=500, login=True),
+    'add_to_cart': Budget(queries=6, ms=500, method='POST', args=('product',), data={'quantity': 1}, login=True),
+    'update_cart_item': Budget(queries=5, ms=500, method='POST', args=('cart_item',),
+                               data={'action': 'update', 'quantity': 2}, login=True),
+    'checkout': Budget(queries=6, ms=500, login=True),
+    'order_summary': Budget(queries=6, ms=500, args=('order',), login=True),
+    'order_history': Budget(queries=5, ms=500, login=True),
+    'profile': Budget(queries=6, ms=500, login=True),
+    'api_stats': Budget(queries=1, ms=500),
+    'api_demo': Budget(queries=0, ms=300),
+    'api-root': Budget(queries=0, ms=300),
+    'product-list': Budget(queries=2, ms=500),
+    'product-detail': Budget(queries=1, ms=300, args=('product',)),
+    'product-by-category': Budget(queries=1, ms=1000, params={'category': 'SUP'}),
+    'product-search': Budget(queries=1, ms=500, params={'q': 'whey'}),
+    'product-supplements': Budget(queries=1, ms=1000),
+    'product-best-value': Budget(queries=2, ms=500, params={'search': 'whey', 'min_protein': 20}),
+    'category-list': Budget(queries=1, ms=300),
+    'category-detail': Budget(queries=1, ms=300, args=('category',)),
+    'order-list': Budget(queries=6, ms=500, login=True),
+    'order-detail': Budget(queries=5, ms=500, args=('order',), login=True),
+
+    # nutrition.urls
+    'meal_planner': Budget(queries=5, ms=500, login=True),
+    'calculate_macros': Budget(queries=2, ms=300, method='POST', json=True, login=True, data={
+        'age': 30, 'weight': 80, 'height': 180, 'activity_level': 1.55, 'goal': 'MG', 'gender': 'M',
+    }),
+    'calculate_macros_quick': Budget(queries=0, ms=300, params={
+        'age': 30, 'weight': 80, 'height': 180, 'activity_level': 1.55, 'goal': 'MG', 'gender': 'M',
+    }),
+    'calculate_macros_batch': Budget(queries=2, ms=500, method='POST', json=True, login=True, data={
+        'profiles': [{'age': 30, 'weight': 80, 'height': 180, 'activity_level': 1.55, 'goal': 'MG', 'gender': 'M'}] * 100,
+    }),
+    'create_meal_plan': Budget(queries=4, ms=300, login=True),
+    'meal_plan_detail': Budget(queries=5, ms=300, args=('meal_plan',), login=True),
+    'meal_plan_products': Budget(queries=7, ms=300, args=('meal_plan',), login=True),
+    'add_meal_plan_products': Budget(queries=11, ms=300, method='POST', args=('meal_plan',), login=True),
+    'body_metrics': Budget(queries=3, ms=300, params={'points': 52}, login=True),
+    'log_body_metrics': Budget(queries=9, ms=300, method='POST', data={'weight': 80.5}, login=True),
+}
+
+
+def route_names(patterns=None, namespace=None):
+    """Names of every route reachable from the root URLconf, outside EXEMPT_NAMESPACES"""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            inner = pattern.namespace or namespace
+            if inner in EXEMPT_NAMESPACES:
+                continue
+            names |= route_names(pattern.url_patterns, inner)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f"{namespace}:{pattern.name}" if namespace else pattern.name)
+    return names
+
+
+def budget_objects(user):
+    """
+    Ids for the URL arguments in QUERY_BUDGETS, owned by user where it
+    matters. Creates a cart item, order and meal plan for user if needed.
+    """
+    from nutrition.models import MealPlan
+    from store.models import Cart, CartItem, Category, Order, OrderItem, Product
+
+    product = Product.objects.filter(is_active=True, stock__gt=10).order_by('id').first()
+    cart, _ = Cart.objects.get_or_create(user=user)
+    cart_item, _ = CartItem.objects.get_or_create(cart=cart, product=product)
+    order = Order.objects.filter(user=user).first()
+    if order is None:
+        order = Order.objects.create(user=user, total_amount=product.price, shipping_address='1 Budget Way')
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+    meal_plan = MealPlan.objects.filter(user=user).first()
+    if meal_plan is None:
+        meal_plan = MealPlan.objects.create(
+            user=user, name='Budget plan', goal='MT', activity_level=1.55,
+            age=30, weight=80, height=180, target_calories=2500
+        )
+    return {
+        'product': product.id,
+        'category': Category.objects.order_by('id').values_list('id', flat=True).first(),
+        'cart_item': cart_item.id,
+        'order': order.id,
+        'meal_plan': meal_plan.id,
+    }
+
+
+class Measurement:
+    def __init__(self, name, status, ms, queries):
+        self.name = name
+        self.status = status
+        self.ms = ms
+        self.queries = queries
+
+
+def measure(client, name, budget, objects):
+    """Request a route on a cold cache and capture its queries"""
+    url = reverse(name, args=[objects[arg] for arg in budget.args])
+    cache.clear()
+    tiered_cache.local.clear()
+
+    if budget.method == 'GET':
+        send = lambda: client.get(url, budget.params or {})
+    elif budget.json:
+        send = lambda: client.post(url, json.dumps(budget.data or {}), content_type='application/json')
+    else:
+        send = lambda: client.post(url, budget.data or {})
+
+    with CaptureQueriesContext(connection) as context:
+        start = time.perf_counter()
+        response = send()
+        ms = (time.perf_counter() - start) * 1000
+    return Measurement(name, response.status_code, ms, context.captured_queries)
+
+
+# SQLite "SCAN <table>" without an index (optionally prefixed by the ids
+# QuerySet.explain() includes), or a PostgreSQL sequential scan
+_SCAN = re.compile(r'^(\d+ \d+ \d+ )?SCAN (TABLE )?\S+$|Seq Scan on')
+
+
+def explain(sql):
+    """Query plan lines for a captured SELECT"""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return []
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix} {sql}")
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def is_full_scan(plan_line):
+    """Plan step reading a whole table without an index"""
+    return bool(_SCAN.search(plan_line.strip()))
+
+
+def is_temp_sort(plan_line):
+    """Plan step sorting rows because no index provides the order"""
+    return 'USE TEMP B-TREE' in plan_line
+
+
+def format_report(measurement, budget, explain_plans=False):
+    lines = [
+        f"{measurement.name}: {len(measurement.queries)} queries (budget {budget.queries}), "
+        f"{measurement.ms:.1f}ms (budget {budget.ms}ms), status {measurement.status}"
+    ]
+    for number, query in enumerate(measurement.queries, 1):
+        lines.append(f"  {number}. {query['sql']}")
+        if explain_plans:
+            for step in explain(query['sql']):
+                flag = '  <-- full table scan' if is_full_scan(step) else ''
+                lines.append(f"       {step}{flag}")
+    return "\n".join(lines)
+
+
+class QueryBudgetMixin:
+    """TestCase mixin checking routes against QUERY_BUDGETS"""
+
+    def assertWithinBudget(self, name, client, objects, budget=None):
+        budget = budget or QUERY_BUDGETS[name]
+        measurement = measure(client, name, budget, objects)
+        explain_plans = getattr(settings, 'QUERY_BUDGET_EXPLAIN', False)
+        report = format_report(measurement, budget, explain_plans=explain_plans)
+        if explain_plans:
+            print(report)
+
+        self.assertLess(measurement.status, 500, report)
+        if len(measurement.queries) > budget.queries or measurement.ms > budget.ms:
+            if not explain_plans:
+                report = format_report(measurement, budget, explain_plans=True)
+            self.fail(f"Query budget exceeded\n{report}")
+        return measurement
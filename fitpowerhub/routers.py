@@ -0,0 +1,74 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary ('default'). Reads of REPLICA_MODELS go to
+a random alias in DATABASE_REPLICAS, but only while replica reads are
+enabled, which ReplicaRoutingMiddleware does for safe requests to views
+marked with @replica_reads (or a replica_reads = True class attribute).
+Everything else (sessions, auth, carts, orders) keeps reading the primary.
+
+Anything that outlives the request (tiered cache entries, cached pages) is
+built from the primary: a lagging replica read right after a catalog write
+would otherwise be stored under the new catalog version.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_reads(view):
+    """Mark a view whose GET/HEAD requests may read catalog models from a replica"""
+    view.replica_reads = True
+    return view
+
+
+def is_replica_view(view_func):
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    return getattr(view_func, 'replica_reads', False) or getattr(view_class, 'replica_reads', False)
+
+
+def enable_replica_reads():
+    """Allow replica reads in the current context; pass the token to reset_replica_reads()"""
+    return _replica_reads.set(True)
+
+
+def disable_replica_reads():
+    """Read everything from the primary in the current context; pass the token to reset_replica_reads()"""
+    return _replica_reads.set(False)
+
+
+def reset_replica_reads(token):
+    _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Read everything from the primary inside the block"""
+    token = disable_replica_reads()
+    try:
+        yield
+    finally:
+        reset_replica_reads(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if (replicas and _replica_reads.get()
+                and model._meta.label_lower in getattr(settings, 'REPLICA_MODELS', ())):
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema with the data (see sync_replicas)
+        return db == 'default'
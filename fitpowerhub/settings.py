@@ -4,7 +4,7 @@ Django settings for fitpowerhub project.
 
 import os
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -34,13 +34,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fitpowerhub.middleware.RequestMetricsMiddleware',
+    'fitpowerhub.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'fitpowerhub.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'fitpowerhub.middleware.AnonymousPageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'fitpowerhub.middleware.UserActivityMiddleware',
 ]
 
 ROOT_URLCONF = 'fitpowerhub.urls'
@@ -49,8 +54,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory; runserver still reloads them on change
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -71,6 +82,71 @@ DATABASES = {
     }
 }
 
+# 'production' enables WAL and the tuned pragmas below (applied to every new
+# connection by fitpowerhub.db) plus persistent, health-checked connections
+DB_PROFILE = config('DB_PROFILE', default='development')
+
+SQLITE_PRAGMAS = {
+    'development': {},
+    'production': {
+        # Readers don't block the writer and vice versa
+        'journal_mode': 'wal',
+        # Safe with WAL: only the last transactions can be lost on power failure
+        'synchronous': 'normal',
+        'busy_timeout': 5000,  # ms to wait for the write lock
+        'cache_size': -65536,  # KiB (64 MiB) per connection
+        'mmap_size': 268435456,  # 256 MiB
+        'temp_store': 'memory',
+    },
+}
+
+if DB_PROFILE == 'production':
+    DATABASES['default']['CONN_MAX_AGE'] = config('CONN_MAX_AGE', default=600, cast=int)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Read replicas for catalog traffic, as comma-separated SQLite paths (for
+# local testing, copies of the primary made with manage.py sync_replicas)
+DATABASE_REPLICAS = []
+for _index, _path in enumerate(config('DATABASE_REPLICA_PATHS', default='', cast=Csv())):
+    DATABASES[f'replica{_index + 1}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _path,
+        'TEST': {'MIRROR': 'default'},
+        'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'CONN_HEALTH_CHECKS': DATABASES['default'].get('CONN_HEALTH_CHECKS', False),
+    }
+    DATABASE_REPLICAS.append(f'replica{_index + 1}')
+
+DATABASE_ROUTERS = ['fitpowerhub.routers.PrimaryReplicaRouter']
+
+# Models read from replicas by views marked with fitpowerhub.routers.replica_reads
+REPLICA_MODELS = ['store.product', 'store.category']
+
+# After a write, a client reads from the primary for this many seconds
+# (read-your-writes while replicas catch up)
+REPLICA_PIN_SECONDS = 15
+
+# Shared cache for all worker processes. The file-based backend stands in
+# for Redis/Memcached; point CACHE_LOCATION at a directory every worker can reach.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# In-process LRU tier in front of the shared cache (see store.cache)
+TIERED_CACHE = {
+    'ALIAS': 'default',
+    'MAX_SIZE': 1000,
+    'LOCAL_TIMEOUT': 60,
+    'VERSION_CHECK_INTERVAL': 1.0,
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -103,12 +179,93 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# Opt-in: serve request.user (with its profile) from a cached snapshot and
+# keep sessions in the cache, so authenticated requests skip the session
+# and user queries (see users.backends)
+CACHED_AUTH = {
+    'ENABLED': config('CACHED_AUTH_ENABLED', default=False, cast=bool),
+    'TIMEOUT': 300,  # seconds
+    # Snapshots hold password hashes: in production this must be a private,
+    # non-persistent cache (Redis/Memcached), not the file-based default
+    'CACHE_ALIAS': 'default',
+}
+
+if CACHED_AUTH['ENABLED']:
+    # ModelBackend stays listed so sessions started before the switch stay valid
+    AUTHENTICATION_BACKENDS = [
+        'users.backends.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ]
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
 
 CART_SESSION_ID = 'cart'
 
+# UserActivityMiddleware queues rows in memory and writes them in batches
+USER_ACTIVITY_BUFFER = {
+    'MAX_SIZE': 10000,       # rows queued before new ones are dropped
+    'BATCH_SIZE': 500,       # rows per bulk_create; a full batch triggers a flush
+    'FLUSH_INTERVAL': 2.0,   # seconds between background flushes
+}
+
+# Per-view timing histograms; each worker publishes its own file in
+# DIRECTORY and /metrics/ merges them
+REQUEST_METRICS = {
+    'DIRECTORY': config('METRICS_DIRECTORY', default=str(BASE_DIR / 'metrics')),
+    'PUBLISH_INTERVAL': 5.0,  # seconds
+    # Files from other hosts not updated for this long are dropped from the
+    # merge (files of dead processes on this host are dropped right away)
+    'STALE_AFTER': 3600,  # seconds
+}
+
+# Batch nutrition calculator (/nutrition/calculate/batch/)
+NUTRITION_BATCH = {
+    'MAX_ROWS': 100000,
+    'MAX_BYTES': 16 * 1024 * 1024,
+}
+
+# Product suggestions for meal plans (nutrition.planner)
+MEAL_PLAN_PRODUCTS = {
+    'TOLERANCE': 0.1,            # allowed deviation from each macro target
+    'MAX_SERVINGS': 10,          # per product
+    'CANDIDATES_PER_MACRO': 3,   # initial candidate pool, widened while nothing fits
+    'TIME_LIMIT_MS': 80,
+}
+
+# Body-metrics history API (nutrition.progress)
+BODY_METRICS = {
+    'MAX_YEARS': 10,  # per request
+}
+
+# Full-page cache for anonymous catalog views (AnonymousPageCacheMiddleware).
+# Pages are dropped whenever the catalog cache namespace is invalidated.
+PAGE_CACHE = {
+    'ENABLED': config('PAGE_CACHE_ENABLED', default=True, cast=bool),
+    'TIMEOUT': 300,  # seconds
+    'CACHE_ALIAS': 'default',
+}
+
+# Sampling profiler (ProfilingMiddleware). Requests with a valid signed
+# X-Profile header are profiled even when ENABLED is False.
+PROFILING = {
+    'ENABLED': config('PROFILING_ENABLED', default=False, cast=bool),
+    'SAMPLE_RATE': config('PROFILING_SAMPLE_RATE', default=0.01, cast=float),
+    'DIRECTORY': config('PROFILING_DIRECTORY', default=str(BASE_DIR / 'profiles')),
+    'MAX_FILES_PER_VIEW': 50,
+    'TOKEN_MAX_AGE': 3600,  # seconds an X-Profile token stays valid
+}
+
+# Print the EXPLAIN QUERY PLAN of every query checked against
+# fitpowerhub.query_budget.QUERY_BUDGETS (plans are always shown on failure)
+QUERY_BUDGET_EXPLAIN = config('QUERY_BUDGET_EXPLAIN', default=False, cast=bool)
+
+# Raw UserActivity rows older than this are deleted by compact_user_activity
+# once they have been rolled up into UserActivityHourly
+USER_ACTIVITY_RETENTION_DAYS = 30
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -119,4 +276,4 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
-}
\ No newline at end of file
+}
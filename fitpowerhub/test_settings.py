@@ -0,0 +1,31 @@
+"""
+Settings for the test suite (manage.py test uses them by default).
+
+Tests get a per-process cache and throwaway metrics/profile directories, so
+cache.clear() in tests can't wipe the development cache and test requests
+don't show up in its metrics. Other runners select them with
+DJANGO_SETTINGS_MODULE=fitpowerhub.test_settings.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import PROFILING, REQUEST_METRICS
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+_output = tempfile.mkdtemp(prefix='fitpowerhub-test-')
+atexit.register(shutil.rmtree, _output, ignore_errors=True)
+
+REQUEST_METRICS = {**REQUEST_METRICS, 'DIRECTORY': os.path.join(_output, 'metrics')}
+PROFILING = {**PROFILING, 'DIRECTORY': os.path.join(_output, 'profiles')}
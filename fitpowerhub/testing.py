@@ -0,0 +1,23 @@
+"""
+Test helpers shared by the apps' test suites.
+"""
+from unittest import mock
+
+from .middleware import ActivityBuffer
+
+
+class ActivityBufferMixin:
+    """
+    Replace the middleware's activity buffer with one that has no background
+    thread, so activity rows are only written when the test flushes
+    self.activity_buffer (and never from another thread mid-test).
+    activity_buffer_options are passed to ActivityBuffer.
+    """
+    activity_buffer_options = {}
+
+    def setUp(self):
+        super().setUp()
+        self.activity_buffer = ActivityBuffer(background=False, **self.activity_buffer_options)
+        patcher = mock.patch('fitpowerhub.middleware.activity_buffer', self.activity_buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
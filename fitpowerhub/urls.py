@@ -5,9 +5,11 @@ from django.conf.urls.static import static
 from store.views import home_view
 from django.contrib.auth import views as auth_views
 from users.views import register_view, custom_login_view
+from .views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
     path('', home_view, name='home'),
     path('store/', include('store.urls')),
     path('nutrition/', include('nutrition.urls')),
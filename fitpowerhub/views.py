@@ -0,0 +1,24 @@
+from collections import Counter
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
+
+from .metrics import render_prometheus
+from .middleware import request_metrics
+
+@staff_member_required
+def metrics_view(request):
+    """Per-view latency and query metrics of all workers, in Prometheus text format"""
+    request_metrics.publish()
+    views, extras = request_metrics.load_all()
+
+    cache_stats = {}
+    for extra in extras:
+        for namespace, stats in extra.get('cache', {}).items():
+            cache_stats.setdefault(namespace, Counter()).update(
+                {key: value for key, value in stats.items() if key != 'hit_rate'}
+            )
+
+    return HttpResponse(
+        render_prometheus(views, cache_stats),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
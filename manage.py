@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitpowerhub.settings')
+    # The test suite runs against its own cache and metrics directories
+    settings_module = 'fitpowerhub.test_settings' if sys.argv[1:2] == ['test'] else 'fitpowerhub.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,83 @@
+"""Benchmark scenarios for the nutrition app (run with manage.py benchmark)"""
+import json
+from django.urls import reverse
+
+from fitpowerhub.benchmark import scenario
+
+
+def _profile(i):
+    return {
+        'age': 18 + i % 50,
+        'weight': 55 + (i % 60) * 0.5,
+        'height': 155 + i % 40,
+        'activity_level': [1.2, 1.375, 1.55, 1.725, 1.9][i % 5],
+        'goal': ['WL', 'MG', 'MT', 'EN'][i % 4],
+        'gender': 'MF'[i % 2],
+    }
+
+
+@scenario('calculate_macros', login=True)
+def calculate_macros(client, data, i):
+    return client.post(reverse('calculate_macros'), json.dumps(_profile(i)), content_type='application/json')
+
+
+@scenario('calculate_macros_quick')
+def calculate_macros_quick(client, data, i):
+    return client.get(reverse('calculate_macros_quick'), _profile(i))
+
+
+_batches = {}
+
+
+def _batch_payload(rows):
+    """JSON body with rows varied profiles, built once per size"""
+    if rows not in _batches:
+        _batches[rows] = json.dumps({'profiles': [_profile(i) for i in range(rows)]})
+    return _batches[rows]
+
+
+# Profiles per second is req/s times the batch size
+@scenario('calculate_macros_batch_1k', login=True, requests=50)
+def calculate_macros_batch_1k(client, data, i):
+    return client.post(reverse('calculate_macros_batch'), _batch_payload(1000), content_type='application/json')
+
+
+@scenario('calculate_macros_batch_100k', login=True, requests=5)
+def calculate_macros_batch_100k(client, data, i):
+    return client.post(reverse('calculate_macros_batch'), _batch_payload(100000), content_type='application/json')
+
+
+def _own_meal_plan(client, data, i):
+    """Untimed: find (or create) a meal plan of the logged-in user"""
+    from nutrition.models import MealPlan
+    user_id = client.session['_auth_user_id']
+    plan = MealPlan.objects.filter(user_id=user_id).order_by('id').first()
+    if plan is None:
+        plan = MealPlan.objects.create(
+            user_id=user_id, name='Benchmark plan', goal='MG', activity_level=1.55,
+            age=30, weight=80, height=180, target_calories=2800,
+        )
+    client.meal_plan_id = plan.id
+
+
+@scenario('meal_plan_products', login=True, prepare=_own_meal_plan)
+def meal_plan_products(client, data, i):
+    return client.get(reverse('meal_plan_products', args=[client.meal_plan_id]))
+
+
+def _year_of_weights(client, data, i):
+    """Untimed: give the logged-in user a daily weight reading for the whole year"""
+    import numpy as np
+    from django.utils import timezone
+    from nutrition.models import BodyMetricsYear
+    from nutrition.progress import DAYS_PER_YEAR, pack
+    user_id = client.session['_auth_user_id']
+    weights = 90 - np.arange(DAYS_PER_YEAR) * 0.02
+    BodyMetricsYear.objects.get_or_create(
+        user_id=user_id, year=timezone.localdate().year, defaults={'weight': pack(weights)}
+    )
+
+
+@scenario('body_metrics_year', login=True, prepare=_year_of_weights)
+def body_metrics_year(client, data, i):
+    return client.get(reverse('body_metrics'), {'points': 52})
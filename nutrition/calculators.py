@@ -1,3 +1,12 @@
+import numpy as np
+
+# (protein, carbs, fat) calorie ratios by MealPlan goal
+GOAL_MACRO_RATIOS = {
+    'WL': (0.35, 0.35, 0.30),  # Weight loss
+    'MG': (0.40, 0.40, 0.20),  # Muscle gain
+}
+DEFAULT_MACRO_RATIOS = (0.30, 0.40, 0.30)  # Maintenance
+
 def calculate_bmr(age, weight, height, gender='M'):
     """
     Calculate Basal Metabolic Rate using Mifflin-St Jeor Equation
@@ -56,4 +65,112 @@ def calculate_macronutrients(calories, protein_ratio=0.3, carbs_ratio=0.4, fat_r
         'protein_calories': round(protein_calories),
         'carbs_calories': round(carbs_calories),
         'fat_calories': round(fat_calories),
-    }
\ No newline at end of file
+    }
+
+def macro_ratios(goal):
+    """(protein, carbs, fat) ratios used for a goal"""
+    return GOAL_MACRO_RATIOS.get(goal, DEFAULT_MACRO_RATIOS)
+
+
+def calculate_macro_plan(age, weight, height, activity_level, goal, gender='M'):
+    """BMR, TDEE, target calories and macro grams for one person, as calculate_macros_view returns them"""
+    bmr = calculate_bmr(age, weight, height, gender)
+    tdee = calculate_tdee(bmr, activity_level)
+    target_calories = calculate_target_calories(tdee, goal)
+    protein_ratio, carbs_ratio, fat_ratio = macro_ratios(goal)
+    
+    return {
+        'bmr': round(bmr),
+        'tdee': round(tdee),
+        'target_calories': round(target_calories),
+        'protein_grams': round((target_calories * protein_ratio) / 4, 1),
+        'carbs_grams': round((target_calories * carbs_ratio) / 4, 1),
+        'fat_grams': round((target_calories * fat_ratio) / 9, 1),
+        'protein_ratio': protein_ratio,
+        'carbs_ratio': carbs_ratio,
+        'fat_ratio': fat_ratio,
+    }
+
+
+# Batch versions of the calculators above. They take equal-length column
+# arrays (or scalars, which are broadcast) and give exactly the same numbers
+# as calling the scalar functions row by row.
+
+def _round(values, digits):
+    """Round like the built-in round(), which np.round() doesn't always match"""
+    rounded = np.round(values, digits)
+    # np.round() scales by 10**digits first, which can tip values sitting
+    # right on a half the other way; redo those with round()
+    scaled = values * 10 ** digits
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(value, digits) for value in values[near_half].tolist()]
+    return rounded
+
+
+def round_calories(values):
+    """round(value) for every element, as integers"""
+    return np.rint(values).astype(np.int64)
+
+
+def calculate_bmr_batch(age, weight, height, gender='M'):
+    """Vectorized calculate_bmr(); gender is an array of 'M'/'F' codes"""
+    age = np.asarray(age, dtype=np.float64)
+    weight = np.asarray(weight, dtype=np.float64)
+    height = np.asarray(height, dtype=np.float64)
+    offset = np.where(np.asarray(gender) == 'F', -161.0, 5.0)
+    return (10 * weight) + (6.25 * height) - (5 * age) + offset
+
+
+def calculate_tdee_batch(bmr, activity_level):
+    """Vectorized calculate_tdee()"""
+    return np.asarray(bmr, dtype=np.float64) * np.asarray(activity_level, dtype=np.float64)
+
+
+def calculate_target_calories_batch(tdee, goal):
+    """Vectorized calculate_target_calories()"""
+    tdee = np.asarray(tdee, dtype=np.float64)
+    goal = np.asarray(goal)
+    return np.select([goal == 'WL', goal == 'MG'], [tdee - 500, tdee + 300], tdee)
+
+
+def macro_ratios_batch(goal):
+    """Vectorized macro_ratios(): (protein, carbs, fat) ratio arrays"""
+    goal = np.asarray(goal)
+    ratios = []
+    for index, default in enumerate(DEFAULT_MACRO_RATIOS):
+        conditions = [goal == code for code in GOAL_MACRO_RATIOS]
+        choices = [values[index] for values in GOAL_MACRO_RATIOS.values()]
+        ratios.append(np.select(conditions, choices, default))
+    return tuple(ratios)
+
+
+def calculate_macronutrients_batch(calories, protein_ratio=0.3, carbs_ratio=0.4, fat_ratio=0.3):
+    """
+    Vectorized calculate_macronutrients(). Returns a dict with the same keys
+    holding one array per key.
+    """
+    calories = np.asarray(calories, dtype=np.float64)
+    protein_ratio, carbs_ratio, fat_ratio = np.broadcast_arrays(
+        *(np.asarray(ratio, dtype=np.float64) for ratio in (protein_ratio, carbs_ratio, fat_ratio))
+    )
+
+    # Normalize rows whose ratios don't sum to 1
+    total_ratio = protein_ratio + carbs_ratio + fat_ratio
+    normalize = np.abs(total_ratio - 1.0) > 0.01
+    protein_ratio = np.where(normalize, protein_ratio / total_ratio, protein_ratio)
+    carbs_ratio = np.where(normalize, carbs_ratio / total_ratio, carbs_ratio)
+    fat_ratio = np.where(normalize, fat_ratio / total_ratio, fat_ratio)
+
+    protein_calories = calories * protein_ratio
+    carbs_calories = calories * carbs_ratio
+    fat_calories = calories * fat_ratio
+
+    return {
+        'protein': _round(protein_calories / 4, 1),
+        'carbs': _round(carbs_calories / 4, 1),
+        'fat': _round(fat_calories / 9, 1),
+        'protein_calories': round_calories(protein_calories),
+        'carbs_calories': round_calories(carbs_calories),
+        'fat_calories': round_calories(fat_calories),
+    }
@@ -1,4 +1,5 @@
 from django import forms
+from django.utils import timezone
 from .models import MealPlan
 
 class MealPlanForm(forms.ModelForm):
@@ -84,4 +85,21 @@ class MealPlanForm(forms.ModelForm):
         if height and (height < 100 or height > 250):
             raise forms.ValidationError("Height must be between 100 and 250 cm")
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+class BodyMetricsForm(forms.Form):
+    """A day's body-metrics readings; at least one is required"""
+    date = forms.DateField(required=False, help_text="Defaults to today")
+    weight = forms.FloatField(required=False, min_value=30, max_value=300, label='Weight (kg)')
+    height = forms.FloatField(required=False, min_value=100, max_value=250, label='Height (cm)')
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('weight') is None and cleaned_data.get('height') is None:
+            raise forms.ValidationError("Enter a weight or a height")
+        
+        date = cleaned_data.get('date') or timezone.localdate()
+        if date > timezone.localdate():
+            raise forms.ValidationError("Readings can't be logged for future dates")
+        cleaned_data['date'] = date
+        return cleaned_data
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from nutrition.recompute import recompute_meal_plans
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the stored BMR, TDEE and target calories of every meal plan with the current '
+        'calculators and profiles, writing only plans that changed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Plans read and updated per batch')
+        parser.add_argument('--shards', type=int, default=1, help='Split the id range into this many shards')
+        parser.add_argument('--shard', type=int,
+                            help='Only run this shard (1-based), e.g. one per process or machine')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Run shards in this many processes; SQLite allows a single writer, so use this with PostgreSQL or MySQL'
+        )
+        parser.add_argument('--checkpoint-dir',
+                            help='Record progress here; rerunning with the same directory and --shards resumes '
+                                 '(delete it to start over)')
+        parser.add_argument('--use-profile-weight', action='store_true',
+                            help="Also update each plan's weight from its owner's profile, where set")
+        parser.add_argument('--dry-run', action='store_true', help='Count stale plans without writing')
+
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if shards < 1 or options['batch_size'] < 1:
+            raise CommandError('--shards and --batch-size must be positive')
+        if options['shard'] is not None and not 1 <= options['shard'] <= shards:
+            raise CommandError(f'--shard must be between 1 and {shards}')
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING('SQLite serializes writes; extra workers will mostly wait'))
+
+        def report(label, counts, seconds):
+            self.stdout.write(
+                f"shard {label:>7} scanned {counts['scanned']:,} updated {counts['updated']:,} in {seconds:.1f}s"
+            )
+
+        result = recompute_meal_plans(
+            batch_size=options['batch_size'], shards=shards,
+            shard=None if options['shard'] is None else options['shard'] - 1,
+            workers=options['workers'], checkpoint_dir=options['checkpoint_dir'],
+            use_profile_weight=options['use_profile_weight'], dry_run=options['dry_run'], report=report,
+        )
+        rate = result['scanned'] / result['seconds'] if result['seconds'] else 0
+        verb = 'would update' if options['dry_run'] else 'updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {result['scanned']:,} meal plans, {verb} {result['updated']:,} "
+            f"in {result['seconds']:.1f}s ({rate:,.0f} plans/s)"
+        ))
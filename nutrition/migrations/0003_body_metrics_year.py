@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('nutrition', '0002_remove_mealplan_daily_meals_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BodyMetricsYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('weight', models.BinaryField(default=b'', help_text='Daily weight in kg')),
+                ('height', models.BinaryField(default=b'', help_text='Daily height in cm')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='body_metrics', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['year'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bodymetricsyear',
+            constraint=models.UniqueConstraint(fields=('user', 'year'), name='body_metrics_user_year'),
+        ),
+    ]
@@ -79,4 +79,25 @@ class MealPlan(models.Model):
                 'carbs_calories': round(carbs_calories),
                 'fat_calories': round(fat_calories),
             }
-        return None
\ No newline at end of file
+        return None
+
+class BodyMetricsYear(models.Model):
+    """
+    A user's body metrics for one calendar year in a single row, instead of
+    a row per reading. Each metric is a packed float32 array with a slot per
+    day of the year and NaN where nothing was logged (see nutrition.progress).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='body_metrics')
+    year = models.PositiveSmallIntegerField()
+    weight = models.BinaryField(default=b'', help_text="Daily weight in kg")
+    height = models.BinaryField(default=b'', help_text="Daily height in cm")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['year']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year'], name='body_metrics_user_year'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.year}"
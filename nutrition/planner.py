@@ -0,0 +1,223 @@
+"""
+Shopping lists for meal plans: whole servings of active food and supplement
+products that meet a plan's protein/carbs/fat targets within a tolerance,
+at the lowest total price. The catalog prices one serving per unit, so a
+plan's servings are also the cart quantities.
+
+The nutrient matrix of the catalog is built once per catalog version and
+kept in the tiered cache. suggest_products() narrows it with NumPy to the
+most cost-effective candidates for each macro and then runs a depth-first
+branch-and-bound over their servings, widening the candidate pool while
+nothing fits. The search stops at TIME_LIMIT_MS with the best plan found so
+far.
+"""
+import math
+import time
+import numpy as np
+from django.conf import settings
+
+from store.cache import tiered_cache
+from store.models import Product
+
+MACROS = ('protein', 'carbs', 'fat')
+
+
+class NutrientMatrix:
+    """Per-serving grams (rows follow ids) and prices of every plannable product"""
+
+    def __init__(self, ids, prices, nutrients, stock):
+        self.ids = ids
+        self.prices = prices
+        self.nutrients = nutrients
+        self.stock = stock
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def build_nutrient_matrix():
+    rows = sorted(
+        Product.objects.filter(
+            is_active=True, category__in=[Product.FOOD, Product.SUPPLEMENT],
+            stock__gt=0, price__gt=0, protein_per_serving__isnull=False,
+        ).order_by().values_list(
+            'id', 'price', 'protein_per_serving', 'carbs_per_serving', 'fat_per_serving', 'stock'
+        )
+    )
+    return NutrientMatrix(
+        ids=np.array([row[0] for row in rows], dtype=np.int64),
+        prices=np.array([float(row[1]) for row in rows], dtype=np.float64),
+        nutrients=np.array(
+            [[row[2] or 0, row[3] or 0, row[4] or 0] for row in rows], dtype=np.float64
+        ).reshape(-1, 3),
+        stock=np.array([row[5] for row in rows], dtype=np.int64),
+    )
+
+
+def nutrient_matrix():
+    """The catalog's NutrientMatrix, rebuilt when the catalog namespace is invalidated"""
+    return tiered_cache.get_or_set('catalog', 'nutrient_matrix', build_nutrient_matrix)
+
+
+class ProductPlan:
+    """
+    items is a list of (product id, servings); optimal is False when the
+    search stopped at the time limit before proving the cost minimal.
+    """
+
+    def __init__(self, items, totals, cost, targets, optimal):
+        self.items = items
+        self.totals = totals
+        self.cost = cost
+        self.targets = targets
+        self.optimal = optimal
+
+
+def _top(values, count):
+    """Indexes of the count largest values, largest first"""
+    if len(values) > count:
+        indexes = np.argpartition(-values, count)[:count]
+    else:
+        indexes = np.arange(len(values))
+    return indexes[np.argsort(-values[indexes], kind='stable')]
+
+
+def select_candidates(matrix, targets, count):
+    """
+    Row indexes of the products worth searching. For every macro: the count
+    cheapest sources per gram, and the count cheapest sources that carry
+    little else, which fine-tune one macro without overshooting the others.
+    Plus the count best value products whose macro split is closest to the
+    target's.
+    """
+    totals = matrix.nutrients.sum(axis=1)
+    split = matrix.nutrients / np.where(totals > 0, totals, 1)[:, None]
+    grams_per_dollar = matrix.nutrients / matrix.prices[:, None]
+    picked = set()
+    for macro in range(len(MACROS)):
+        picked.update(_top(grams_per_dollar[:, macro], count).tolist())
+        picked.update(_top(grams_per_dollar[:, macro] * split[:, macro] ** 2, count).tolist())
+
+    mismatch = np.abs(split - targets / targets.sum()).sum(axis=1) / 2
+    picked.update(_top(totals / matrix.prices * (1 - mismatch), count).tolist())
+
+    picked = np.array(sorted(picked), dtype=np.int64)
+    # Cheapest food per gram first, so depth-first search finds good plans early
+    cost_per_gram = matrix.prices[picked] / np.maximum(totals[picked], 1e-9)
+    return picked[np.argsort(cost_per_gram, kind='stable')]
+
+
+class _TimeUp(Exception):
+    pass
+
+
+def branch_and_bound(prices, nutrients, max_servings, lower, upper, deadline):
+    """
+    Cheapest servings vector with lower <= totals <= upper for every macro.
+    Returns (cost, servings, optimal); servings is None when nothing fits.
+    Plain lists: per-node NumPy calls would dominate the search.
+    """
+    size = len(prices)
+    macros = range(len(lower))
+    # For products i..end: the cheapest price per gram of each macro, which
+    # bounds the cost of covering what is still missing, and the most of each
+    # macro they can still add, which rules out branches that can't reach lower
+    cheapest = [[math.inf] * len(lower) for _ in range(size + 1)]
+    reachable = [[0.0] * len(lower) for _ in range(size + 1)]
+    for i in reversed(range(size)):
+        for m in macros:
+            per_gram = prices[i] / nutrients[i][m] if nutrients[i][m] > 0 else math.inf
+            cheapest[i][m] = min(cheapest[i + 1][m], per_gram)
+            reachable[i][m] = reachable[i + 1][m] + max_servings[i] * nutrients[i][m]
+
+    best = [math.inf, None]
+    servings = [0] * size
+    nodes = [0]
+
+    def visit(depth, totals, cost):
+        if all(totals[m] >= lower[m] for m in macros):
+            # Feasible; adding servings only costs more
+            if cost < best[0]:
+                best[0], best[1] = cost, list(servings)
+            return
+        if depth == size:
+            return
+        bound = cost
+        for m in macros:
+            missing = lower[m] - totals[m]
+            if missing > reachable[depth][m]:
+                return
+            if missing > 0:
+                bound = max(bound, cost + missing * cheapest[depth][m])
+        if bound >= best[0]:
+            return
+
+        nodes[0] += 1
+        if nodes[0] % 512 == 0 and time.perf_counter() > deadline:
+            raise _TimeUp
+
+        price, grams = prices[depth], nutrients[depth]
+        for count in range(max_servings[depth], -1, -1):
+            new_totals = [totals[m] + count * grams[m] for m in macros]
+            if any(new_totals[m] > upper[m] for m in macros):
+                continue
+            servings[depth] = count
+            visit(depth + 1, new_totals, cost + count * price)
+        servings[depth] = 0
+
+    try:
+        visit(0, [0.0] * len(lower), 0.0)
+        optimal = True
+    except _TimeUp:
+        optimal = False
+    return best[0], best[1], optimal
+
+
+def suggest_products(meal_plan, matrix=None):
+    """
+    ProductPlan for a meal plan's macro targets, or None when the plan has
+    no targets or no combination of products fits within the tolerance.
+    """
+    macros = meal_plan.calculate_macros()
+    if not macros:
+        return None
+    config = getattr(settings, 'MEAL_PLAN_PRODUCTS', {})
+    tolerance = config.get('TOLERANCE', 0.1)
+    deadline = time.perf_counter() + config.get('TIME_LIMIT_MS', 80) / 1000
+
+    matrix = nutrient_matrix() if matrix is None else matrix
+    if not len(matrix):
+        return None
+    targets = np.array([macros[macro] for macro in MACROS], dtype=np.float64)
+    lower = targets * (1 - tolerance)
+    upper = targets * (1 + tolerance)
+
+    # A small candidate pool is searched (or proved infeasible) in a few
+    # milliseconds; widen it only while nothing fits and time remains
+    count = config.get('CANDIDATES_PER_MACRO', 3)
+    while True:
+        rows = select_candidates(matrix, targets, count)
+        nutrients = matrix.nutrients[rows]
+        # No product may exceed an upper bound on its own
+        with np.errstate(divide='ignore'):
+            fits = np.floor(np.min(np.where(nutrients > 0, upper / nutrients, np.inf), axis=1))
+        max_servings = np.minimum(np.minimum(fits, matrix.stock[rows]), config.get('MAX_SERVINGS', 10))
+        cost, servings, optimal = branch_and_bound(
+            matrix.prices[rows].tolist(), nutrients.tolist(), max_servings.astype(np.int64).tolist(),
+            lower.tolist(), upper.tolist(), deadline,
+        )
+        if servings is not None:
+            break
+        if not optimal or len(rows) == len(matrix) or time.perf_counter() > deadline:
+            return None
+        count *= 2
+
+    picked = [(int(matrix.ids[row]), count) for row, count in zip(rows, servings) if count]
+    totals = nutrients.T @ np.array(servings, dtype=np.float64)
+    return ProductPlan(
+        items=picked,
+        totals={macro: round(float(total), 1) for macro, total in zip(MACROS, totals)},
+        cost=round(cost, 2),
+        targets=dict(zip(MACROS, targets.tolist())),
+        optimal=optimal,
+    )
@@ -0,0 +1,136 @@
+"""
+Body-metrics history for progress tracking.
+
+Readings are stored per user and calendar year in BodyMetricsYear: every
+metric is a little-endian float32 array with one slot per day of the year
+(NaN for days without a reading), so a user's whole year is one row and a
+few kilobytes. A later reading on the same day replaces the earlier one.
+
+Series are analysed with NumPy: NaN-aware rolling averages, a least-squares
+trend, and downsampling to a fixed number of points for long-range charts.
+"""
+import datetime
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from store.models import UserProfile
+from users.backends import forget_user
+from .models import BodyMetricsYear
+
+METRICS = ('weight', 'height')
+
+DAYS_PER_YEAR = 366
+DTYPE = np.dtype('<f4')
+
+
+def days_in_year(year):
+    return (datetime.date(year + 1, 1, 1) - datetime.date(year, 1, 1)).days
+
+
+def unpack(blob):
+    """Daily values of a stored metric; NaN where nothing was logged"""
+    if not blob:
+        return np.full(DAYS_PER_YEAR, np.nan, dtype=DTYPE)
+    return np.frombuffer(bytes(blob), dtype=DTYPE).copy()
+
+
+def pack(values):
+    return np.asarray(values, dtype=DTYPE).tobytes()
+
+
+def log_metrics(user, day, **values):
+    """
+    Record metric readings (e.g. weight=80.5) for day. Readings for today
+    also become the current values of the user's profile.
+    """
+    unknown = set(values) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metric(s): {', '.join(sorted(unknown))}")
+    values = {metric: value for metric, value in values.items() if value is not None}
+    if not values:
+        return
+
+    index = day.timetuple().tm_yday - 1
+    with transaction.atomic():
+        row, created = BodyMetricsYear.objects.select_for_update().get_or_create(
+            user=user, year=day.year, defaults=_with_readings(None, index, values)
+        )
+        if not created:
+            for metric, blob in _with_readings(row, index, values).items():
+                setattr(row, metric, blob)
+            row.save(update_fields=[*values, 'updated_at'])
+
+        if day == timezone.localdate():
+            UserProfile.objects.filter(user=user).update(**values)
+            forget_user(user.pk)
+
+
+def _with_readings(row, index, values):
+    """Packed metrics of row (None for a new one) with values set on day index"""
+    blobs = {}
+    for metric, value in values.items():
+        series = unpack(getattr(row, metric) if row else None)
+        series[index] = value
+        blobs[metric] = pack(series)
+    return blobs
+
+
+def load_series(user, start_year, end_year):
+    """
+    (dates, {metric: values}) with one entry per day from Jan 1 of
+    start_year to Dec 31 of end_year, read in a single query.
+    """
+    rows = {
+        row[0]: row[1:]
+        for row in BodyMetricsYear.objects.filter(user=user, year__range=(start_year, end_year))
+        .values_list('year', *METRICS)
+    }
+    series = {metric: [] for metric in METRICS}
+    for year in range(start_year, end_year + 1):
+        blobs = rows.get(year, (None,) * len(METRICS))
+        for metric, blob in zip(METRICS, blobs):
+            series[metric].append(unpack(blob)[:days_in_year(year)])
+
+    start = np.datetime64(datetime.date(start_year, 1, 1), 'D')
+    end = np.datetime64(datetime.date(end_year + 1, 1, 1), 'D')
+    dates = np.arange(start, end)
+    return dates, {metric: np.concatenate(values).astype(np.float64) for metric, values in series.items()}
+
+
+def rolling_mean(values, window):
+    """Mean of the readings in each trailing window of days; NaN where it holds none"""
+    present = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    window_sums = sums[window:] - sums[:-window]
+    window_counts = counts[window:] - counts[:-window]
+    # The first window - 1 days average over however many days there are
+    window_sums = np.concatenate((sums[1:window], window_sums))
+    window_counts = np.concatenate((counts[1:window], window_counts))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_counts > 0, window_sums / window_counts, np.nan)
+
+
+def trend(values):
+    """Least-squares change per day over the readings, or None with fewer than two"""
+    days = np.flatnonzero(~np.isnan(values))
+    if len(days) < 2:
+        return None
+    slope, _ = np.polyfit(days, values[days], 1)
+    return float(slope)
+
+
+def downsample(dates, values, points):
+    """
+    (bucket start dates, bucket means) for at most points equal spans of
+    days; a bucket without readings is NaN.
+    """
+    if points >= len(values):
+        return dates, values
+    starts = np.unique(np.linspace(0, len(values), points, endpoint=False).astype(np.int64))
+    present = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(present, values, 0.0), starts)
+    counts = np.add.reduceat(present.astype(np.int64), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return dates[starts], np.where(counts > 0, sums / counts, np.nan)
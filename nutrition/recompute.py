@@ -0,0 +1,240 @@
+"""
+Bulk recomputation of the values MealPlan stores (bmr, tdee and
+target_calories), used by the ``recompute_meal_plans`` management command.
+
+Plans are read in keyset batches (id above the last one seen, ordered by
+id) together with the owner's current profile, recomputed with the batch
+calculators and written back with bulk_update only where a value changed.
+The id range can be split into shards run by separate processes. The
+first run to get there fixes the shard ranges in a manifest in the
+checkpoint directory, and every shard records its last committed id in its
+own checkpoint file, so an interrupted run resumes where it stopped.
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+from django.db import OperationalError, connections, transaction
+from django.db.models import Max, Min
+
+from .calculators import calculate_bmr_batch, calculate_target_calories_batch, calculate_tdee_batch
+from .models import MealPlan
+
+FIELDS = ('bmr', 'tdee', 'target_calories')
+
+# Attempts per batch when another shard's writer holds the database lock
+WRITE_ATTEMPTS = 5
+
+
+def shard_ranges(first_id, last_id, shards):
+    """Split first_id..last_id into contiguous (low, high] id ranges"""
+    span = last_id - first_id + 1
+    bounds = [first_id - 1 + span * index // shards for index in range(shards + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+class ShardState:
+    """A shard's id range and last committed id, saved to path (if any) after every batch"""
+
+    def __init__(self, index, shards, low, high, last_id=None, path=None):
+        self.index = index
+        self.shards = shards
+        self.low = low
+        self.high = high
+        self.last_id = low if last_id is None else last_id
+        self.path = path
+
+    @property
+    def label(self):
+        return f"{self.index + 1}/{self.shards}"
+
+    @property
+    def done(self):
+        return self.last_id >= self.high
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'low': self.low, 'high': self.high, 'last_id': self.last_id}, f)
+        os.replace(tmp, self.path)
+
+
+def _layout(shards, checkpoint_dir=None):
+    """
+    The (low, high] range of every shard. With a checkpoint directory the
+    ranges are written once to a manifest there, and whoever comes later
+    (a resumed run, or another --shard process) uses them as they are.
+    """
+    manifest = checkpoint_dir and os.path.join(checkpoint_dir, f"shards-{shards}.json")
+    if manifest and os.path.exists(manifest):
+        with open(manifest) as f:
+            return json.load(f)['ranges']
+
+    bounds = MealPlan.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return []
+    ranges = shard_ranges(bounds['first'], bounds['last'], shards)
+    if not manifest:
+        return ranges
+
+    # Link a complete file into place: it appears atomically and only once
+    # (like O_EXCL); if another process won, its ranges are the ones used
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=checkpoint_dir)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'ranges': ranges}, f)
+        os.link(tmp, manifest)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp)
+    with open(manifest) as f:
+        return json.load(f)['ranges']
+
+
+def load_shards(shards, checkpoint_dir=None, shard=None):
+    """
+    ShardStates for every shard, or only shard (0-based). Each state resumes
+    from its own checkpoint file when a previous run left one; no other
+    shard's file is read or written.
+    """
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    states = []
+    for index, (low, high) in enumerate(_layout(shards, checkpoint_dir)):
+        if shard is not None and index != shard:
+            continue
+        path = checkpoint_dir and os.path.join(checkpoint_dir, f"shard-{index + 1}-of-{shards}.json")
+        last_id = None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                last_id = json.load(f)['last_id']
+        states.append(ShardState(index, shards, low, high, last_id, path))
+    return states
+
+
+def _stored(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def recompute_batch(rows, use_profile_weight=False):
+    """
+    MealPlan instances (id and changed fields only) for the rows whose stored
+    values differ from a fresh calculation, and the fields to update.
+    """
+    (ids, ages, weights, heights, levels, goals, genders, profile_weights,
+     bmrs, tdees, targets) = zip(*rows)
+    stored_weights = weights = _stored(weights)
+    fields = list(FIELDS)
+    if use_profile_weight:
+        # The owner's current weight, where their profile has one
+        weights = np.where(np.isnan(_stored(profile_weights)), stored_weights, _stored(profile_weights))
+        fields.append('weight')
+
+    # Plans follow create_meal_plan_view: profile gender, male when unset
+    bmr = calculate_bmr_batch(ages, weights, heights, [gender or 'M' for gender in genders])
+    tdee = calculate_tdee_batch(bmr, levels)
+    target_calories = calculate_target_calories_batch(tdee, goals)
+
+    # NaN (never computed) compares unequal, so those rows are written too
+    changed = (bmr != _stored(bmrs)) | (tdee != _stored(tdees)) | (target_calories != _stored(targets))
+    if use_profile_weight:
+        changed |= weights != stored_weights
+
+    plans = []
+    for i in np.flatnonzero(changed).tolist():
+        plan = MealPlan(id=ids[i], bmr=float(bmr[i]), tdee=float(tdee[i]), target_calories=float(target_calories[i]))
+        plan.weight = float(weights[i])
+        plans.append(plan)
+    return plans, fields
+
+
+def recompute_shard(state, batch_size=1000, use_profile_weight=False, dry_run=False):
+    """
+    Recompute one shard from its last committed id; returns {'scanned': n,
+    'updated': n}. With dry_run, count the stale plans without writing.
+    """
+    scanned = updated = 0
+    columns = (
+        'id', 'age', 'weight', 'height', 'activity_level', 'goal', 'user__profile__gender',
+        'user__profile__weight', *FIELDS,
+    )
+    while not state.done:
+        rows = list(
+            MealPlan.objects.filter(id__gt=state.last_id, id__lte=state.high)
+            .order_by('id').values_list(*columns)[:batch_size]
+        )
+        if not rows:
+            state.last_id = state.high
+            state.save()
+            break
+
+        plans, fields = recompute_batch(rows, use_profile_weight)
+        if plans and not dry_run:
+            _write(plans, fields)
+        scanned += len(rows)
+        updated += len(plans)
+        # Advanced only once the batch is committed
+        state.last_id = rows[-1][0]
+        state.save()
+    return {'scanned': scanned, 'updated': updated}
+
+
+def _write(plans, fields):
+    # SQLite lets one writer in at a time and fails a transaction whose
+    # snapshot went stale while it waited; the batch rolled back, so redo it
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                MealPlan.objects.bulk_update(plans, fields)
+            return
+        except OperationalError:
+            if attempt == WRITE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def _run_shard(task):
+    state, options = task
+    started = time.perf_counter()
+    counts = recompute_shard(state, **options)
+    return state, counts, time.perf_counter() - started
+
+
+def recompute_meal_plans(batch_size=1000, shards=1, shard=None, workers=1, checkpoint_dir=None,
+                         use_profile_weight=False, dry_run=False, report=None):
+    """
+    Recompute every meal plan, or only shard (0-based) of shards. Returns
+    {'scanned': n, 'updated': n, 'seconds': s}. report(label, counts,
+    seconds), if given, is called as each shard finishes.
+    """
+    started = time.perf_counter()
+    states = load_shards(shards, None if dry_run else checkpoint_dir, shard)
+    states = [state for state in states if not state.done]
+
+    options = {'batch_size': batch_size, 'use_profile_weight': use_profile_weight, 'dry_run': dry_run}
+    tasks = [(state, options) for state in states]
+    if workers > 1 and len(tasks) > 1:
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(min(workers, len(tasks))) as pool:
+            results = pool.imap_unordered(_run_shard, tasks)
+            results = list(_reported(results, report))
+    else:
+        results = list(_reported(map(_run_shard, tasks), report))
+
+    return {
+        'scanned': sum(counts['scanned'] for _, counts, _ in results),
+        'updated': sum(counts['updated'] for _, counts, _ in results),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def _reported(results, report):
+    for state, counts, seconds in results:
+        if report:
+            report(state.label, counts, seconds)
+        yield state, counts, seconds
@@ -1,3 +1,380 @@
-from django.test import TestCase
+import datetime
+import io
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from fitpowerhub.datagen import generate_data
+from fitpowerhub.testing import ActivityBufferMixin
+from store.cache import tiered_cache
+from store.models import Cart, CartItem, Product, UserProfile
+
+from .calculators import (
+    calculate_bmr, calculate_bmr_batch, calculate_macro_plan, calculate_macronutrients,
+    calculate_macronutrients_batch, calculate_target_calories, calculate_target_calories_batch, calculate_tdee,
+    calculate_tdee_batch,
+)
+from .models import BodyMetricsYear, MealPlan
+from .planner import MACROS, nutrient_matrix, suggest_products
+from .progress import downsample, load_series, log_metrics, rolling_mean, trend
+from .recompute import recompute_meal_plans
+
+
+class BatchCalculatorTests(SimpleTestCase):
+    def test_batch_matches_scalar_calculators(self):
+        rng = random.Random(7)
+        rows = [
+            (rng.randint(15, 80), round(rng.uniform(40, 150), 1), round(rng.uniform(140, 210), 1),
+             rng.choice([1.2, 1.375, 1.55, 1.725, 1.9]), rng.choice(['WL', 'MG', 'MT', 'EN']), rng.choice('MF'))
+            for _ in range(5000)
+        ]
+        age, weight, height, activity, goal, gender = (list(column) for column in zip(*rows))
+        ratios = [rng.uniform(0.1, 0.6) for _ in rows]
+
+        bmr = calculate_bmr_batch(age, weight, height, gender)
+        tdee = calculate_tdee_batch(bmr, activity)
+        calories = calculate_target_calories_batch(tdee, goal)
+        macros = calculate_macronutrients_batch(calories, ratios, 0.4, 0.3)
+
+        for i, (a, w, h, level, g, sex) in enumerate(rows):
+            expected_bmr = calculate_bmr(a, w, h, sex)
+            expected_tdee = calculate_tdee(expected_bmr, level)
+            expected_calories = calculate_target_calories(expected_tdee, g)
+            expected = calculate_macronutrients(expected_calories, ratios[i], 0.4, 0.3)
+            self.assertEqual(bmr[i], expected_bmr)
+            self.assertEqual(tdee[i], expected_tdee)
+            self.assertEqual(calories[i], expected_calories)
+            self.assertEqual({key: values[i] for key, values in macros.items()}, expected)
+
+
+class BatchCalculatorViewTests(ActivityBufferMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('coach', password='pass12345')
+        self.client.force_login(self.user)
+        self.profiles = [
+            {'age': 30, 'weight': 80, 'height': 180, 'activity_level': 1.55, 'goal': 'MG', 'gender': 'M'},
+            {'age': 45, 'weight': 62.5, 'height': 165, 'activity_level': 1.2, 'goal': 'WL', 'gender': 'F'},
+            {},
+        ]
+
+    def single(self, profile):
+        response = self.client.post(reverse('calculate_macros'), json.dumps(profile), content_type='application/json')
+        result = response.json()
+        del result['success']
+        return result
+
+    def test_json_results_match_single_endpoint_in_order(self):
+        response = self.client.post(
+            reverse('calculate_macros_batch'), json.dumps({'profiles': self.profiles}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [self.single(profile) for profile in self.profiles])
+
+    def test_inputs_are_rounded_like_single_endpoint(self):
+        profiles = [
+            {'age': 30.9, 'weight': 80.06, 'height': 180.04, 'activity_level': level, 'goal': 'MT', 'gender': 'M'}
+            for level in (1.3755, 1.3754, 1.5)
+        ]
+        response = self.client.post(
+            reverse('calculate_macros_batch'), json.dumps({'profiles': profiles}), content_type='application/json'
+        )
+        self.assertEqual(response.json()['results'], [self.single(profile) for profile in profiles])
+
+    def test_csv_in_csv_out(self):
+        body = "age,weight,height,activity_level,goal,gender\n30,80,180,1.55,MG,M\n45,62.5,165,1.2,WL,F\n"
+        response = self.client.post(reverse('calculate_macros_batch'), body, content_type='text/csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = response.content.decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        header = lines[0].split(',')
+        first = dict(zip(header, lines[1].split(',')))
+        expected = self.single(self.profiles[0])
+        self.assertEqual(int(first['target_calories']), expected['target_calories'])
+        self.assertEqual(float(first['protein_grams']), expected['protein_grams'])
+
+    def test_invalid_input(self):
+        for body in ('{"profiles": [{"age": "abc"}]}', '[1, 2]', 'not json'):
+            response = self.client.post(reverse('calculate_macros_batch'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+
+class MacroMemoTests(ActivityBufferMixin, TestCase):
+    params = {'age': 30, 'weight': 80.04, 'height': 180, 'activity_level': 1.55, 'goal': 'MG', 'gender': 'M'}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        tiered_cache.local.clear()
+
+    def macro_stats(self):
+        return tiered_cache.stats()['namespaces'].get('macros', {})
+
+    def test_quick_path_is_memoized_and_queryless(self):
+        url = reverse('calculate_macros_quick')
+        first = self.client.get(url, self.params).json()
+        self.assertEqual(first['target_calories'], calculate_macro_plan(30, 80.0, 180.0, 1.55, 'MG')['target_calories'])
+
+        hits = self.macro_stats().get('local_hits', 0)
+        # Same normalized inputs: weight is only significant to 0.1
+        with self.assertNumQueries(0):
+            second = self.client.get(url, dict(self.params, weight=80.0)).json()
+        self.assertEqual(second, first)
+        self.assertEqual(self.macro_stats()['local_hits'], hits + 1)
+
+    def test_quick_path_skips_session_and_activity_for_logged_in_users(self):
+        user = User.objects.create_user('slider', password='pass12345')
+        self.client.force_login(user)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('calculate_macros_quick'), self.params)
+        self.assertEqual(self.activity_buffer._items, [])
+
+    def test_invalid_input(self):
+        for params in ({'weight': 'nan'}, {'age': 'inf'}, {'age': 'nan'}):
+            response = self.client.get(reverse('calculate_macros_quick'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class MealPlanProductsTests(ActivityBufferMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        tiered_cache.local.clear()
+        self.user = User.objects.create_user('planner', password='pass12345')
+        self.client.force_login(self.user)
+        # 2000 kcal at 30/40/30: 150g protein, 200g carbs, 66.7g fat
+        self.meal_plan = MealPlan.objects.create(
+            user=self.user, name='Cut', goal='MT', activity_level=1.55, age=30, weight=80, height=180,
+            target_calories=2000,
+        )
+        nutrition = {
+            'shake': (30, 5, 2, '3.00'),
+            'oats': (5, 40, 3, '1.00'),
+            'nuts': (6, 6, 15, '1.50'),
+            'steak': (30, 0, 12, '9.00'),
+            'candy': (0, 50, 0, '0.20'),
+        }
+        self.products = {}
+        for name, (protein, carbs, fat, price) in nutrition.items():
+            self.products[name] = Product.objects.create(
+                name=name, slug=name, description=name, price=price, category='FOO', stock=50,
+                protein_per_serving=protein, carbs_per_serving=carbs, fat_per_serving=fat,
+            )
+
+    def test_plan_meets_targets_at_lowest_cost(self):
+        plan = suggest_products(self.meal_plan)
+        targets = self.meal_plan.calculate_macros()
+        for macro in MACROS:
+            self.assertLessEqual(abs(plan.totals[macro] - targets[macro]), targets[macro] * 0.1 + 1e-9)
+        self.assertTrue(plan.optimal)
+
+        # Brute force over the same products confirms the minimum
+        products = list(self.products.values())
+        best = None
+        for servings in itertools.product(range(11), repeat=len(products)):
+            totals = [sum(n * (getattr(p, f'{m}_per_serving') or 0) for n, p in zip(servings, products)) for m in MACROS]
+            if all(abs(total - targets[m]) <= targets[m] * 0.1 for total, m in zip(totals, MACROS)):
+                cost = sum(n * float(p.price) for n, p in zip(servings, products))
+                best = cost if best is None else min(best, cost)
+        self.assertAlmostEqual(plan.cost, round(best, 2))
+
+    def test_no_plan_when_nothing_fits(self):
+        Product.objects.exclude(name='candy').update(is_active=False)
+        tiered_cache.invalidate('catalog')
+        self.assertIsNone(suggest_products(self.meal_plan))
+
+    def test_add_all_to_cart(self):
+        plan = suggest_products(self.meal_plan)
+        cart = Cart.objects.create(user=self.user)
+        product_id, servings = plan.items[0]
+        CartItem.objects.create(cart=cart, product_id=product_id, quantity=2)
+
+        response = self.client.post(reverse('add_meal_plan_products', args=[self.meal_plan.id]))
+        self.assertRedirects(response, reverse('cart'), fetch_redirect_response=False)
+        quantities = dict(cart.items.values_list('product_id', 'quantity'))
+        expected = dict(plan.items)
+        expected[product_id] += 2
+        self.assertEqual(quantities, expected)
+
+    def test_products_page(self):
+        response = self.client.get(reverse('meal_plan_products', args=[self.meal_plan.id]))
+        self.assertContains(response, 'Add all to cart')
+        other = User.objects.create_user('other', password='pass12345')
+        self.client.force_login(other)
+        response = self.client.get(reverse('meal_plan_products', args=[self.meal_plan.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_product_deleted_behind_the_cached_matrix(self):
+        stale = nutrient_matrix()
+        product_id, _ = suggest_products(self.meal_plan).items[0]
+        Product.objects.filter(pk=product_id).delete()
+        tiered_cache.set('catalog', 'nutrient_matrix', stale)
+
+        response = self.client.get(reverse('meal_plan_products', args=[self.meal_plan.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['items'])
+        self.assertNotIn(product_id, [item['product'].id for item in response.context['items']])
+
+        self.client.post(reverse('add_meal_plan_products', args=[self.meal_plan.id]))
+        self.assertNotIn(product_id, CartItem.objects.values_list('product_id', flat=True))
+
+
+class RecomputeMealPlansTests(TestCase):
+    def setUp(self):
+        generate_data(products=20, users=6, orders=0, meal_plans=40, seed=3)
+        self.checkpoints = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.checkpoints)
+
+    def expected(self, plan):
+        gender = getattr(getattr(plan.user, 'profile', None), 'gender', '') or 'M'
+        bmr = calculate_bmr(plan.age, plan.weight, plan.height, gender)
+        tdee = calculate_tdee(bmr, plan.activity_level)
+        return bmr, tdee, calculate_target_calories(tdee, plan.goal)
+
+    def test_only_stale_plans_are_written(self):
+        # Plans were generated with a random gender; bring them in line first
+        call_command('recompute_meal_plans', stdout=io.StringIO())
+        stale = list(MealPlan.objects.order_by('id')[:5])
+        MealPlan.objects.filter(id__in=[plan.id for plan in stale]).update(bmr=None, tdee=1, target_calories=1)
+        profile = UserProfile.objects.get(user=stale[0].user)
+        profile.gender = 'F' if profile.gender != 'F' else 'M'
+        profile.save()
+        changed = {plan.id for plan in MealPlan.objects.filter(user=stale[0].user)} | {plan.id for plan in stale}
+
+        out = io.StringIO()
+        call_command('recompute_meal_plans', '--batch-size', '7', stdout=out)
+        self.assertIn(f'updated {len(changed)} ', out.getvalue())
+        for plan in MealPlan.objects.select_related('user__profile'):
+            self.assertEqual((plan.bmr, plan.tdee, plan.target_calories), self.expected(plan))
+
+    def test_shards_cover_every_plan_once_and_resume(self):
+        MealPlan.objects.update(bmr=None)
+        result = recompute_meal_plans(batch_size=4, shards=3, shard=0, checkpoint_dir=self.checkpoints)
+        first = result['updated']
+        self.assertGreater(first, 0)
+        self.assertEqual(MealPlan.objects.filter(bmr__isnull=True).count(), 40 - first)
+
+        # The finished shard is skipped; the others pick up the rest
+        result = recompute_meal_plans(batch_size=4, shards=3, checkpoint_dir=self.checkpoints)
+        self.assertEqual(result['updated'], 40 - first)
+        self.assertFalse(MealPlan.objects.filter(bmr__isnull=True).exists())
+
+    def test_shard_layout_is_fixed_once_and_shards_keep_to_their_files(self):
+        MealPlan.objects.update(bmr=None)
+        second = recompute_meal_plans(batch_size=4, shards=2, shard=1, checkpoint_dir=self.checkpoints)
+        self.assertEqual(sorted(os.listdir(self.checkpoints)), ['shard-2-of-2.json', 'shards-2.json'])
+
+        # Later inserts don't move the boundaries the second shard already used
+        last = MealPlan.objects.order_by('-id').first()
+        last.pk = last.bmr = None
+        last.save()
+        first = recompute_meal_plans(batch_size=4, shards=2, shard=0, checkpoint_dir=self.checkpoints)
+        self.assertEqual(first['updated'] + second['updated'], 40)
+        self.assertEqual(MealPlan.objects.filter(bmr__isnull=True).count(), 1)
+
+    def test_interrupted_run_resumes_after_last_committed_batch(self):
+        MealPlan.objects.update(bmr=None)
+        original = MealPlan.objects.bulk_update
+        calls = []
+
+        def failing_bulk_update(objs, fields, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 3:
+                raise DatabaseError('disk full')
+            return original(objs, fields, **kwargs)
+
+        with mock.patch.object(MealPlan.objects, 'bulk_update', failing_bulk_update):
+            with self.assertRaises(DatabaseError):
+                recompute_meal_plans(batch_size=5, checkpoint_dir=self.checkpoints)
+        self.assertEqual(MealPlan.objects.filter(bmr__isnull=False).count(), 10)
+
+        result = recompute_meal_plans(batch_size=5, checkpoint_dir=self.checkpoints)
+        self.assertEqual(result, {**result, 'scanned': 30, 'updated': 30})
+
+    def test_dry_run_writes_nothing(self):
+        MealPlan.objects.update(bmr=None)
+        result = recompute_meal_plans(dry_run=True, checkpoint_dir=self.checkpoints)
+        self.assertEqual(result['updated'], 40)
+        self.assertEqual(MealPlan.objects.filter(bmr__isnull=True).count(), 40)
+        self.assertEqual(os.listdir(self.checkpoints), [])
+
+
+class BodyMetricsTests(ActivityBufferMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('tracker', password='pass12345')
+        self.client.force_login(self.user)
+        UserProfile.objects.update_or_create(user=self.user, defaults={'weight': 90})
+
+    def test_readings_are_packed_per_user_and_year(self):
+        log_metrics(self.user, datetime.date(2024, 1, 1), weight=90.0)
+        log_metrics(self.user, datetime.date(2024, 12, 31), weight=85.5, height=180)
+        log_metrics(self.user, datetime.date(2024, 12, 31), weight=85.0)
+        log_metrics(self.user, datetime.date(2025, 1, 2), weight=84.5)
+
+        row = BodyMetricsYear.objects.get(user=self.user, year=2024)
+        self.assertEqual(len(bytes(row.weight)), 366 * 4)
+        self.assertEqual(BodyMetricsYear.objects.count(), 2)
+
+        with self.assertNumQueries(1):
+            dates, series = load_series(self.user, 2024, 2025)
+        self.assertEqual(len(dates), 366 + 365)
+        logged = np.flatnonzero(~np.isnan(series['weight']))
+        self.assertEqual([str(dates[i]) for i in logged], ['2024-01-01', '2024-12-31', '2025-01-02'])
+        self.assertEqual(series['weight'][logged].tolist(), [90.0, 85.0, 84.5])
+        self.assertEqual(np.flatnonzero(~np.isnan(series['height'])).tolist(), [365])
+        # Past readings leave the profile's current weight alone
+        self.assertEqual(UserProfile.objects.get(user=self.user).weight, 90)
+
+    def test_rolling_mean_trend_and_downsample(self):
+        values = np.array([1, np.nan, 3, np.nan, np.nan, np.nan, 7, 8])
+        np.testing.assert_array_equal(rolling_mean(values, 3), [1, 1, 2, 3, 3, np.nan, 7, 7.5])
+
+        line = 80 - 0.1 * np.arange(30.0)
+        line[::2] = np.nan
+        self.assertAlmostEqual(trend(line), -0.1)
+        self.assertIsNone(trend(np.array([np.nan, 80.0])))
+
+        dates = np.arange(np.datetime64('2024-01-01'), np.datetime64('2024-01-09'))
+        starts, means = downsample(dates, values, 4)
+        self.assertEqual([str(date) for date in starts], ['2024-01-01', '2024-01-03', '2024-01-05', '2024-01-07'])
+        np.testing.assert_array_equal(means, [1, 3, np.nan, 7.5])
+
+    def test_log_and_fetch_through_the_api(self):
+        today = timezone.localdate()
+        response = self.client.post(reverse('log_body_metrics'), {'weight': 88.2})
+        self.assertEqual(response.json()['success'], True)
+        # Today's reading is also the profile's current weight
+        self.assertAlmostEqual(UserProfile.objects.get(user=self.user).weight, 88.2)
+
+        response = self.client.post(reverse('log_body_metrics'), {'weight': 10})
+        self.assertEqual(response.status_code, 400)
+        tomorrow = today + datetime.timedelta(days=1)
+        response = self.client.post(reverse('log_body_metrics'), {'weight': 80, 'date': tomorrow.isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+        data = self.client.get(reverse('body_metrics')).json()
+        self.assertEqual(len(data['dates']), len(data['metrics']['weight']['values']))
+        self.assertEqual(data['dates'][today.timetuple().tm_yday - 1], today.isoformat())
+        self.assertEqual(data['metrics']['weight']['latest'], 88.2)
+        self.assertIsNone(data['metrics']['height']['latest'])
+
+        data = self.client.get(reverse('body_metrics'), {'points': 12}).json()
+        self.assertEqual(len(data['dates']), 12)
+        self.assertIn(88.2, data['metrics']['weight']['values'])
+
+        response = self.client.get(reverse('body_metrics'), {'start': today.year, 'end': today.year + 20})
+        self.assertEqual(response.status_code, 400)
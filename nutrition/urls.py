@@ -4,6 +4,12 @@ from . import views
 urlpatterns = [
     path('', views.meal_planner_view, name='meal_planner'),
     path('calculate/', views.calculate_macros_view, name='calculate_macros'),
+    path('calculate/quick/', views.calculate_macros_quick_view, name='calculate_macros_quick'),
+    path('calculate/batch/', views.calculate_macros_batch_view, name='calculate_macros_batch'),
     path('create/', views.create_meal_plan_view, name='create_meal_plan'),
     path('<int:plan_id>/', views.meal_plan_detail_view, name='meal_plan_detail'),
+    path('<int:plan_id>/products/', views.meal_plan_products_view, name='meal_plan_products'),
+    path('<int:plan_id>/products/add/', views.add_meal_plan_products_view, name='add_meal_plan_products'),
+    path('progress/', views.body_metrics_view, name='body_metrics'),
+    path('progress/log/', views.log_body_metrics_view, name='log_body_metrics'),
 ]
\ No newline at end of file
@@ -1,12 +1,41 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+import csv
+import io
 import json
+import math
+import numpy as np
 
 from .models import MealPlan
-from .forms import MealPlanForm
-from .calculators import calculate_bmr, calculate_tdee, calculate_target_calories
+from .planner import build_nutrient_matrix, suggest_products
+from .progress import METRICS, downsample, load_series, log_metrics, rolling_mean, trend
+from .forms import BodyMetricsForm, MealPlanForm
+from .calculators import (
+    calculate_bmr, calculate_bmr_batch, calculate_macro_plan, calculate_macronutrients_batch,
+    calculate_target_calories, calculate_target_calories_batch, calculate_tdee, calculate_tdee_batch,
+    macro_ratios_batch, round_calories,
+)
+from fitpowerhub.middleware import skip_activity_tracking
+from store.cache import tiered_cache
+from store.models import Product
+from store.utils import add_products_to_cart, get_or_create_cart
+
+# Memoized macro plans are deterministic, so they only age out of the LRU
+MACRO_CACHE_TIMEOUT = 60 * 60 * 24  # seconds
+
+# Input columns of the batch calculator, with the defaults calculate_macros_view uses
+BATCH_DEFAULTS = {'age': 25, 'weight': 70, 'height': 170, 'activity_level': 1.375, 'goal': 'MT', 'gender': 'M'}
+BATCH_NUMERIC = ('age', 'weight', 'height', 'activity_level')
+# Decimal places calculator inputs are rounded to, by both the single and batch endpoints
+INPUT_DIGITS = {'weight': 1, 'height': 1, 'activity_level': 3}
+BATCH_RESULT_FIELDS = (
+    'bmr', 'tdee', 'target_calories', 'protein_grams', 'carbs_grams', 'fat_grams',
+    'protein_ratio', 'carbs_ratio', 'fat_ratio',
+)
 
 @login_required
 def meal_planner_view(request):
@@ -24,55 +53,139 @@ def calculate_macros_view(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            
-            age = int(data.get('age', 25))
-            weight = float(data.get('weight', 70))
-            height = float(data.get('height', 170))
-            activity_level = float(data.get('activity_level', 1.375))
-            goal = data.get('goal', 'MT')
-            gender = data.get('gender', 'M')
-            
-            # Calculate everything
-            bmr = calculate_bmr(age, weight, height, gender)
-            tdee = calculate_tdee(bmr, activity_level)
-            target_calories = calculate_target_calories(tdee, goal)
-            
-            # Macronutrient distribution based on goal
-            if goal == 'WL':  # Weight loss
-                protein_ratio = 0.35
-                carbs_ratio = 0.35
-                fat_ratio = 0.30
-            elif goal == 'MG':  # Muscle gain
-                protein_ratio = 0.40
-                carbs_ratio = 0.40
-                fat_ratio = 0.20
-            else:  # Maintenance
-                protein_ratio = 0.30
-                carbs_ratio = 0.40
-                fat_ratio = 0.30
-            
-            protein_grams = round((target_calories * protein_ratio) / 4, 1)
-            carbs_grams = round((target_calories * carbs_ratio) / 4, 1)
-            fat_grams = round((target_calories * fat_ratio) / 9, 1)
-            
-            return JsonResponse({
-                'success': True,
-                'bmr': round(bmr),
-                'tdee': round(tdee),
-                'target_calories': round(target_calories),
-                'protein_grams': protein_grams,
-                'carbs_grams': carbs_grams,
-                'fat_grams': fat_grams,
-                'protein_ratio': protein_ratio,
-                'carbs_ratio': carbs_ratio,
-                'fat_ratio': fat_ratio,
-            })
-            
+            return JsonResponse({'success': True, **get_macro_plan(data)})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+@skip_activity_tracking
+def calculate_macros_quick_view(request):
+    """
+    calculate_macros_view for GET query parameters, open to anonymous
+    visitors. Nothing here touches the session or user, so a request costs
+    no queries when the result is memoized.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    
+    try:
+        return JsonResponse({'success': True, **get_macro_plan(request.GET)})
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+def normalize_macro_inputs(data):
+    """
+    Calculator inputs reduced to the values that change the result: whole
+    years, weight and height to 0.1, and goal/gender codes the calculators
+    treat the same collapsed together.
+    """
+    age = float(data.get('age', 25))
+    weight = round(float(data.get('weight', 70)), INPUT_DIGITS['weight'])
+    height = round(float(data.get('height', 170)), INPUT_DIGITS['height'])
+    activity_level = round(float(data.get('activity_level', 1.375)), INPUT_DIGITS['activity_level'])
+    if not all(math.isfinite(value) for value in (age, weight, height, activity_level)):
+        raise ValueError('Invalid number')
+    age = int(age)
+    goal = data.get('goal', 'MT')
+    if goal not in ('WL', 'MG'):
+        goal = 'MT'
+    gender = 'F' if data.get('gender', 'M') == 'F' else 'M'
+    return age, weight, height, activity_level, goal, gender
+
+
+def get_macro_plan(data):
+    """calculate_macro_plan() for request data, memoized in the 'macros' namespace of tiered_cache"""
+    inputs = normalize_macro_inputs(data)
+    key = ':'.join(str(value) for value in inputs)
+    return tiered_cache.get_or_set('macros', key, lambda: calculate_macro_plan(*inputs), MACRO_CACHE_TIMEOUT)
+
+def parse_batch(request):
+    """Column lists from a JSON ({"profiles": [...]}) or CSV request body, in row order"""
+    limits = getattr(settings, 'NUTRITION_BATCH', {})
+    max_bytes = limits.get('MAX_BYTES', 16 * 1024 * 1024)
+    if int(request.META.get('CONTENT_LENGTH') or 0) > max_bytes:
+        raise ValueError(f'Request body larger than {max_bytes} bytes')
+    # Read the stream directly: request.body is capped at DATA_UPLOAD_MAX_MEMORY_SIZE
+    body = request.read(max_bytes + 1).decode('utf-8')
+    if request.content_type == 'text/csv':
+        rows = list(csv.DictReader(io.StringIO(body)))
+    else:
+        rows = json.loads(body).get('profiles')
+        if not isinstance(rows, list):
+            raise ValueError('Expected a "profiles" list')
+    
+    limit = limits.get('MAX_ROWS', 100000)
+    if len(rows) > limit:
+        raise ValueError(f'At most {limit} profiles per request')
+    
+    columns = {}
+    for name, default in BATCH_DEFAULTS.items():
+        columns[name] = [row.get(name) if row.get(name) not in (None, '') else default for row in rows]
+    for name in BATCH_NUMERIC:
+        values = np.array(columns[name], dtype=np.float64)
+        if not np.isfinite(values).all():
+            raise ValueError(f'Invalid {name} value')
+        columns[name] = values
+    # Ages are whole years and the rest rounded as in normalize_macro_inputs.
+    # Python's round(), not np.round(): the two disagree on values like 1.3755
+    columns['age'] = np.trunc(columns['age'])
+    for name, digits in INPUT_DIGITS.items():
+        columns[name] = np.array([round(value, digits) for value in columns[name].tolist()], dtype=np.float64)
+    return columns
+
+
+def calculate_batch(columns):
+    """Result columns for every profile; the same numbers calculate_macros_view returns"""
+    bmr = calculate_bmr_batch(columns['age'], columns['weight'], columns['height'], columns['gender'])
+    tdee = calculate_tdee_batch(bmr, columns['activity_level'])
+    target_calories = calculate_target_calories_batch(tdee, columns['goal'])
+    protein_ratio, carbs_ratio, fat_ratio = macro_ratios_batch(columns['goal'])
+    macros = calculate_macronutrients_batch(target_calories, protein_ratio, carbs_ratio, fat_ratio)
+    return {
+        'bmr': round_calories(bmr),
+        'tdee': round_calories(tdee),
+        'target_calories': round_calories(target_calories),
+        'protein_grams': macros['protein'],
+        'carbs_grams': macros['carbs'],
+        'fat_grams': macros['fat'],
+        'protein_ratio': protein_ratio,
+        'carbs_ratio': carbs_ratio,
+        'fat_ratio': fat_ratio,
+    }
+
+
+@login_required
+def calculate_macros_batch_view(request):
+    """
+    Batch version of calculate_macros_view. Takes JSON ({"profiles": [...]})
+    or CSV (with a header row) and answers in the same format, one result
+    per profile in input order.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    
+    try:
+        columns = parse_batch(request)
+    except (ValueError, TypeError, AttributeError, csv.Error) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    results = calculate_batch(columns)
+    values = zip(*(results[field].tolist() for field in BATCH_RESULT_FIELDS))
+    
+    if request.content_type == 'text/csv':
+        response = HttpResponse(content_type='text/csv')
+        writer = csv.writer(response)
+        writer.writerow(BATCH_RESULT_FIELDS)
+        writer.writerows(values)
+        return response
+    
+    return JsonResponse({
+        'success': True,
+        'count': len(columns['goal']),
+        'results': [dict(zip(BATCH_RESULT_FIELDS, row)) for row in values],
+    })
+
 @login_required
 def create_meal_plan_view(request):
     """Create a new meal plan"""
@@ -128,4 +241,123 @@ def meal_plan_detail_view(request, plan_id):
         'macros': macros,
     }
     
-    return render(request, 'nutrition/meal_plan_detail.html', context)
\ No newline at end of file
+    return render(request, 'nutrition/meal_plan_detail.html', context)
+
+def solve_meal_plan(meal_plan):
+    """
+    suggest_products() for the meal plan and its products by id. If the
+    cached nutrient matrix still lists a deleted product, the plan is solved
+    again on a freshly built matrix.
+    """
+    plan = suggest_products(meal_plan)
+    products = Product.objects.in_bulk([product_id for product_id, _ in plan.items]) if plan else {}
+    if plan and len(products) < len(plan.items):
+        plan = suggest_products(meal_plan, build_nutrient_matrix())
+        products = Product.objects.in_bulk([product_id for product_id, _ in plan.items]) if plan else {}
+    return plan, products
+
+@login_required
+def meal_plan_products_view(request, plan_id):
+    """Cheapest product servings that meet the meal plan's macro targets"""
+    meal_plan = get_object_or_404(MealPlan, id=plan_id, user=request.user)
+    plan, products = solve_meal_plan(meal_plan)
+    
+    items = []
+    if plan:
+        items = [
+            {'product': products[product_id], 'servings': servings, 'subtotal': products[product_id].price * servings}
+            for product_id, servings in plan.items
+            if product_id in products
+        ]
+    
+    context = {
+        'meal_plan': meal_plan,
+        'plan': plan,
+        'items': items,
+    }
+    return render(request, 'nutrition/meal_plan_products.html', context)
+
+@login_required
+def add_meal_plan_products_view(request, plan_id):
+    """Add every product of the meal plan's shopping list to the cart"""
+    if request.method != 'POST':
+        return redirect('meal_plan_products', plan_id=plan_id)
+    
+    meal_plan = get_object_or_404(MealPlan, id=plan_id, user=request.user)
+    # Solved again rather than trusting posted quantities; the catalog may have changed
+    plan, products = solve_meal_plan(meal_plan)
+    if plan is None:
+        messages.error(request, 'No combination of products fits this plan right now.')
+        return redirect('meal_plan_products', plan_id=plan_id)
+    
+    add_products_to_cart(
+        get_or_create_cart(request),
+        {product_id: servings for product_id, servings in plan.items if product_id in products}
+    )
+    messages.success(request, f'Added {len(plan.items)} products for {meal_plan.name} to your cart!')
+    return redirect('cart')
+
+def progress_values(values):
+    """Rounded values for JSON, with None for days (or spans) without readings"""
+    rounded = np.round(values, 2).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded.tolist()
+
+@login_required
+def body_metrics_view(request):
+    """
+    Body-metrics history as JSON, for the ?start= to ?end= years (default:
+    this year). Each metric has its daily values and a ?window=-day rolling
+    average, reduced to the means of ?points= equal spans when given, plus
+    its trend per week and latest reading.
+    """
+    limits = getattr(settings, 'BODY_METRICS', {})
+    try:
+        start = int(request.GET.get('start') or timezone.localdate().year)
+        end = int(request.GET.get('end') or start)
+        window = int(request.GET.get('window') or 7)
+        points = int(request.GET.get('points') or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid parameter'}, status=400)
+    max_years = limits.get('MAX_YEARS', 10)
+    if not 1 <= end - start + 1 <= max_years or not 1900 <= start <= end < 9999:
+        return JsonResponse({'success': False, 'error': f'Choose 1 to {max_years} years'}, status=400)
+    if not 1 <= window <= 366 or points < 0:
+        return JsonResponse({'success': False, 'error': 'Invalid window or points'}, status=400)
+    
+    dates, series = load_series(request.user, start, end)
+    metrics = {}
+    for metric, values in series.items():
+        logged = np.flatnonzero(~np.isnan(values))
+        slope = trend(values)
+        rolling = rolling_mean(values, window)
+        chart_dates, chart_values = dates, values
+        if points:
+            chart_dates, chart_values = downsample(dates, values, points)
+            rolling = downsample(dates, rolling, points)[1]
+        metrics[metric] = {
+            'values': progress_values(chart_values),
+            'rolling': progress_values(rolling),
+            'trend_per_week': None if slope is None else round(slope * 7, 3),
+            'latest': progress_values(values[logged[-1:]])[0] if len(logged) else None,
+        }
+    
+    return JsonResponse({
+        'success': True,
+        'dates': [str(date) for date in chart_dates.tolist()],
+        'metrics': metrics,
+    })
+
+@login_required
+def log_body_metrics_view(request):
+    """Log a day's weight and/or height (see BodyMetricsForm)"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    
+    form = BodyMetricsForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+    
+    readings = {metric: form.cleaned_data[metric] for metric in METRICS}
+    log_metrics(request.user, form.cleaned_data['date'], **readings)
+    return JsonResponse({'success': True, 'date': str(form.cleaned_data['date']), **readings})
@@ -0,0 +1,116 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import UserActivity, UserActivityHourly
+
+# Raw rows may still be sitting in the middleware buffer for a few seconds,
+# so only hours that ended at least this long ago are rolled up.
+SETTLE_TIME = timedelta(minutes=5)
+
+
+def _floor_hour(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_activity(now=None, batch_size=1000):
+    """
+    Aggregate raw UserActivity rows into UserActivityHourly, one day at a
+    time, starting from the last hour already rolled up. Re-running is
+    safe: counts for an hour are recomputed and upserted.
+    Returns the number of hourly rows written.
+    """
+    now = now or timezone.now()
+    cutoff = _floor_hour(now - SETTLE_TIME)
+
+    last_hour = UserActivityHourly.objects.aggregate(last=Max('hour'))['last']
+    if last_hour is not None:
+        start = last_hour
+    else:
+        first = UserActivity.objects.aggregate(first=Min('timestamp'))['first']
+        if first is None:
+            return 0
+        start = _floor_hour(first)
+
+    written = 0
+    while start < cutoff:
+        end = min(start + timedelta(days=1), cutoff)
+        rows = (
+            UserActivity.objects
+            .filter(timestamp__gte=start, timestamp__lt=end)
+            .annotate(hour=TruncHour('timestamp'))
+            .values('user_id', 'path', 'hour')
+            .annotate(hits=Count('id'))
+            .order_by()
+        )
+        hourly = [UserActivityHourly(**row) for row in rows]
+        UserActivityHourly.objects.bulk_create(
+            hourly,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'path', 'hour'],
+            update_fields=['hits'],
+        )
+        written += len(hourly)
+        start = end
+    return written
+
+
+def purge_activity(retention_days=None, batch_size=5000, now=None):
+    """
+    Delete raw UserActivity rows older than the retention window, in
+    batches so the table is never locked for long. Rows that haven't been
+    rolled up yet are kept. Returns the number of rows deleted.
+    """
+    if retention_days is None:
+        retention_days = getattr(settings, 'USER_ACTIVITY_RETENTION_DAYS', 30)
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=retention_days)
+
+    last_hour = UserActivityHourly.objects.aggregate(last=Max('hour'))['last']
+    if last_hour is None:
+        return 0
+    cutoff = min(cutoff, last_hour)
+
+    deleted = 0
+    while True:
+        ids = list(
+            UserActivity.objects.filter(timestamp__lt=cutoff)
+            .order_by('timestamp')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += UserActivity.objects.filter(id__in=ids).delete()[0]
+
+
+def compact_activity(retention_days=None, batch_size=5000, now=None):
+    """Roll up new activity, then purge raw rows past retention"""
+    rolled_up = rollup_activity(now=now)
+    purged = purge_activity(retention_days=retention_days, batch_size=batch_size, now=now)
+    return {'rolled_up': rolled_up, 'purged': purged}
+
+
+def active_users_per_day(start, end):
+    """[{'day': date, 'users': n}, ...] for days in [start, end)"""
+    return list(
+        UserActivityHourly.objects
+        .filter(hour__gte=start, hour__lt=end)
+        .annotate(day=TruncDate('hour'))
+        .values('day')
+        .annotate(users=Count('user', distinct=True))
+        .order_by('day')
+    )
+
+
+def top_paths(start, end, limit=10):
+    """[{'path': ..., 'hits': n}, ...] with the most requested paths in [start, end)"""
+    return list(
+        UserActivityHourly.objects
+        .filter(hour__gte=start, hour__lt=end)
+        .values('path')
+        .annotate(hits=Sum('hits'))
+        .order_by('-hits', 'path')[:limit]
+    )
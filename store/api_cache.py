@@ -0,0 +1,173 @@
+import threading
+import time
+import logging
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamError(Exception):
+    """Raised by a fetch function when the upstream API is unavailable"""
+
+
+class CircuitBreaker:
+    """
+    Stop calling an upstream after repeated failures.
+
+    After failure_threshold consecutive failures the breaker opens and
+    allow() returns False until reset_timeout seconds have passed. Then a
+    single trial call is let through: success closes the breaker, failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Circuit breaker opened after %s failures", self.failures)
+                self.opened_at = time.monotonic()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class StaleWhileRevalidateCache:
+    """
+    Cache for upstream API responses.
+
+    Entries are stored as {'value': ..., 'expires': timestamp} and kept in
+    the backend for stale_ttl seconds past their expiry. A stale entry is
+    returned immediately while one background thread refreshes it.
+    Concurrent misses for the same key share a single upstream call.
+    Empty results (fetch returned None or failed) are cached for
+    negative_ttl seconds so an outage doesn't cost a timeout per request.
+    """
+
+    def __init__(self, backend=None, stale_ttl=86400, negative_ttl=30, breaker=None):
+        self.backend = backend or cache
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.breaker = breaker or CircuitBreaker()
+        self._flight = SingleFlight()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, key, fetch, ttl):
+        entry = self.backend.get(key)
+
+        if entry is not None:
+            if time.time() >= entry['expires']:
+                self._refresh_in_background(key, fetch, ttl)
+            return entry['value']
+
+        return self._flight.do(key, lambda: self._load(key, fetch, ttl, keep_stale=False))
+
+    def _load(self, key, fetch, ttl, keep_stale):
+        if not self.breaker.allow():
+            return None
+
+        try:
+            value = fetch()
+        except UpstreamError:
+            self.breaker.record_failure()
+            if not keep_stale:
+                self._store(key, None, self.negative_ttl, 0)
+            return None
+
+        self.breaker.record_success()
+        if value is None:
+            self._store(key, None, self.negative_ttl, 0)
+        else:
+            self._store(key, value, ttl, self.stale_ttl)
+        return value
+
+    def _store(self, key, value, ttl, stale_ttl):
+        entry = {'value': value, 'expires': time.time() + ttl}
+        self.backend.set(key, entry, ttl + stale_ttl)
+
+    def _refresh_in_background(self, key, fetch, ttl):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._flight.do(key, lambda: self._load(key, fetch, ttl, keep_stale=True))
+            except Exception:
+                logger.exception("Background refresh failed for %s", key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+# Shared by every ProductAPIService instance so the breaker and in-flight
+# calls are per process, not per request.
+product_api_cache = StaleWhileRevalidateCache()
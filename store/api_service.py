@@ -1,93 +1,219 @@
+import asyncio
 import requests
 import json
-from django.core.cache import cache
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db.models import Q
 import random
 
+from .api_cache import UpstreamError, product_api_cache
+from .models import ExternalProduct
+
+# Mapear nuestras categorías a las de la API
+CATEGORY_MAP = {
+    'SUP': 'beauty',  # Suplementos -> Belleza/Salud
+    'CLO': 'fashion', # Ropa -> Moda
+    'EQU': 'home-decoration', # Equipo -> Decoración
+    'FOO': 'groceries' # Comida -> Alimentos
+}
+
+# Worker threads for live calls made from the async variants. Not the
+# loop's default executor: async_to_sync waits for that one when its loop
+# closes, so a call still blocked upstream would hold the caller past the
+# deadline. Threads here finish on their own (bounded by timeout).
+_live_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='product-api')
+
+
 class ProductAPIService:
-    def __init__(self):
-        self.base_url = "https://dummyjson.com/products"
+    def __init__(self, base_url="https://dummyjson.com/products", timeout=5,
+                 max_concurrency=4, deadline=10, api_cache=None, use_mirror=True):
+        self.base_url = base_url
         self.cache_timeout = 3600  # 1 hora
-    
-    def get_all_products(self, limit=20):
-        cache_key = f"api_products_all_{limit}"
-        cached = cache.get(cache_key)
-        
-        if cached:
-            return cached
-        
+        self.timeout = timeout
+        # Límites para las peticiones concurrentes (get_many_details, get_categories)
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.api_cache = api_cache or product_api_cache
+        # Leer del espejo local (ExternalProduct) cuando ya está sincronizado
+        self.use_mirror = use_mirror
+
+    def _fetch(self, path, cache_key, cache_timeout):
+        """
+        GET a path under base_url through the shared API cache.
+        Returns None when the request fails or the resource doesn't exist.
+        """
+        return self.api_cache.get_or_fetch(cache_key, lambda: self._request(path), cache_timeout)
+
+    def _request(self, path):
         try:
-            response = requests.get(f"{self.base_url}?limit={limit}", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                cache.set(cache_key, data, self.cache_timeout)
-                return data
-        except:
-            pass
-        
-        return {'products': []}
-    
-    def get_products_by_category(self, category, limit=10):
-        # Mapear nuestras categorías a las de la API
-        category_map = {
-            'SUP': 'beauty',  # Suplementos -> Belleza/Salud
-            'CLO': 'fashion', # Ropa -> Moda
-            'EQU': 'home-decoration', # Equipo -> Decoración
-            'FOO': 'groceries' # Comida -> Alimentos
-        }
-        
-        api_category = category_map.get(category, '')
+            response = requests.get(f"{self.base_url}{path}", timeout=self.timeout)
+        except requests.RequestException as e:
+            raise UpstreamError(str(e)) from e
+
+        if response.status_code >= 500:
+            raise UpstreamError(f"HTTP {response.status_code}")
+        if response.status_code != 200:
+            return None
+
+        try:
+            return response.json()
+        except ValueError as e:
+            raise UpstreamError("Invalid JSON response") from e
+
+    def get_catalog_page(self, skip=0, limit=100):
+        """
+        Fetch one page of the full catalog, bypassing the caches.
+        Used by the mirror sync; raises UpstreamError if the API is down or
+        answers with anything but a page (e.g. 429 or 404).
+        """
+        data = self._request(f"?limit={limit}&skip={skip}")
+        if data is None:
+            raise UpstreamError(f"No catalog page at skip={skip}")
+        return data
+
+    def _use_mirror(self):
+        return self.use_mirror and ExternalProduct.objects.exists()
+
+    def _mirror_products(self, queryset, limit):
+        products = [row.data for row in queryset[:limit]]
+        return {'products': products, 'total': queryset.count(), 'skip': 0, 'limit': limit}
+
+    # Mirror lookups (no network)
+
+    def _mirror_all_products(self, limit=20):
+        return self._mirror_products(ExternalProduct.objects.all(), limit)
+
+    def _mirror_products_by_category(self, category, limit=10):
+        api_category = CATEGORY_MAP.get(category, '')
         if not api_category:
             return {'products': []}
-        
-        cache_key = f"api_products_{api_category}_{limit}"
-        cached = cache.get(cache_key)
-        
-        if cached:
-            return cached
-        
+        return self._mirror_products(ExternalProduct.objects.filter(category=api_category), limit)
+
+    def _mirror_search_products(self, query, limit=10):
+        return self._mirror_products(
+            ExternalProduct.objects.filter(Q(title__icontains=query) | Q(data__description__icontains=query)),
+            limit
+        )
+
+    def _mirror_product_detail(self, product_id):
         try:
-            response = requests.get(f"{self.base_url}/category/{api_category}?limit={limit}", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                cache.set(cache_key, data, self.cache_timeout)
-                return data
-        except:
-            pass
-        
-        return {'products': []}
-    
+            return ExternalProduct.objects.get(external_id=product_id).data
+        except (ExternalProduct.DoesNotExist, ValueError):
+            return None
+
+    # Live lookups (through the API cache)
+
+    def _live_all_products(self, limit=20):
+        data = self._fetch(f"?limit={limit}", f"api_products_all_{limit}", self.cache_timeout)
+        return data or {'products': []}
+
+    def _live_products_by_category(self, category, limit=10):
+        api_category = CATEGORY_MAP.get(category, '')
+        if not api_category:
+            return {'products': []}
+
+        data = self._fetch(
+            f"/category/{api_category}?limit={limit}",
+            f"api_products_{api_category}_{limit}",
+            self.cache_timeout
+        )
+        return data or {'products': []}
+
+    def _live_search_products(self, query, limit=10):
+        data = self._fetch(
+            f"/search?q={query}&limit={limit}",
+            f"api_search_{query}_{limit}",
+            300  # 5 minutos para búsquedas
+        )
+        return data or {'products': []}
+
+    def _live_product_detail(self, product_id):
+        return self._fetch(f"/{product_id}", f"api_product_{product_id}", self.cache_timeout)
+
+    def _call(self, mirror, live, *args):
+        if self._use_mirror():
+            return mirror(*args)
+        return live(*args)
+
+    def get_all_products(self, limit=20):
+        return self._call(self._mirror_all_products, self._live_all_products, limit)
+
+    def get_products_by_category(self, category, limit=10):
+        return self._call(self._mirror_products_by_category, self._live_products_by_category, category, limit)
+
     def search_products(self, query, limit=10):
-        cache_key = f"api_search_{query}_{limit}"
-        cached = cache.get(cache_key)
-        
-        if cached:
-            return cached
-        
-        try:
-            response = requests.get(f"{self.base_url}/search?q={query}&limit={limit}", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                cache.set(cache_key, data, 300)  # 5 minutos para búsquedas
-                return data
-        except:
-            pass
-        
-        return {'products': []}
-    
+        return self._call(self._mirror_search_products, self._live_search_products, query, limit)
+
     def get_product_detail(self, product_id):
-        cache_key = f"api_product_{product_id}"
-        cached = cache.get(cache_key)
-        
-        if cached:
-            return cached
-        
-        try:
-            response = requests.get(f"{self.base_url}/{product_id}", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                cache.set(cache_key, data, self.cache_timeout)
-                return data
-        except:
-            pass
-        
-        return None
\ No newline at end of file
+        return self._call(self._mirror_product_detail, self._live_product_detail, product_id)
+
+    # Async variants. Mirror reads go through sync_to_async so they use the
+    # thread Django manages connections for; requests is blocking, so live
+    # calls run in _live_executor threads and the event loop only
+    # coordinates them.
+
+    async def _acall(self, mirror, live, *args):
+        if await sync_to_async(self._use_mirror)():
+            return await sync_to_async(mirror)(*args)
+        return await asyncio.get_running_loop().run_in_executor(_live_executor, live, *args)
+
+    async def aget_all_products(self, limit=20):
+        return await self._acall(self._mirror_all_products, self._live_all_products, limit)
+
+    async def aget_products_by_category(self, category, limit=10):
+        return await self._acall(self._mirror_products_by_category, self._live_products_by_category, category, limit)
+
+    async def asearch_products(self, query, limit=10):
+        return await self._acall(self._mirror_search_products, self._live_search_products, query, limit)
+
+    async def aget_product_detail(self, product_id):
+        return await self._acall(self._mirror_product_detail, self._live_product_detail, product_id)
+
+    async def _gather_limited(self, calls, default):
+        """
+        Run the (coroutine function, args) pairs concurrently, at most
+        max_concurrency at a time, and stop waiting once the deadline passes.
+        Results keep the order of calls; late or failed calls get default.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(func, args):
+            async with semaphore:
+                return await func(*args)
+
+        tasks = [asyncio.ensure_future(run(func, args)) for func, args in calls]
+        if not tasks:
+            return []
+
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        for task in pending:
+            task.cancel()
+
+        results = []
+        for task in tasks:
+            if task in done and task.exception() is None:
+                results.append(task.result())
+            else:
+                results.append(default)
+        return results
+
+    async def aget_many_details(self, ids):
+        """Fetch several product details concurrently, in the order of ids"""
+        return await self._gather_limited(
+            [(self.aget_product_detail, (product_id,)) for product_id in ids],
+            None
+        )
+
+    async def aget_categories(self, categories, limit=10):
+        """Fetch several categories concurrently, keyed by category code"""
+        results = await self._gather_limited(
+            [(self.aget_products_by_category, (category, limit)) for category in categories],
+            {'products': []}
+        )
+        return dict(zip(categories, results))
+
+    def get_many_details(self, ids):
+        return async_to_sync(self.aget_many_details)(list(ids))
+
+    def get_categories(self, categories, limit=10):
+        return async_to_sync(self.aget_categories)(list(categories), limit)
@@ -5,40 +5,49 @@ from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Product, Category, Order, OrderItem
 from .serializers import ProductSerializer, CategorySerializer, OrderSerializer
+from .cache import tiered_cache
+from .filters import ProductFilter
 
 class ProductViewSet(viewsets.ModelViewSet):
     """
     API endpoint for products
     """
-    queryset = Product.objects.filter(is_active=True)
+    replica_reads = True
+    queryset = Product.objects.filter(is_active=True).select_related('main_category')
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'main_category']
+    filterset_class = ProductFilter
     search_fields = ['name', 'description']
-    ordering_fields = ['price', 'name', 'created_at']
+    ordering_fields = ['price', 'name', 'created_at', 'protein_per_dollar', 'protein_per_100kcal']
     ordering = ['-created_at']
+    # Rankings for best_value, precomputed on save and indexed
+    value_rankings = ('protein_per_dollar', 'protein_per_100kcal')
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        
-        # Filter by price range
-        min_price = self.request.query_params.get('min_price')
-        max_price = self.request.query_params.get('max_price')
-        
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
-        
-        return queryset
+    @action(detail=False, methods=['get'])
+    def best_value(self, request):
+        """Products with nutrition info, best ?rank= first, with the list filters and search"""
+        rank = request.GET.get('rank', 'protein_per_dollar')
+        if rank not in self.value_rankings:
+            return Response(
+                {'error': f"rank must be one of: {', '.join(self.value_rankings)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .filter(**{f'{rank}__isnull': False})
+            .order_by(f'-{rank}', 'id')
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def by_category(self, request):
         """Get products by category"""
         category = request.GET.get('category', '')
         if category:
-            products = Product.objects.filter(category=category, is_active=True)
+            products = Product.objects.filter(category=category, is_active=True).select_related('main_category')
             serializer = self.get_serializer(products, many=True)
             return Response(serializer.data)
         return Response([])
@@ -48,14 +57,14 @@ class ProductViewSet(viewsets.ModelViewSet):
         """Search products"""
         query = request.GET.get('q', '')
         if query:
-            products = Product.objects.filter(
-                name__icontains=query,
-                is_active=True
-            )[:20]
+            products = list(
+                Product.objects.filter(name__icontains=query, is_active=True)
+                .select_related('main_category')[:20]
+            )
             serializer = self.get_serializer(products, many=True)
             return Response({
                 'query': query,
-                'count': products.count(),
+                'count': len(products),
                 'results': serializer.data
             })
         return Response({'query': '', 'count': 0, 'results': []})
@@ -63,7 +72,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def supplements(self, request):
         """Get all supplements"""
-        supplements = Product.objects.filter(category='SUP', is_active=True)
+        supplements = Product.objects.filter(category='SUP', is_active=True).select_related('main_category')
         serializer = self.get_serializer(supplements, many=True)
         return Response(serializer.data)
 
@@ -71,6 +80,7 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for categories (read-only)
     """
+    replica_reads = True
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
@@ -84,7 +94,11 @@ class OrderViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return (
+            Order.objects.filter(user=self.request.user)
+            .select_related('user')
+            .prefetch_related('items__product')
+        )
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -93,30 +107,37 @@ class ProductStatsAPIView(APIView):
     """
     API endpoint for product statistics
     """
+    replica_reads = True
     permission_classes = [permissions.AllowAny]
     
     def get(self, request):
-        total_products = Product.objects.filter(is_active=True).count()
-        total_supplements = Product.objects.filter(category='SUP', is_active=True).count()
-        total_clothing = Product.objects.filter(category='CLO', is_active=True).count()
-        total_equipment = Product.objects.filter(category='EQU', is_active=True).count()
-        total_food = Product.objects.filter(category='FOO', is_active=True).count()
-        
-        # Get average price
-        from django.db.models import Avg, Max, Min
-        price_stats = Product.objects.filter(is_active=True).aggregate(
+        return Response(tiered_cache.get_or_set('catalog', 'stats', self.compute_stats))
+    
+    def compute_stats(self):
+        # One pass over the table instead of a query per category
+        from django.db.models import Avg, Count, Max, Min, Q
+        stats = Product.objects.filter(is_active=True).aggregate(
+            total_products=Count('id'),
+            supplements=Count('id', filter=Q(category='SUP')),
+            clothing=Count('id', filter=Q(category='CLO')),
+            equipment=Count('id', filter=Q(category='EQU')),
+            food=Count('id', filter=Q(category='FOO')),
             avg_price=Avg('price'),
             max_price=Max('price'),
             min_price=Min('price')
         )
         
-        return Response({
-            'total_products': total_products,
+        return {
+            'total_products': stats['total_products'],
             'by_category': {
-                'supplements': total_supplements,
-                'clothing': total_clothing,
-                'equipment': total_equipment,
-                'food': total_food,
+                'supplements': stats['supplements'],
+                'clothing': stats['clothing'],
+                'equipment': stats['equipment'],
+                'food': stats['food'],
             },
-            'price_statistics': price_stats
-        })
\ No newline at end of file
+            'price_statistics': {
+                'avg_price': stats['avg_price'],
+                'max_price': stats['max_price'],
+                'min_price': stats['min_price'],
+            }
+        }
@@ -0,0 +1,111 @@
+"""Benchmark scenarios for the store (run with manage.py benchmark)"""
+from django.urls import reverse
+
+from fitpowerhub.benchmark import scenario
+
+
+def _product(data, i):
+    return data['product_ids'][(i * 7919) % len(data['product_ids'])]
+
+
+@scenario('home')
+def home(client, data, i):
+    return client.get(reverse('home'))
+
+
+@scenario('product_list')
+def product_list(client, data, i):
+    return client.get(reverse('product_list'))
+
+
+@scenario('product_list_filtered')
+def product_list_filtered(client, data, i):
+    params = {'type': ['SUP', 'CLO', 'EQU', 'FOO'][i % 4], 'category': data['category_slugs'][i % len(data['category_slugs'])]}
+    return client.get(reverse('product_list'), params)
+
+
+@scenario('product_list_search')
+def product_list_search(client, data, i):
+    return client.get(reverse('product_list'), {'q': data['search_terms'][i % len(data['search_terms'])]})
+
+
+@scenario('product_list_render', login=True)
+def product_list_render(client, data, i):
+    # Logged-in visitors bypass the page cache, so this times the full render
+    # of the listing with its product card fragments
+    return client.get(reverse('product_list'))
+
+
+@scenario('product_detail')
+def product_detail(client, data, i):
+    return client.get(reverse('product_detail', args=[_product(data, i)]))
+
+
+@scenario('cart_add', login=True)
+def cart_add(client, data, i):
+    return client.post(reverse('add_to_cart', args=[_product(data, i)]), {'quantity': 1})
+
+
+def _fill_cart(client, data, i):
+    for offset in range(3):
+        client.post(reverse('add_to_cart', args=[_product(data, i + offset)]), {'quantity': 1})
+
+
+@scenario('cart_update', login=True, prepare=_fill_cart)
+def cart_update(client, data, i):
+    from store.models import CartItem
+    item_id = CartItem.objects.filter(cart__user_id=client.session['_auth_user_id']).values_list('id', flat=True).first()
+    return client.post(reverse('update_cart_item', args=[item_id]), {'action': 'update', 'quantity': 2})
+
+
+@scenario('checkout', login=True, prepare=_fill_cart)
+def checkout(client, data, i):
+    return client.post(reverse('checkout'), {
+        'shipping_address': '1 Benchmark Way',
+        'billing_address': '1 Benchmark Way',
+        'notes': '',
+    })
+
+
+@scenario('api_products')
+def api_products(client, data, i):
+    return client.get(reverse('product-list'), {'page': i % 5 + 1})
+
+
+@scenario('api_products_filtered')
+def api_products_filtered(client, data, i):
+    return client.get(reverse('product-list'), {'category': 'SUP', 'min_price': 20, 'max_price': 80, 'ordering': 'price'})
+
+
+@scenario('api_best_value')
+def api_best_value(client, data, i):
+    params = {'rank': ['protein_per_dollar', 'protein_per_100kcal'][i % 2], 'min_protein': 15}
+    return client.get(reverse('product-best-value'), params)
+
+
+@scenario('api_product_detail')
+def api_product_detail(client, data, i):
+    return client.get(reverse('product-detail', args=[_product(data, i)]))
+
+
+@scenario('api_orders', login=True)
+def api_orders(client, data, i):
+    return client.get(reverse('order-list'))
+
+
+@scenario('api_stats')
+def api_stats(client, data, i):
+    return client.get(reverse('api_stats'))
+
+
+@scenario('concurrent_read_write', login=True)
+def concurrent_read_write(client, data, i):
+    # Half the requests write an order, half read the order history; compare
+    # with --db-profile development and production
+    if i % 2:
+        return client.get(reverse('order-list'))
+    return client.post(reverse('order-list'), {
+        'total_amount': '19.99',
+        'shipping_address': '1 Benchmark Way',
+        'status': 'PEN',
+    })
@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+
+from fitpowerhub.routers import primary_reads
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded in-process cache. The least recently used entry is evicted
+    once max_size entries are stored; entries also expire after their timeout.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires is not None and time.monotonic() >= expires:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    """
+    Two-tier cache: a per-process LRU in front of a shared Django cache.
+
+    Keys live in namespaces ("catalog", "categories", ...). Every namespace
+    has a version counter stored in the shared cache and the version is part
+    of every key, so invalidate(namespace) drops the whole group in O(1) by
+    bumping the counter. Other processes notice a bump within
+    version_check_interval seconds.
+    """
+
+    def __init__(self, alias='default', max_size=1000, local_timeout=60, version_check_interval=1.0):
+        self.alias = alias
+        self.local = LRUCache(max_size)
+        self.local_timeout = local_timeout
+        self.version_check_interval = version_check_interval
+        self._versions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _count(self, namespace, stat, n=1):
+        with self._lock:
+            self._stats.setdefault(namespace, Counter())[stat] += n
+
+    def _version_key(self, namespace):
+        return f"cache_version:{namespace}"
+
+    def get_version(self, namespace):
+        now = time.monotonic()
+        cached = self._versions.get(namespace)
+        if cached is not None and now - cached[1] < self.version_check_interval:
+            return cached[0]
+
+        version = self.shared.get(self._version_key(namespace))
+        if version is None:
+            # Start from a timestamp so a lost counter never reuses an old version
+            version = int(time.time() * 1000)
+            if not self.shared.add(self._version_key(namespace), version, timeout=None):
+                version = self.shared.get(self._version_key(namespace), version)
+        self._versions[namespace] = (version, now)
+        return version
+
+    def reset_local(self):
+        """Forget this process's LRU entries and namespace versions; the shared tier is untouched"""
+        self.local.clear()
+        self._versions.clear()
+
+    def invalidate(self, namespace):
+        """Invalidate every key in the namespace"""
+        try:
+            version = self.shared.incr(self._version_key(namespace))
+        except ValueError:
+            version = int(time.time() * 1000)
+            self.shared.set(self._version_key(namespace), version, timeout=None)
+        self._versions[namespace] = (version, time.monotonic())
+        self._count(namespace, 'invalidations')
+
+    def make_key(self, namespace, key):
+        return f"{namespace}:{self.get_version(namespace)}:{key}"
+
+    def get(self, namespace, key, default=None):
+        return self.get_many(namespace, [key]).get(key, default)
+
+    def get_many(self, namespace, keys):
+        """Return a dict of the keys found, using one shared-cache round trip for local misses"""
+        full_keys = {self.make_key(namespace, key): key for key in keys}
+        found = {}
+        remote = []
+        for full_key, key in full_keys.items():
+            value = self.local.get(full_key, _MISSING)
+            if value is _MISSING:
+                remote.append(full_key)
+            else:
+                found[key] = value
+        self._count(namespace, 'local_hits', len(found))
+
+        if remote:
+            shared_found = self.shared.get_many(remote)
+            for full_key, value in shared_found.items():
+                self.local.set(full_key, value, self.local_timeout)
+                found[full_keys[full_key]] = value
+            self._count(namespace, 'shared_hits', len(shared_found))
+            self._count(namespace, 'misses', len(remote) - len(shared_found))
+        return found
+
+    def set(self, namespace, key, value, timeout=None):
+        self.set_many(namespace, {key: value}, timeout)
+
+    def set_many(self, namespace, mapping, timeout=None):
+        full = {self.make_key(namespace, key): value for key, value in mapping.items()}
+        if timeout is None:
+            self.shared.set_many(full)
+        else:
+            self.shared.set_many(full, timeout)
+        local_timeout = self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+        for full_key, value in full.items():
+            self.local.set(full_key, value, local_timeout)
+
+    def get_or_set(self, namespace, key, default, timeout=None):
+        """
+        Return the cached value, computing it with default() on a miss.
+        default() reads the primary: the value is stored under the current
+        namespace version, which a lagging replica may not have caught up to.
+        """
+        value = self.get(namespace, key, _MISSING)
+        if value is _MISSING:
+            with primary_reads():
+                value = default()
+            self.set(namespace, key, value, timeout)
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = {namespace: dict(counter) for namespace, counter in self._stats.items()}
+        for counter in stats.values():
+            lookups = counter.get('local_hits', 0) + counter.get('shared_hits', 0) + counter.get('misses', 0)
+            hits = lookups - counter.get('misses', 0)
+            counter['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        return {
+            'local_size': len(self.local),
+            'local_evictions': self.local.evictions,
+            'namespaces': stats,
+        }
+
+
+_config = getattr(settings, 'TIERED_CACHE', {})
+
+tiered_cache = TieredCache(
+    alias=_config.get('ALIAS', 'default'),
+    max_size=_config.get('MAX_SIZE', 1000),
+    local_timeout=_config.get('LOCAL_TIMEOUT', 60),
+    version_check_interval=_config.get('VERSION_CHECK_INTERVAL', 1.0),
+)
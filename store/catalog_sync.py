@@ -0,0 +1,87 @@
+import hashlib
+import json
+import logging
+from django.db import transaction
+from django.utils import timezone
+
+from .api_cache import UpstreamError
+from .api_service import ProductAPIService
+from .models import ExternalProduct
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def product_checksum(data):
+    """Stable hash of a product payload, used to detect changed rows"""
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def sync_external_catalog(service=None, page_size=100):
+    """
+    Pull the whole external catalog page by page and apply the differences
+    to the ExternalProduct mirror: new products are inserted, products whose
+    checksum changed are updated and products no longer listed are deleted.
+    Raises UpstreamError (and leaves the mirror untouched) if a page fails
+    or paging ends before the total the API reported.
+    """
+    service = service or ProductAPIService()
+
+    fetched = {}
+    skip = 0
+    while True:
+        page = service.get_catalog_page(skip=skip, limit=page_size)
+        products = page.get('products', [])
+        total = page.get('total', 0)
+        for item in products:
+            fetched[item['id']] = item
+        skip += len(products)
+        if not products or skip >= total:
+            break
+    # Deleting what wasn't fetched is only safe with the complete catalog
+    if skip < total:
+        raise UpstreamError(f"Catalog paging stopped at {skip} of {total} products")
+
+    existing = {
+        external_id: (pk, checksum)
+        for pk, external_id, checksum in ExternalProduct.objects.values_list('id', 'external_id', 'checksum')
+    }
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for external_id, item in fetched.items():
+        checksum = product_checksum(item)
+        row = ExternalProduct(
+            external_id=external_id,
+            title=item.get('title', '')[:255],
+            category=item.get('category', ''),
+            data=item,
+            checksum=checksum,
+            synced_at=now,
+        )
+        if external_id not in existing:
+            to_create.append(row)
+        elif existing[external_id][1] != checksum:
+            row.pk = existing[external_id][0]
+            to_update.append(row)
+
+    stale_ids = set(existing) - set(fetched)
+
+    with transaction.atomic():
+        ExternalProduct.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        ExternalProduct.objects.bulk_update(
+            to_update, ['title', 'category', 'data', 'checksum', 'synced_at'], batch_size=BATCH_SIZE
+        )
+        ExternalProduct.objects.filter(external_id__in=stale_ids).delete()
+
+    stats = {
+        'fetched': len(fetched),
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': len(stale_ids),
+    }
+    logger.info("External catalog synced: %s", stats)
+    return stats
@@ -0,0 +1,26 @@
+import django_filters
+
+from .models import Product
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    Product API filters: category, price range and min_/max_ ranges on the
+    nutrition columns and the precomputed value rankings.
+    """
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    min_protein = django_filters.NumberFilter(field_name='protein_per_serving', lookup_expr='gte')
+    max_protein = django_filters.NumberFilter(field_name='protein_per_serving', lookup_expr='lte')
+    min_carbs = django_filters.NumberFilter(field_name='carbs_per_serving', lookup_expr='gte')
+    max_carbs = django_filters.NumberFilter(field_name='carbs_per_serving', lookup_expr='lte')
+    min_fat = django_filters.NumberFilter(field_name='fat_per_serving', lookup_expr='gte')
+    max_fat = django_filters.NumberFilter(field_name='fat_per_serving', lookup_expr='lte')
+    min_calories = django_filters.NumberFilter(field_name='calories_per_serving', lookup_expr='gte')
+    max_calories = django_filters.NumberFilter(field_name='calories_per_serving', lookup_expr='lte')
+    min_protein_per_dollar = django_filters.NumberFilter(field_name='protein_per_dollar', lookup_expr='gte')
+    min_protein_per_100kcal = django_filters.NumberFilter(field_name='protein_per_100kcal', lookup_expr='gte')
+
+    class Meta:
+        model = Product
+        fields = ['category', 'main_category']
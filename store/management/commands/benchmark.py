@@ -0,0 +1,123 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils.module_loading import autodiscover_modules
+
+from fitpowerhub.benchmark import (
+    SCENARIOS, compare_results, isolated_caches, run_scenario, save_results, seed_dataset,
+)
+from fitpowerhub.middleware import activity_buffer
+from store.cache import tiered_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and benchmark the key views and API endpoints '
+        'with concurrent in-process clients'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Scenario to run (repeatable, default: all)')
+        parser.add_argument('--list', action='store_true', help='List scenarios and exit')
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+        parser.add_argument('--output', help='Results file (default: benchmark_results/<timestamp>.json)')
+        parser.add_argument('--compare', help='Previous results file to compare against')
+        parser.add_argument('--db-profile', choices=sorted(settings.SQLITE_PRAGMAS),
+                            help='Database profile to benchmark (default: DB_PROFILE)')
+
+    def handle(self, *args, **options):
+        autodiscover_modules('benchmarks')
+
+        if options['list']:
+            for name in sorted(SCENARIOS):
+                self.stdout.write(name)
+            return
+
+        names = options['scenarios'] or sorted(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+
+        with override_settings(DB_PROFILE=options['db_profile'] or settings.DB_PROFILE):
+            results = self.run_benchmarks(names, options)
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmark_results', f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        save_results(results, output)
+        self.stdout.write(self.style.SUCCESS(f'Results saved to {output}'))
+
+        if previous:
+            for name, metric, old, new in compare_results(results, previous):
+                change = f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+                self.stdout.write(f"{name:32} {metric:15} {old:>10} -> {new:>10} ({change})")
+
+    def run_benchmarks(self, names, options):
+        # A file (not in-memory) database so every client thread sees the same data
+        db_dir = tempfile.mkdtemp(prefix='fitpowerhub-bench-')
+        # Caches of its own too, so the project's cache is neither read nor touched
+        with override_settings(CACHES=isolated_caches(db_dir)):
+            tiered_cache.reset_local()
+            try:
+                return self.run_in_benchmark_db(names, options, db_dir)
+            finally:
+                tiered_cache.reset_local()
+                shutil.rmtree(db_dir, ignore_errors=True)
+
+    def run_in_benchmark_db(self, names, options, db_dir):
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write('Seeding dataset...')
+            start = time.perf_counter()
+            data = seed_dataset(
+                products=options['products'], users=options['users'],
+                orders=options['orders'], seed=options['seed']
+            )
+            self.stdout.write(f'Seeded in {time.perf_counter() - start:.1f}s')
+
+            results = {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'dataset': {key: options[key] for key in ('products', 'users', 'orders', 'seed')},
+                'database': settings.DATABASES['default']['ENGINE'],
+                'db_profile': settings.DB_PROFILE,
+                'scenarios': {},
+            }
+            for name in names:
+                result = run_scenario(
+                    SCENARIOS[name], data,
+                    requests=options['requests'], concurrency=options['concurrency']
+                )
+                results['scenarios'][name] = result
+                self.stdout.write(
+                    f"{name:32} {result['throughput_rps']:>9.1f} req/s  "
+                    f"p50 {result['latency_ms']['p50']:>8.2f}ms  "
+                    f"p95 {result['latency_ms']['p95']:>8.2f}ms  "
+                    f"p99 {result['latency_ms']['p99']:>8.2f}ms  "
+                    f"queries {result['queries_per_request']['mean']:>6.1f}  "
+                    f"errors {result['errors']}"
+                )
+        finally:
+            # Write buffered activity while the benchmark database still exists
+            activity_buffer.flush()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        return results
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.activity import compact_activity
+
+
+class Command(BaseCommand):
+    help = 'Roll up raw user activity into hourly aggregates and purge old raw rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Keep raw rows this many days (default: USER_ACTIVITY_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        stats = compact_activity(retention_days=options['retention_days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Rolled up {rolled_up} hourly rows, purged {purged} raw rows'.format(**stats)
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fitpowerhub.query_budget import is_full_scan, is_temp_sort
+from store.query_catalog import representative_queries
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the representative storefront queries and report full table scans and temp sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries', help='Only explain this query (repeatable)')
+        parser.add_argument('--plans', action='store_true', help='Print every plan, not just problems')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error if an unexpected full table scan is found')
+
+    def handle(self, *args, **options):
+        catalog = representative_queries()
+        if options['queries']:
+            unknown = set(options['queries']) - {name for name, _, _ in catalog}
+            if unknown:
+                raise CommandError(f"Unknown query(s): {', '.join(sorted(unknown))}")
+            catalog = [entry for entry in catalog if entry[0] in options['queries']]
+
+        unexpected = []
+        for name, queryset, expect_scan in catalog:
+            plan = queryset.explain().splitlines()
+            scans = [line for line in plan if is_full_scan(line)]
+            sorts = [line for line in plan if is_temp_sort(line)]
+
+            if scans and not expect_scan:
+                status = self.style.ERROR('SCAN')
+                unexpected.append(name)
+            elif scans:
+                status = self.style.WARNING('SCAN (expected)')
+            elif sorts:
+                status = self.style.WARNING('SORT')
+            else:
+                status = self.style.SUCCESS('OK')
+            self.stdout.write(f"{name:24} {status}")
+
+            if options['plans'] or scans or sorts:
+                for line in plan:
+                    self.stdout.write(f"    {line}")
+
+        if unexpected and options['fail_on_scan']:
+            raise CommandError(f"Full table scans in: {', '.join(unexpected)}")
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from fitpowerhub.datagen import generate_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-insert deterministic synthetic products, users, profiles, carts, orders '
+        'and meal plans for testing at scale'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--carts', type=int, help='Users that get a cart (default: users / 4)')
+        parser.add_argument('--meal-plans', type=int, help='Meal plans (default: users / 2)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create chunk')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Worker processes; SQLite allows a single writer, so use this with PostgreSQL or MySQL'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING('SQLite serializes writes; extra workers will mostly wait'))
+
+        def report(phase, counts, seconds):
+            rows = sum(counts.values())
+            rate = rows / seconds if seconds else 0
+            detail = ', '.join(f"{n} {table}" for table, n in counts.items()) or 'nothing'
+            self.stdout.write(f"{phase:12} {detail} in {seconds:.1f}s ({rate:,.0f} rows/s)")
+
+        try:
+            result = generate_data(
+                products=options['products'], users=options['users'], orders=options['orders'],
+                carts=options['carts'], meal_plans=options['meal_plans'], seed=options['seed'],
+                batch_size=options['batch_size'], workers=options['workers'], report=report
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rows = sum(result['counts'].values())
+        rate = rows / result['seconds'] if result['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {rows:,} rows in {result['seconds']:.1f}s ({rate:,.0f} rows/s)"
+        ))
@@ -0,0 +1,50 @@
+import io
+import os
+import pstats
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from fitpowerhub.middleware import make_profile_token
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge the profiles saved by ProfilingMiddleware for a view (URL name, '
+        'e.g. "checkout" or "product-list") and print the hottest functions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('view', nargs='?', help='URL name of the view')
+        parser.add_argument('--limit', type=int, default=30, help='Number of functions to show')
+        parser.add_argument('--sort', default='cumulative', choices=['cumulative', 'tottime', 'calls'],
+                            help='Sort key')
+        parser.add_argument('--directory', default=None, help='Profile directory (default: PROFILING["DIRECTORY"])')
+        parser.add_argument('--token', action='store_true',
+                            help='Print a signed X-Profile header value and exit')
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(make_profile_token())
+            return
+
+        directory = options['directory'] or getattr(settings, 'PROFILING', {}).get('DIRECTORY', 'profiles')
+        available = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        view = options['view']
+        if not view:
+            self.stdout.write('Profiled views: ' + (', '.join(available) or 'none'))
+            return
+
+        view_dir = os.path.join(directory, view.replace('/', '_').replace(':', '_'))
+        files = [
+            os.path.join(view_dir, name)
+            for name in (os.listdir(view_dir) if os.path.isdir(view_dir) else [])
+            if name.endswith('.prof')
+        ]
+        if not files:
+            raise CommandError(f'No profiles for "{view}". Profiled views: {", ".join(available) or "none"}')
+
+        output = io.StringIO()
+        stats = pstats.Stats(*files, stream=output)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(f'{len(files)} profile(s) merged for {view}')
+        self.stdout.write(output.getvalue())
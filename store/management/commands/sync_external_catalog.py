@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.api_cache import UpstreamError
+from store.catalog_sync import sync_external_catalog
+
+
+class Command(BaseCommand):
+    help = 'Mirror the external product catalog into the local ExternalProduct table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Products requested per API page')
+
+    def handle(self, *args, **options):
+        try:
+            stats = sync_external_catalog(page_size=options['page_size'])
+        except UpstreamError as e:
+            raise CommandError(f'External API unavailable, mirror left unchanged: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            'Synced {fetched} products: {created} created, {updated} updated, {deleted} deleted'.format(**stats)
+        ))
@@ -0,0 +1,44 @@
+import os
+import sqlite3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh the SQLite read replicas (DATABASE_REPLICA_PATHS) with a consistent '
+        'snapshot of the primary database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replica', action='append', dest='replicas', help='Only refresh this alias (repeatable)')
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replicas only copies SQLite databases; use native replication elsewhere')
+
+        aliases = options['replicas'] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError('No replicas configured (set DATABASE_REPLICA_PATHS)')
+        unknown = set(aliases) - set(settings.DATABASE_REPLICAS)
+        if unknown:
+            raise CommandError(f"Unknown replica(s): {', '.join(sorted(unknown))}")
+
+        primary.ensure_connection()
+        for alias in aliases:
+            path = str(settings.DATABASES[alias]['NAME'])
+            # Back up into a temporary file and swap it in, so readers never
+            # see a half-written replica; their next connection opens the new file
+            tmp = f"{path}.sync-{os.getpid()}"
+            target = sqlite3.connect(tmp)
+            try:
+                primary.connection.backup(target)
+                # A WAL primary yields a WAL copy; replicas are only read, and
+                # swapping a WAL database file under stale -wal/-shm files is unsafe
+                target.execute('PRAGMA journal_mode = delete')
+            finally:
+                target.close()
+            os.replace(tmp, path)
+            self.stdout.write(self.style.SUCCESS(f"{alias}: copied primary to {path}"))
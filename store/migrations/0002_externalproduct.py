@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExternalProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_id', models.IntegerField(unique=True)),
+                ('title', models.CharField(max_length=255)),
+                ('category', models.CharField(db_index=True, max_length=100)),
+                ('data', models.JSONField(help_text='Product as returned by the API')),
+                ('checksum', models.CharField(help_text='SHA-256 of the product data', max_length=64)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['external_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0003_alter_useractivity_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivityHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('hour', models.DateTimeField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_hours', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User Activity (hourly)',
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['timestamp', 'user', 'path'], name='activity_ts_user_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivityhourly',
+            index=models.Index(fields=['hour', 'user'], name='activity_hour_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivityhourly',
+            index=models.Index(fields=['hour', 'path', 'hits'], name='activity_hour_path_hits_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='useractivityhourly',
+            constraint=models.UniqueConstraint(fields=('user', 'path', 'hour'), name='unique_activity_hour'),
+        ),
+    ]
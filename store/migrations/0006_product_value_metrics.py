@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+
+def fill_value_metrics(apps, schema_editor):
+    # Same formulas as Product.update_value_metrics()
+    Product = apps.get_model('store', 'Product')
+    products = list(
+        Product.objects.filter(protein_per_serving__isnull=False)
+        .only('id', 'price', 'protein_per_serving', 'calories_per_serving')
+    )
+    for product in products:
+        price = float(product.price or 0)
+        protein = product.protein_per_serving
+        calories = product.calories_per_serving
+        product.protein_per_dollar = protein / price if price > 0 else None
+        product.protein_per_100kcal = protein * 100 / calories if calories else None
+    Product.objects.bulk_update(products, ['protein_per_dollar', 'protein_per_100kcal'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_storefront_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='protein_per_dollar',
+            field=models.FloatField(blank=True, editable=False, help_text='Grams of protein per unit of price', null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='protein_per_100kcal',
+            field=models.FloatField(blank=True, editable=False, help_text='Grams of protein per 100 calories', null=True),
+        ),
+        migrations.RunPython(fill_value_metrics, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-protein_per_dollar'], name='product_active_prot_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-protein_per_100kcal'], name='product_active_prot_kcal_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 import uuid
 
 class Category(models.Model):
@@ -28,6 +29,9 @@ class Product(models.Model):
         (FOOD, 'Healthy Food'),
     ]
     
+    # Fields the value rankings (protein_per_dollar, protein_per_100kcal) derive from
+    VALUE_METRIC_SOURCES = {'price', 'protein_per_serving', 'calories_per_serving'}
+    
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
@@ -43,16 +47,57 @@ class Product(models.Model):
     fat_per_serving = models.IntegerField(null=True, blank=True, help_text="Grams of fat per serving")
     calories_per_serving = models.IntegerField(null=True, blank=True, help_text="Calories per serving")
     
+    # Value rankings, kept up to date by save() (see update_value_metrics)
+    protein_per_dollar = models.FloatField(null=True, blank=True, editable=False,
+                                           help_text="Grams of protein per unit of price")
+    protein_per_100kcal = models.FloatField(null=True, blank=True, editable=False,
+                                            help_text="Grams of protein per 100 calories")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
     class Meta:
         ordering = ['-created_at']
+        # Storefront queries only ever read active products, newest first
+        indexes = [
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True),
+                         name='product_active_created_idx'),
+            models.Index(fields=['category', '-created_at'], condition=models.Q(is_active=True),
+                         name='product_active_cat_created_idx'),
+            models.Index(fields=['main_category', '-created_at'], condition=models.Q(is_active=True),
+                         name='product_active_maincat_idx'),
+            # Covers the per-category counts and price filters/aggregates
+            models.Index(fields=['category', 'price'], condition=models.Q(is_active=True),
+                         name='product_active_cat_price_idx'),
+            # Best value rankings read these in order instead of sorting the catalog
+            models.Index(fields=['-protein_per_dollar'], condition=models.Q(is_active=True),
+                         name='product_active_prot_value_idx'),
+            models.Index(fields=['-protein_per_100kcal'], condition=models.Q(is_active=True),
+                         name='product_active_prot_kcal_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        self.update_value_metrics()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & self.VALUE_METRIC_SOURCES:
+            kwargs['update_fields'] = {*update_fields, 'protein_per_dollar', 'protein_per_100kcal'}
+        super().save(*args, **kwargs)
+    
+    def update_value_metrics(self):
+        """
+        Recompute protein_per_dollar and protein_per_100kcal. save() does
+        this; call it before bulk_create/bulk_update, which bypass save().
+        """
+        protein = self.protein_per_serving
+        price = float(self.price) if self.price is not None else 0
+        calories = self.calories_per_serving
+        self.protein_per_dollar = protein / price if protein is not None and price > 0 else None
+        self.protein_per_100kcal = protein * 100 / calories if protein is not None and calories else None
+    
     def get_nutritional_info(self):
         if self.protein_per_serving:
             return {
@@ -69,18 +114,34 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Anonymous carts are looked up by session; user is part of the
+            # key so SQLite doesn't pick the unique user index for IS NULL
+            models.Index(fields=['session_key', 'user'], condition=models.Q(user__isnull=True),
+                         name='cart_anonymous_session_idx'),
+        ]
+    
     def __str__(self):
         if self.user:
             return f"Cart of {self.user.username}"
         return f"Cart (session: {self.session_key})"
     
+    def items_with_products(self):
+        """Cart items with their products, reusing prefetch_related('items__product') if present"""
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.items.all()
+        return self.items.select_related('product')
+    
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return sum(item.total_price for item in self.items_with_products())
     
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(item.quantity for item in self.items.all())
+        return self.items.aggregate(total=models.Sum('quantity'))['total'] or 0
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -125,6 +186,9 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.order_number}"
@@ -163,4 +227,60 @@ class UserProfile(models.Model):
     fitness_goal = models.CharField(max_length=100, blank=True)
     
     def __str__(self):
-        return f"Profile of {self.user.username}"
\ No newline at end of file
+        return f"Profile of {self.user.username}"
+
+class UserActivity(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities')
+    path = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    # Set by UserActivityMiddleware when the request is handled, not when the
+    # buffered row is written
+    timestamp = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name_plural = "User Activities"
+        ordering = ['-timestamp']
+        indexes = [
+            # Covers the hourly rollup and the retention purge
+            models.Index(fields=['timestamp', 'user', 'path'], name='activity_ts_user_path_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.method} {self.path}"
+
+class UserActivityHourly(models.Model):
+    """Requests per user and path for one hour, rolled up from UserActivity"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_hours')
+    path = models.CharField(max_length=255)
+    hour = models.DateTimeField()
+    hits = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "User Activity (hourly)"
+        ordering = ['-hour']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'path', 'hour'], name='unique_activity_hour'),
+        ]
+        indexes = [
+            # Covering indexes for active users per day and top paths
+            models.Index(fields=['hour', 'user'], name='activity_hour_user_idx'),
+            models.Index(fields=['hour', 'path', 'hits'], name='activity_hour_path_hits_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.path} @ {self.hour:%Y-%m-%d %H:00}: {self.hits}"
+
+class ExternalProduct(models.Model):
+    """Local mirror of a product from the external catalog API"""
+    external_id = models.IntegerField(unique=True)
+    title = models.CharField(max_length=255)
+    category = models.CharField(max_length=100, db_index=True)
+    data = models.JSONField(help_text="Product as returned by the API")
+    checksum = models.CharField(max_length=64, help_text="SHA-256 of the product data")
+    synced_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['external_id']
+    
+    def __str__(self):
+        return self.title
@@ -0,0 +1,44 @@
+"""
+Representative queries of the storefront, checked by the explain_queries
+management command. Each entry is (name, queryset, expect_scan); queries
+marked expect_scan can't use a B-tree index (e.g. substring search).
+"""
+from django.db.models import Avg, Count
+
+from nutrition.models import MealPlan
+from .models import Cart, CartItem, Order, OrderItem, Product
+
+
+def representative_queries():
+    # Plans don't depend on the values, so any id will do
+    return [
+        ('home_featured', Product.objects.filter(is_active=True).order_by('-created_at')[:4], False),
+        ('home_by_type', Product.objects.filter(category='SUP', is_active=True)[:3], False),
+        ('listing_all', Product.objects.filter(is_active=True), False),
+        ('listing_by_type', Product.objects.filter(is_active=True, category='EQU'), False),
+        ('listing_by_category', Product.objects.filter(is_active=True, main_category__slug='protein'), False),
+        ('listing_search', Product.objects.filter(is_active=True, name__icontains='whey'), True),
+        ('recommendations', Product.objects.filter(category='SUP', is_active=True).exclude(id=1)[:4], False),
+        ('stats_by_category', (
+            Product.objects.filter(is_active=True).order_by()
+            .values('category').annotate(total=Count('id'), avg_price=Avg('price'))
+        ), False),
+        ('api_price_range', (
+            Product.objects.filter(is_active=True, category='SUP', price__gte=20, price__lte=80)
+            .order_by('price')
+        ), False),
+        ('best_protein_value', (
+            Product.objects.filter(is_active=True, protein_per_dollar__isnull=False)
+            .order_by('-protein_per_dollar', 'id')[:10]
+        ), False),
+        ('best_protein_per_kcal', (
+            Product.objects.filter(is_active=True, protein_per_100kcal__isnull=False)
+            .order_by('-protein_per_100kcal', 'id')[:10]
+        ), False),
+        ('cart_by_user', Cart.objects.filter(user_id=1), False),
+        ('cart_by_session', Cart.objects.filter(session_key='0' * 32, user=None), False),
+        ('cart_items', CartItem.objects.filter(cart_id=1).select_related('product'), False),
+        ('orders_by_user', Order.objects.filter(user_id=1).order_by('-created_at'), False),
+        ('order_items', OrderItem.objects.filter(order_id=1).select_related('product'), False),
+        ('meal_plans_by_user', MealPlan.objects.filter(user_id=1, is_active=True), False),
+    ]
@@ -16,10 +16,10 @@ class ProductSerializer(serializers.ModelSerializer):
             'id', 'name', 'slug', 'description', 'price',
             'category', 'category_display', 'main_category', 'main_category_name',
             'image', 'stock', 'protein_per_serving', 'carbs_per_serving',
-            'fat_per_serving', 'calories_per_serving', 'is_active',
-            'created_at', 'updated_at'
+            'fat_per_serving', 'calories_per_serving', 'protein_per_dollar',
+            'protein_per_100kcal', 'is_active', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = ['protein_per_dollar', 'protein_per_100kcal', 'created_at', 'updated_at']
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -41,4 +41,4 @@ class OrderSerializer(serializers.ModelSerializer):
             'total_amount', 'shipping_address', 'billing_address', 'notes',
             'items', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['order_number', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['order_number', 'user', 'created_at', 'updated_at']
\ No newline at end of file
@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Cart, CartItem, Order, OrderItem, UserProfile
+from .models import Cart, CartItem, Order, OrderItem, UserProfile, Product, Category
+from .cache import tiered_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,32 +10,55 @@ logger = logging.getLogger(__name__)
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """
-    Create user profile when new user is created
+    Create user profile when new user is created. Later profile changes
+    are saved explicitly; other User saves (like the last_login update on
+    every login) leave the profile alone.
     """
     if created:
         UserProfile.objects.create(user=instance)
         logger.info(f"Profile created for user: {instance.username}")
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
     """
-    Save user profile when user is saved
+    Keep the status the order has in the database, so update_product_stock
+    can tell a delivery from a later save of a delivered order
     """
-    try:
-        instance.profile.save()
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=instance)
+    instance._previous_status = None
+    if instance.pk is not None:
+        instance._previous_status = (
+            Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        )
 
 @receiver(post_save, sender=Order)
 def update_product_stock(sender, instance, created, **kwargs):
     """
-    Update product stock when order is delivered
+    Update product stock when order is delivered (only on the change to
+    delivered, not on every save of a delivered order)
     """
-    if instance.status == 'DEL' and not created:
+    previous_status = getattr(instance, '_previous_status', None)
+    if instance.status == 'DEL' and not created and previous_status != 'DEL':
         for order_item in instance.items.all():
             product = order_item.product
             product.stock -= order_item.quantity
             if product.stock < 0:
                 product.stock = 0
             product.save()
-            logger.info(f"Stock updated for product: {product.name}")
\ No newline at end of file
+            logger.info(f"Stock updated for product: {product.name}")
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """
+    Drop cached catalog pages and stats when a product changes
+    """
+    tiered_cache.invalidate('catalog')
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """
+    Drop cached categories (and catalog entries showing category names)
+    """
+    tiered_cache.invalidate('categories')
+    tiered_cache.invalidate('catalog')
@@ -0,0 +1,42 @@
+"""
+{% product_cards products 'list' %} renders store/cards/<variant>.html for
+each product, caching every card under its product id and updated_at so a
+save re-renders only that product's card. A listing fetches all of its
+cards with one get_many() round trip.
+"""
+from django import template
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from fitpowerhub.page_cache import CSRF_PLACEHOLDER
+from store.cache import tiered_cache
+
+register = template.Library()
+
+CARD_TIMEOUT = 60 * 60  # seconds
+
+_PLACEHOLDER = CSRF_PLACEHOLDER.decode()
+
+
+def card_key(variant, product):
+    return f"{variant}:{product.id}:{product.updated_at.timestamp():.6f}"
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products, variant):
+    keys = {card_key(variant, product): product for product in products}
+    cards = tiered_cache.get_many('product_cards', keys)
+
+    missing = {key: product for key, product in keys.items() if key not in cards}
+    if missing:
+        card_template = get_template(f"store/cards/{variant}.html")
+        # Cards are shared between visitors, so the CSRF token is filled in below
+        rendered = {
+            key: card_template.render({'product': product, 'csrf_token': _PLACEHOLDER})
+            for key, product in missing.items()
+        }
+        tiered_cache.set_many('product_cards', rendered, CARD_TIMEOUT)
+        cards.update(rendered)
+
+    html = ''.join(cards[key] for key in keys)
+    return mark_safe(html.replace(_PLACEHOLDER, str(context.get('csrf_token', ''))))
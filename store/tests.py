@@ -1,3 +1,732 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from fitpowerhub.datagen import generate_data
+from fitpowerhub.db import sqlite_pragmas
+from fitpowerhub.metrics import Histogram, RequestMetrics
+from fitpowerhub.middleware import (
+    PIN_COOKIE, AnonymousPageCacheMiddleware, ReplicaRoutingMiddleware, make_profile_token,
+)
+from fitpowerhub.query_budget import QUERY_BUDGETS, QueryBudgetMixin, budget_objects, route_names
+from fitpowerhub.routers import PrimaryReplicaRouter, enable_replica_reads, primary_reads, reset_replica_reads
+from fitpowerhub.testing import ActivityBufferMixin
+
+from .api_cache import CircuitBreaker, StaleWhileRevalidateCache, UpstreamError
+from .api_service import ProductAPIService
+from .api_views import ProductViewSet
+from .cache import LRUCache, TieredCache, tiered_cache
+from .catalog_sync import sync_external_catalog
+from .models import Cart, Category, ExternalProduct, Order, OrderItem, Product, UserProfile
+from .views import cart_view, product_detail_view
+
+
+class MockProductAPIHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the dummyjson products API"""
+    delay = 0
+    hits = 0
+    fail = False
+    fail_status = 503
+    catalog = []
+
+    def do_GET(self):
+        MockProductAPIHandler.hits += 1
+        time.sleep(self.delay)
+        path, _, query = self.path.partition('?')
+        parts = path.rstrip('/').split('/')[2:]  # drop '' and 'products'
+        params = parse_qs(query)
+
+        if self.fail:
+            self.send_response(self.fail_status)
+            self.end_headers()
+            return
+
+        if not parts:
+            skip = int(params.get('skip', ['0'])[0])
+            limit = int(params.get('limit', ['30'])[0])
+            body = {
+                'products': self.catalog[skip:skip + limit],
+                'total': len(self.catalog),
+                'skip': skip,
+                'limit': limit,
+            }
+        elif len(parts) == 2 and parts[0] == 'category':
+            body = {'products': [{'id': 1, 'category': parts[1]}]}
+        elif len(parts) == 1 and parts[0].isdigit():
+            body = {'id': int(parts[0]), 'title': f'Product {parts[0]}'}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockAPIServerMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MockProductAPIHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}/products"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        MockProductAPIHandler.delay = 0
+        MockProductAPIHandler.hits = 0
+        MockProductAPIHandler.fail = False
+        MockProductAPIHandler.fail_status = 503
+        MockProductAPIHandler.catalog = [
+            {'id': i, 'title': f'Product {i}', 'category': 'groceries' if i % 2 else 'beauty',
+             'description': 'Fixture product', 'price': i}
+            for i in range(1, 26)
+        ]
+
+    def make_service(self, **kwargs):
+        api_cache = StaleWhileRevalidateCache(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        kwargs.setdefault('use_mirror', False)
+        return ProductAPIService(base_url=self.base_url, api_cache=api_cache, **kwargs)
+
+
+class ProductAPIServiceConcurrencyTests(MockAPIServerMixin, SimpleTestCase):
+    def test_get_many_details_keeps_order(self):
+        service = self.make_service()
+        details = service.get_many_details([3, 1, 2])
+        self.assertEqual([d['id'] for d in details], [3, 1, 2])
+
+    def test_get_many_details_runs_concurrently(self):
+        MockProductAPIHandler.delay = 0.2
+        service = self.make_service(max_concurrency=4)
+        start = time.monotonic()
+        details = service.get_many_details([1, 2, 3, 4])
+        elapsed = time.monotonic() - start
+        self.assertEqual(len(details), 4)
+        self.assertLess(elapsed, 0.6)
+
+    def test_get_categories(self):
+        service = self.make_service()
+        result = service.get_categories(['SUP', 'FOO', 'XXX'])
+        self.assertEqual(result['SUP']['products'][0]['category'], 'beauty')
+        self.assertEqual(result['FOO']['products'][0]['category'], 'groceries')
+        self.assertEqual(result['XXX'], {'products': []})
+
+    def test_deadline_returns_defaults_for_late_calls(self):
+        MockProductAPIHandler.delay = 1
+        service = self.make_service(deadline=0.1)
+        started = time.perf_counter()
+        self.assertEqual(service.get_many_details([1, 2]), [None, None])
+        # Calls still waiting upstream must not hold the caller
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+    def test_missing_product_returns_none(self):
+        service = self.make_service()
+        self.assertIsNone(service.get_product_detail('missing'))
+
+
+class ProductAPICacheTests(MockAPIServerMixin, SimpleTestCase):
+    def test_concurrent_misses_share_one_upstream_call(self):
+        MockProductAPIHandler.delay = 0.2
+        service = self.make_service()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(service.get_product_detail(7)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([r['id'] for r in results], [7] * 5)
+        self.assertEqual(MockProductAPIHandler.hits, 1)
+
+    def test_missing_results_are_cached_briefly(self):
+        service = self.make_service()
+        self.assertIsNone(service.get_product_detail('missing'))
+        self.assertIsNone(service.get_product_detail('missing'))
+        self.assertEqual(MockProductAPIHandler.hits, 1)
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        service = self.make_service()
+        self.assertEqual(service._fetch('/1', 'stale_key', 0)['id'], 1)
+        MockProductAPIHandler.delay = 0.3
+        start = time.monotonic()
+        self.assertEqual(service._fetch('/1', 'stale_key', 0)['id'], 1)
+        self.assertLess(time.monotonic() - start, 0.2)
+        time.sleep(0.5)
+        self.assertEqual(MockProductAPIHandler.hits, 2)
+
+    def test_breaker_opens_after_repeated_failures(self):
+        MockProductAPIHandler.fail = True
+        service = self.make_service()
+        for product_id in range(5):
+            self.assertIsNone(service.get_product_detail(product_id))
+        self.assertTrue(service.api_cache.breaker.is_open)
+        self.assertEqual(MockProductAPIHandler.hits, 2)
+
+
+class ExternalCatalogMirrorTests(MockAPIServerMixin, TestCase):
+    def test_sync_applies_only_changes(self):
+        service = self.make_service()
+        stats = sync_external_catalog(service, page_size=10)
+        self.assertEqual(stats, {'fetched': 25, 'created': 25, 'updated': 0, 'deleted': 0})
+
+        MockProductAPIHandler.catalog[0]['price'] = 99
+        del MockProductAPIHandler.catalog[-1]
+        stats = sync_external_catalog(service, page_size=10)
+        self.assertEqual(stats, {'fetched': 24, 'created': 0, 'updated': 1, 'deleted': 1})
+        self.assertEqual(ExternalProduct.objects.get(external_id=1).data['price'], 99)
+
+    def test_failed_sync_leaves_mirror_untouched(self):
+        service = self.make_service()
+        sync_external_catalog(service, page_size=10)
+        MockProductAPIHandler.fail = True
+        with self.assertRaises(UpstreamError):
+            sync_external_catalog(service, page_size=10)
+        self.assertEqual(ExternalProduct.objects.count(), 25)
+
+    def test_rejected_page_leaves_mirror_untouched(self):
+        service = self.make_service()
+        sync_external_catalog(service, page_size=10)
+        MockProductAPIHandler.fail = True
+        MockProductAPIHandler.fail_status = 429
+        with self.assertRaises(UpstreamError):
+            sync_external_catalog(service, page_size=10)
+        self.assertEqual(ExternalProduct.objects.count(), 25)
+
+    def test_incomplete_paging_deletes_nothing(self):
+        service = self.make_service()
+        sync_external_catalog(service, page_size=10)
+        short_page = {'products': MockProductAPIHandler.catalog[:10], 'total': 25}
+        with mock.patch.object(service, 'get_catalog_page', side_effect=[short_page, {'products': [], 'total': 25}]):
+            with self.assertRaises(UpstreamError):
+                sync_external_catalog(service, page_size=10)
+        self.assertEqual(ExternalProduct.objects.count(), 25)
+
+    def test_reads_are_served_from_mirror(self):
+        sync_external_catalog(self.make_service(), page_size=10)
+        MockProductAPIHandler.hits = 0
+        service = self.make_service(use_mirror=True)
+
+        self.assertEqual(service.get_product_detail(3)['title'], 'Product 3')
+        self.assertIsNone(service.get_product_detail(999))
+        self.assertEqual(len(service.get_products_by_category('FOO', limit=5)['products']), 5)
+        self.assertEqual(service.search_products('Product 2')['total'], 7)
+        self.assertEqual([d['id'] for d in service.get_many_details([2, 1])], [2, 1])
+        self.assertEqual(MockProductAPIHandler.hits, 0)
+
+
+class OrderStockTests(TestCase):
+    def test_stock_is_taken_once_on_delivery(self):
+        user = User.objects.create_user('buyer', password='pass12345')
+        product = Product.objects.create(name='Whey', slug='whey', description='Protein', price=30, category='SUP', stock=10)
+        order = Order.objects.create(user=user, total_amount=60, shipping_address='1 Test Way')
+        OrderItem.objects.create(order=order, product=product, quantity=2, price=30)
+
+        order.status = Order.SHIPPED
+        order.save()
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 10)
+
+        order.status = Order.DELIVERED
+        order.save()
+        order.save()
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 8)
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = TieredCache(max_size=2, version_check_interval=0)
+
+    def test_lru_evicts_least_recently_used(self):
+        lru = LRUCache(max_size=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.evictions, 1)
+
+    def test_falls_back_to_shared_tier(self):
+        self.cache.set('catalog', 'x', 1)
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get('catalog', 'x'), 1)
+        self.assertEqual(self.cache.get('catalog', 'x'), 1)
+        stats = self.cache.stats()['namespaces']['catalog']
+        self.assertEqual((stats['shared_hits'], stats['local_hits']), (1, 1))
+
+    def test_invalidate_only_affects_namespace(self):
+        self.cache.set('catalog', 'x', 1)
+        self.cache.set('categories', 'x', 2)
+        self.cache.invalidate('catalog')
+        self.assertIsNone(self.cache.get('catalog', 'x'))
+        self.assertEqual(self.cache.get('categories', 'x'), 2)
+
+    def test_only_fixed_listings_are_cached(self):
+        Product.objects.create(name='Whey', slug='whey', description='Protein', price=30, category='SUP')
+        keys = []
+        get_or_set = tiered_cache.get_or_set
+
+        def recording_get_or_set(namespace, key, *args, **kwargs):
+            keys.append((namespace, key))
+            return get_or_set(namespace, key, *args, **kwargs)
+
+        with mock.patch.object(tiered_cache, 'get_or_set', recording_get_or_set):
+            self.client.get(reverse('product_list'), {'type': 'SUP'})
+            response = self.client.get(reverse('product_list'), {'q': 'whey'})
+            self.client.get(reverse('product_list'), {'type': 'XYZ'})
+        self.assertContains(response, 'Whey')
+        self.assertEqual([key for namespace, key in keys if namespace == 'catalog'], ['list::SUP'])
+
+    def test_product_save_invalidates_catalog_views(self):
+        tiered_cache.local.clear()
+        product = Product.objects.create(name='Whey', slug='whey', description='Protein', price=30, category='SUP')
+        response = self.client.get(reverse('product_detail', args=[product.id]))
+        self.assertContains(response, 'Whey')
+
+        product.name = 'Whey Isolate'
+        product.save()
+        response = self.client.get(reverse('product_detail', args=[product.id]))
+        self.assertContains(response, 'Whey Isolate')
+
+        response = self.client.get(reverse('api_stats'))
+        self.assertEqual(response.json()['total_products'], 1)
+        product.delete()
+        response = self.client.get(reverse('api_stats'))
+        self.assertEqual(response.json()['total_products'], 0)
+
+
+class RequestMetricsTests(ActivityBufferMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.metrics = RequestMetrics(self.tmpdir, publish_interval=3600)
+        patcher = mock.patch('fitpowerhub.middleware.request_metrics', self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('fitpowerhub.views.request_metrics', self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_histogram_quantiles(self):
+        histogram = Histogram()
+        for value in range(1, 1001):
+            histogram.record(value)
+        self.assertAlmostEqual(histogram.quantile(0.5), 500, delta=500 / 16)
+        self.assertAlmostEqual(histogram.quantile(0.99), 990, delta=990 / 16)
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse('product-list'))
+        self.client.get(reverse('product-list'))
+        series = self.metrics.views['product-list']
+        self.assertEqual(series['duration_us'].count, 2)
+        self.assertGreater(series['queries'].max, 0)
+
+    def test_files_of_gone_processes_are_pruned(self):
+        self.client.get(reverse('product-list'))
+        self.metrics.publish()
+        host = socket.gethostname()
+        dead = os.path.join(self.tmpdir, f"{host}-{2 ** 22 + 1}.json")
+        remote = os.path.join(self.tmpdir, 'elsewhere-123.json')
+        for path in (dead, remote):
+            with open(path, 'w') as f:
+                json.dump({'views': self.metrics.snapshot(), 'extra': {}}, f)
+        old = time.time() - self.metrics.stale_after - 60
+        os.utime(remote, (old, old))
+
+        merged, _ = self.metrics.load_all()
+        self.assertEqual(merged['product-list']['duration_us'].count, 1)
+        self.assertEqual(os.listdir(self.tmpdir), [f"{host}-{os.getpid()}.json"])
+
+        self.metrics.unpublish()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get(reverse('product_list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+
+        staff = User.objects.create_user(username='admin', password='pass12345', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('fitpowerhub_request_duration_seconds{view="product_list",quantile="0.99"}',
+                      response.content.decode())
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_signed_header_profiles_request(self):
+        profiling = {'ENABLED': False, 'DIRECTORY': self.tmpdir, 'MAX_FILES_PER_VIEW': 2}
+        with self.settings(PROFILING=profiling):
+            for _ in range(3):
+                self.client.get(reverse('product-list'), HTTP_X_PROFILE=make_profile_token())
+            self.client.get(reverse('product-list'), HTTP_X_PROFILE='forged')
+
+            files = os.listdir(os.path.join(self.tmpdir, 'product-list'))
+            self.assertEqual(len(files), 2)
+
+            out = io.StringIO()
+            call_command('profile_summary', 'product-list', '--limit', '5', stdout=out)
+            self.assertIn('2 profile(s) merged for product-list', out.getvalue())
+
+
+class GenerateDataTests(TestCase):
+    def test_generates_related_rows(self):
+        result = generate_data(products=50, users=8, orders=20, batch_size=16)
+        self.assertEqual(result['counts']['products'], 50)
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(UserProfile.objects.count(), 8)
+        self.assertEqual(Cart.objects.count(), 2)
+        self.assertTrue(OrderItem.objects.exists())
+        # Totals match the items
+        order = Order.objects.prefetch_related('items').first()
+        self.assertEqual(order.total_amount, sum(item.total_price for item in order.items.all()))
+
+    def test_output_depends_only_on_seed(self):
+        generate_data(products=30, users=4, orders=10, batch_size=7, seed=7)
+        first = list(Product.objects.order_by('id').values_list('name', 'price', 'category'))
+        Product.objects.all().delete()
+        User.objects.all().delete()
+        generate_data(products=30, users=4, orders=10, batch_size=7, seed=7)
+        second = list(Product.objects.order_by('id').values_list('name', 'price', 'category'))
+        self.assertEqual(first, second)
+
+    def test_same_seed_can_be_generated_again(self):
+        generate_data(products=10, users=4, orders=10, seed=7)
+        generate_data(products=10, users=4, orders=10, seed=7)
+        self.assertEqual(Order.objects.values('order_number').distinct().count(), 20)
+
+    def test_failed_run_leaves_no_rows(self):
+        with mock.patch('fitpowerhub.datagen._meal_plans_chunk', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                generate_data(products=10, users=4, orders=10)
+        self.assertEqual((User.objects.count(), Product.objects.count(), Order.objects.count()), (0, 0, 0))
+
+
+class QueryBudgetTests(ActivityBufferMixin, QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_data(products=200, users=5, orders=40)
+        cls.user = User.objects.order_by('id').first()
+        cls.staff = User.objects.create_user('budget-staff', password='pass12345', is_staff=True)
+        cls.objects = budget_objects(cls.user)
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(route_names() - set(QUERY_BUDGETS), set())
+
+    def test_routes_stay_within_budget(self):
+        for name, budget in sorted(QUERY_BUDGETS.items()):
+            with self.subTest(route=name):
+                client = self.client_class()
+                if budget.login:
+                    client.force_login(self.staff if budget.staff else self.user)
+                self.assertWithinBudget(name, client, self.objects)
+
+    def test_representative_queries_use_indexes(self):
+        out = io.StringIO()
+        call_command('explain_queries', '--fail-on-scan', stdout=out)
+        self.assertIn('orders_by_user           OK', out.getvalue())
+
+
+class ReplicaRoutingTests(ActivityBufferMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.router = PrimaryReplicaRouter()
+
+    def test_only_catalog_reads_in_replica_context_use_replicas(self):
+        with self.settings(DATABASE_REPLICAS=['replica1']):
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+            token = enable_replica_reads()
+            try:
+                self.assertEqual(self.router.db_for_read(Product), 'replica1')
+                self.assertEqual(self.router.db_for_read(Cart), 'default')
+                self.assertEqual(self.router.db_for_write(Product), 'default')
+            finally:
+                reset_replica_reads(token)
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def route(self, method, view, cookies=None):
+        """Run a request through ReplicaRoutingMiddleware; returns (database for Product, response)"""
+        seen = []
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+
+        def get_response(request):
+            # The handler calls process_view inside the middleware chain
+            middleware.process_view(request, view, (), {})
+            seen.append(self.router.db_for_read(Product))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        with self.settings(DATABASE_REPLICAS=['replica1']):
+            response = middleware(request)
+        return seen[0], response
+
+    def test_catalog_views_read_replica_until_client_writes(self):
+        self.assertEqual(self.route('get', product_detail_view)[0], 'replica1')
+        self.assertEqual(self.route('get', ProductViewSet.as_view({'get': 'list'}))[0], 'replica1')
+        self.assertEqual(self.route('get', cart_view)[0], 'default')
+
+        db, response = self.route('post', product_detail_view)
+        self.assertEqual(db, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.route('get', product_detail_view, cookies={PIN_COOKIE: '1'})[0], 'default')
+
+    def test_cache_fills_read_the_primary(self):
+        cache.clear()
+        tiered_cache.reset_local()
+        seen = []
+
+        def get_response(request):
+            page_cache.process_view(request, product_detail_view, (), {})
+            seen.append(self.router.db_for_read(Product))
+            tiered_cache.get_or_set('catalog', 'replica-test', lambda: seen.append(self.router.db_for_read(Product)))
+            seen.append(self.router.db_for_read(Product))
+            return HttpResponse()
+
+        page_cache = AnonymousPageCacheMiddleware(get_response)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        token = enable_replica_reads()
+        try:
+            with self.settings(DATABASE_REPLICAS=['replica1']):
+                page_cache(request)
+                # A page cache miss builds the page from the primary...
+                self.assertEqual(seen, ['default', 'default', 'default'])
+                # ...and replica reads resume once the response is done
+                self.assertEqual(self.router.db_for_read(Product), 'replica1')
+                with primary_reads():
+                    self.assertEqual(self.router.db_for_read(Product), 'default')
+                seen.clear()
+                tiered_cache.get_or_set('catalog', 'replica-test-2', lambda: seen.append(self.router.db_for_read(Product)))
+                self.assertEqual(seen, ['default'])
+        finally:
+            reset_replica_reads(token)
+
+
+class ReplicaSyncTests(TransactionTestCase):
+    # SQLite can't back up a database while a TestCase transaction holds it
+
+    def test_sync_replicas_copies_primary(self):
+        Category.objects.create(name='Snacks', slug='snacks')
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'replica.sqlite3')
+        replica = {**settings.DATABASES['default'], 'NAME': path}
+        with mock.patch.dict(settings.DATABASES, {'replica1': replica}), \
+                self.settings(DATABASE_REPLICAS=['replica1']):
+            call_command('sync_replicas', stdout=io.StringIO())
+        with sqlite3.connect(path) as db:
+            self.assertEqual(db.execute('SELECT slug FROM store_category').fetchall(), [('snacks',)])
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_production_profile_pragmas_are_applied(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        settings_dict = {**connections['default'].settings_dict, 'NAME': os.path.join(tmpdir, 'db.sqlite3')}
+        with self.settings(DB_PROFILE='production', DATABASE_REPLICAS=['replica1']):
+            self.assertNotIn('journal_mode', sqlite_pragmas('replica1'))
+            # connection_created runs configure_sqlite
+            wrapper = type(connections['default'])(settings_dict, alias='profile-test')
+            self.addCleanup(wrapper.close)
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class AnonymousPageCacheTests(ActivityBufferMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        tiered_cache.local.clear()
+        self.product = Product.objects.create(
+            name='Whey', slug='whey', description='Protein', price=30, category='SUP', stock=10
+        )
+
+    def test_second_anonymous_request_is_served_from_cache(self):
+        url = reverse('product_detail', args=[self.product.id])
+        first = self.client.get(url)
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertContains(second, 'Whey')
+        # Every hit gets a usable CSRF token, not the stored placeholder
+        self.assertNotIn(b'__page_cache_csrf_token__', second.content)
+        self.assertContains(second, 'name="csrfmiddlewaretoken"')
+
+    def test_query_string_is_normalized(self):
+        self.client.get(reverse('product_list') + '?type=SUP&q=')
+        response = self.client.get(reverse('product_list') + '?type=SUP')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+    def test_catalog_change_invalidates_pages(self):
+        url = reverse('product_detail', args=[self.product.id])
+        self.client.get(url)
+        self.product.name = 'Whey Gold'
+        self.product.save()
+        tiered_cache.local.clear()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Whey Gold')
+
+    def test_visitors_with_state_are_not_cached(self):
+        url = reverse('product_list')
+        # An anonymous cart makes the page visitor-specific
+        self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 1})
+        self.client.cookies.pop('messages', None)
+        self.assertNotIn('X-Page-Cache', self.client.get(url))
+
+        user = User.objects.create_user('cached-user', password='pass12345')
+        client = self.client_class()
+        client.force_login(user)
+        self.assertNotIn('X-Page-Cache', client.get(url))
+
+
+class ProductCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tiered_cache.local.clear()
+        self.products = [
+            Product.objects.create(
+                name=f'Card {n}', slug=f'card-{n}', description='Protein', price=20 + n, category='SUP', stock=20
+            )
+            for n in range(3)
+        ]
+
+    def render(self, products, variant='list', csrf_token='token123'):
+        return Template("{% load product_cards %}{% product_cards products variant %}").render(
+            Context({'products': products, 'variant': variant, 'csrf_token': csrf_token})
+        )
+
+    def test_cards_are_fetched_in_one_lookup(self):
+        first = self.render(self.products)
+        with mock.patch.object(tiered_cache, 'get_many', wraps=tiered_cache.get_many) as get_many, \
+                mock.patch('store.templatetags.product_cards.get_template') as get_template:
+            self.assertEqual(self.render(self.products), first)
+        get_many.assert_called_once()
+        get_template.assert_not_called()
+        for product in self.products:
+            self.assertIn(product.name, first)
+
+    def test_csrf_token_is_per_render(self):
+        self.render(self.products)
+        html = self.render(self.products, csrf_token='othertoken')
+        self.assertIn('value="othertoken"', html)
+        self.assertNotIn('token123', html)
+
+    def test_saving_a_product_rerenders_only_its_card(self):
+        self.render(self.products)
+        product = self.products[1]
+        product.name = 'Card renamed'
+        product.save()
+        with mock.patch.object(tiered_cache, 'set_many', wraps=tiered_cache.set_many) as set_many:
+            html = self.render(self.products)
+        self.assertIn('Card renamed', html)
+        rendered = set_many.call_args[0][1]
+        self.assertEqual(len(rendered), 1)
+        self.assertEqual(html.count('class="card h-100"'), 3)
+
+
+class ProductValueRankingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tiered_cache.local.clear()
+
+    def product(self, slug, price, protein, calories, **kwargs):
+        return Product.objects.create(
+            name=slug.title(), slug=slug, description='Whey protein', price=price, category='SUP',
+            protein_per_serving=protein, carbs_per_serving=2, fat_per_serving=1,
+            calories_per_serving=calories, stock=10, **kwargs
+        )
+
+    def test_rankings_are_maintained_on_save(self):
+        product = self.product('whey', price=40, protein=24, calories=120)
+        self.assertEqual((product.protein_per_dollar, product.protein_per_100kcal), (0.6, 20.0))
+
+        product.price = 30
+        product.save(update_fields=['price'])
+        product.refresh_from_db()
+        self.assertEqual(product.protein_per_dollar, 0.8)
+
+        product.protein_per_serving = None
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual((product.protein_per_dollar, product.protein_per_100kcal), (None, None))
+
+    def test_nutrition_range_filters(self):
+        self.product('lean', price=40, protein=24, calories=110)
+        self.product('mass', price=50, protein=30, calories=750)
+        self.product('bar', price=3, protein=10, calories=200)
+
+        def slugs(**params):
+            response = self.client.get(reverse('product-list'), params)
+            return sorted(item['slug'] for item in response.json()['results'])
+
+        self.assertEqual(slugs(min_protein=20, max_calories=300), ['lean'])
+        self.assertEqual(slugs(min_price=10, max_price=45), ['lean'])
+        self.assertEqual(slugs(min_protein_per_100kcal=5), ['bar', 'lean'])
+        self.assertEqual(self.client.get(reverse('product-list'), {'min_fat': 'x'}).status_code, 400)
+
+    def test_best_value_ranking(self):
+        self.product('lean', price=40, protein=24, calories=110)
+        self.product('mass', price=50, protein=30, calories=750)
+        self.product('bar', price=3, protein=10, calories=200)
+        self.product('hidden', price=1, protein=30, calories=120, is_active=False)
+        Product.objects.create(name='Shaker', slug='shaker', description='Whey shaker', price=5, category='EQU')
+
+        def ranked(**params):
+            response = self.client.get(reverse('product-best-value'), params)
+            return [item['slug'] for item in response.json()['results']]
+
+        self.assertEqual(ranked(), ['bar', 'lean', 'mass'])
+        self.assertEqual(ranked(rank='protein_per_100kcal'), ['lean', 'bar', 'mass'])
+        self.assertEqual(ranked(search='whey', min_protein=20), ['lean', 'mass'])
+        self.assertEqual(self.client.get(reverse('product-best-value'), {'rank': 'price'}).status_code, 400)
@@ -1,9 +1,17 @@
-from .models import Cart
+from django.db import transaction
+
+from .models import Cart, CartItem
 
 def get_or_create_cart(request):
     """
-    Get existing cart or create new one based on user session
+    Get existing cart or create new one based on user session. The cart is
+    kept on the request so views and the cart_items_count context processor
+    share one lookup.
     """
+    cart = getattr(request, '_cart', None)
+    if cart is not None:
+        return cart
+    
     if request.user.is_authenticated:
         cart, created = Cart.objects.get_or_create(user=request.user)
     else:
@@ -14,4 +22,22 @@ def get_or_create_cart(request):
         
         cart, created = Cart.objects.get_or_create(session_key=session_key, user=None)
     
-    return cart
\ No newline at end of file
+    request._cart = cart
+    return cart
+
+def add_products_to_cart(cart, quantities):
+    """
+    Add {product_id: quantity} to the cart in one transaction: one query to
+    read the existing items, one bulk update and one bulk insert.
+    """
+    with transaction.atomic():
+        existing = {item.product_id: item for item in cart.items.filter(product_id__in=quantities)}
+        for product_id, item in existing.items():
+            item.quantity += quantities[product_id]
+        if existing:
+            CartItem.objects.bulk_update(existing.values(), ['quantity'])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+            if product_id not in existing
+        ])
@@ -1,60 +1,87 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db.models import Q, prefetch_related_objects
+from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
+import logging
 
 from .models import Product, Cart, CartItem, Order, OrderItem, Category, UserProfile
 from .forms import ProductForm, CheckoutForm, UserProfileForm
 from .utils import get_or_create_cart
+from .cache import tiered_cache
+from fitpowerhub.page_cache import cache_anonymous_page
+from fitpowerhub.routers import replica_reads
 
+logger = logging.getLogger(__name__)
+
+# Columns used by store/cards/list.html (and card_key)
+LIST_CARD_FIELDS = (
+    'id', 'name', 'description', 'price', 'category', 'image', 'stock',
+    'protein_per_serving', 'carbs_per_serving', 'updated_at',
+)
+
+@cache_anonymous_page
+@replica_reads
 def home_view(request):
     """Home page view"""
     try:
-        featured_products = Product.objects.filter(is_active=True).order_by('-created_at')[:4]
-        supplements = Product.objects.filter(category='SUP', is_active=True)[:3]
-        equipment = Product.objects.filter(category='EQU', is_active=True)[:3]
-        
-        context = {
-            'featured_products': featured_products,
-            'supplements': supplements,
-            'equipment': equipment,
-        }
-    except Exception as e:
-        print(f"Error in home_view: {e}")
+        context = tiered_cache.get_or_set('catalog', 'home', lambda: {
+            'featured_products': list(Product.objects.filter(is_active=True).order_by('-created_at')[:4]),
+            'supplements': list(Product.objects.filter(category='SUP', is_active=True)[:3]),
+            'equipment': list(Product.objects.filter(category='EQU', is_active=True)[:3]),
+        })
+    except Exception:
+        logger.exception("Error in home_view")
         context = {}
     
     return render(request, 'store/home.html', context)
 
+@cache_anonymous_page
+@replica_reads
 def product_list_view(request):
     """Product listing view"""
     category_filter = request.GET.get('category', '')
     type_filter = request.GET.get('type', '')  # Filter by product category (SUP, CLO, EQU, FOO)
     search_query = request.GET.get('q', '')
+    categories = tiered_cache.get_or_set('categories', 'all', lambda: list(Category.objects.all()))
     
-    # Local products
-    local_products = Product.objects.filter(is_active=True)
-    
-    # Filter by main category (Category model)
-    if category_filter:
-        local_products = local_products.filter(main_category__slug=category_filter)
-    
-    # Filter by product type (SUP, CLO, EQU, FOO)
-    if type_filter:
-        local_products = local_products.filter(category=type_filter)
+    def load_products():
+        # Local products, with only the columns the product cards show
+        local_products = Product.objects.filter(is_active=True).only(*LIST_CARD_FIELDS)
+        
+        # Filter by main category (Category model)
+        if category_filter:
+            local_products = local_products.filter(main_category__slug=category_filter)
+        
+        # Filter by product type (SUP, CLO, EQU, FOO)
+        if type_filter:
+            local_products = local_products.filter(category=type_filter)
+        
+        # Filter by search
+        if search_query:
+            local_products = local_products.filter(
+                Q(name__icontains=search_query) | 
+                Q(description__icontains=search_query)
+            )
+        return list(local_products)
     
-    # Filter by search
-    if search_query:
-        local_products = local_products.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
+    # Only the fixed set of category/type listings is cached; free-text
+    # searches (and unknown filter values) would each add another copy
+    cacheable = (
+        not search_query
+        and type_filter in ('', *dict(Product.CATEGORY_CHOICES))
+        and (not category_filter or any(category.slug == category_filter for category in categories))
+    )
+    if cacheable:
+        local_products = tiered_cache.get_or_set('catalog', f"list:{category_filter}:{type_filter}", load_products)
+    else:
+        local_products = load_products()
     
     context = {
         'products': local_products,
-        'categories': Category.objects.all(),
+        'categories': categories,
         'search_query': search_query,
         'current_category': category_filter,
         'current_type': type_filter,
@@ -62,26 +89,36 @@ def product_list_view(request):
     
     return render(request, 'store/product_list.html', context)
 
+@cache_anonymous_page
+@replica_reads
 def product_detail_view(request, product_id):
     """Product detail view"""
-    product = get_object_or_404(Product, id=product_id, is_active=True)
+    def load_product():
+        product = Product.objects.select_related('main_category').filter(id=product_id, is_active=True).first()
+        if product is None:
+            return None
+        
+        # Get recommended products (same category)
+        recommended = Product.objects.filter(
+            category=product.category,
+            is_active=True
+        ).exclude(id=product_id)[:4]
+        
+        return {
+            'product': product,
+            'recommended_products': list(recommended),
+        }
     
-    # Get recommended products (same category)
-    recommended = Product.objects.filter(
-        category=product.category,
-        is_active=True
-    ).exclude(id=product_id)[:4]
-    
-    context = {
-        'product': product,
-        'recommended_products': recommended,
-    }
+    context = tiered_cache.get_or_set('catalog', f"detail:{product_id}", load_product)
+    if context is None:
+        raise Http404("No Product matches the given query.")
     
     return render(request, 'store/product_detail.html', context)
 
 def cart_view(request):
     """Shopping cart view"""
     cart = get_or_create_cart(request)
+    prefetch_related_objects([cart], 'items__product')
     context = {
         'cart': cart,
         'cart_items': cart.items.all()
@@ -157,8 +194,9 @@ def update_cart_item(request, item_id):
 def checkout_view(request):
     """Checkout process"""
     cart = get_or_create_cart(request)
+    prefetch_related_objects([cart], 'items__product')
     
-    if cart.items.count() == 0:
+    if not cart.items.all():
         messages.warning(request, 'Your cart is empty')
         return redirect('cart')
     
@@ -176,13 +214,15 @@ def checkout_view(request):
                 )
                 
                 # Create order items
-                for cart_item in cart.items.all():
-                    OrderItem.objects.create(
+                OrderItem.objects.bulk_create([
+                    OrderItem(
                         order=order,
                         product=cart_item.product,
                         quantity=cart_item.quantity,
                         price=cart_item.product.price
                     )
+                    for cart_item in cart.items.all()
+                ])
                 
                 # Clear cart
                 cart.items.all().delete()
@@ -207,7 +247,8 @@ def checkout_view(request):
     
     context = {
         'form': form,
-        'cart': cart
+        'cart': cart,
+        'cart_items': cart.items.all()
     }
     return render(request, 'store/checkout.html', context)
 
@@ -217,7 +258,7 @@ def order_summary_view(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     context = {
         'order': order,
-        'order_items': order.items.all()
+        'order_items': order.items.select_related('product')
     }
     return render(request, 'store/order_summary.html', context)
 
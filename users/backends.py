@@ -0,0 +1,136 @@
+"""
+Authentication backend that serves request.user from the shared cache.
+
+AuthenticationMiddleware asks the session's backend for the user on every
+authenticated request, and many views then read request.user.profile.
+CachedModelBackend answers from a snapshot of the user's and profile's
+column values, loaded with one joined query on a miss. Saving or deleting a
+User or UserProfile drops the snapshot (see users.signals); code that
+changes them with QuerySet.update() calls forget_user().
+
+Opt in with CACHED_AUTH['ENABLED'] (see settings), which also switches
+sessions to the cached_db engine so authenticated requests need no
+auth-related queries at all. The snapshot goes to the shared cache only,
+never a per-process tier, so a password change or deactivation takes
+effect everywhere on the next request.
+
+Every user also has a version counter in the cache. forget_user() bumps it
+(again on commit), and a snapshot only counts if it was stored under the
+current version, read before the rows were. A request that loaded the
+user just before a change committed therefore can't keep serving it.
+
+The snapshot includes the password hash, which verifies the session on
+every request. CACHE_ALIAS must name a cache that is neither persisted nor
+reachable beyond the app servers (Redis or Memcached on a private
+network); the file-based default cache is only fit for development.
+"""
+import time
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+
+from store.models import UserProfile
+
+BACKEND_PATH = 'users.backends.CachedModelBackend'
+
+
+def _config():
+    return getattr(settings, 'CACHED_AUTH', {})
+
+
+def _cache():
+    return caches[_config().get('CACHE_ALIAS', 'default')]
+
+
+def snapshot_key(user_id):
+    return f"auth_user:{user_id}"
+
+
+def version_key(user_id):
+    return f"auth_user_version:{user_id}"
+
+
+def _bump_version(user_id):
+    try:
+        _cache().incr(version_key(user_id))
+    except ValueError:
+        # Start from a timestamp so a lost counter never reuses an old version
+        _cache().set(version_key(user_id), int(time.time() * 1000), None)
+
+
+def forget_user(user_id):
+    """
+    Outdate a user's cached snapshot; the next request reloads it. Done
+    again on commit, in case a request cached the old rows meanwhile.
+    """
+    if BACKEND_PATH not in settings.AUTHENTICATION_BACKENDS:
+        return
+    _bump_version(user_id)
+    transaction.on_commit(lambda: _bump_version(user_id))
+
+
+def _values(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def _restore(model, values):
+    """
+    Instance from cached column values, or None when one of the model's
+    columns is missing (the snapshot was taken before a migration)
+    """
+    attnames = [field.attname for field in model._meta.concrete_fields]
+    if not all(attname in values for attname in attnames):
+        return None
+    return model.from_db('default', attnames, [values[attname] for attname in attnames])
+
+
+def make_snapshot(user, version):
+    """Column values (by attname) of user and (if any) its profile, as cached"""
+    try:
+        profile = _values(user.profile)
+    except UserProfile.DoesNotExist:
+        profile = None
+    return {'version': version, 'user': _values(user), 'profile': profile}
+
+
+def restore_snapshot(snapshot):
+    """A User with its profile (or its absence) already loaded; None if the snapshot is outdated"""
+    user = _restore(User, snapshot['user'])
+    if user is None:
+        return None
+    if snapshot['profile'] is None:
+        User.profile.related.set_cached_value(user, None)
+        return user
+    profile = _restore(UserProfile, snapshot['profile'])
+    if profile is None:
+        return None
+    user.profile = profile
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() reads the user and profile snapshot from the cache"""
+
+    def get_user(self, user_id):
+        cache = _cache()
+        key = snapshot_key(user_id)
+        found = cache.get_many([key, version_key(user_id)])
+        version = found.get(version_key(user_id))
+        if version is None:
+            version = int(time.time() * 1000)
+            if not cache.add(version_key(user_id), version, None):
+                version = cache.get(version_key(user_id), version)
+
+        snapshot = found.get(key)
+        user = None
+        if snapshot is not None and snapshot.get('version') == version:
+            user = restore_snapshot(snapshot)
+        if user is None:
+            # version was read first: a change committed from here on bumps it
+            user = User._default_manager.select_related('profile').filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(key, make_snapshot(user, version), _config().get('TIMEOUT', 300))
+        return user if self.user_can_authenticate(user) else None
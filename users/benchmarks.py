@@ -0,0 +1,22 @@
+"""Benchmark scenarios for the users app (run with manage.py benchmark)"""
+from django.urls import reverse
+
+from fitpowerhub.benchmark import scenario
+
+
+# Password hashing dominates signups and logins; requests are limited so a
+# run stays short
+@scenario('register', requests=50)
+def register(client, data, i):
+    client.logout()
+    return client.post(reverse('register'), {
+        'username': f'signup{i}', 'email': f'signup{i}@example.com',
+        'password1': data['password'], 'password2': data['password'],
+    })
+
+
+@scenario('login', requests=50)
+def login(client, data, i):
+    client.logout()
+    user_id = data['user_ids'][i % len(data['user_ids'])]
+    return client.post(reverse('login'), {'username': f'gen{user_id}', 'password': data['password']})
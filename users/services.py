@@ -0,0 +1,55 @@
+"""
+Account services shared by the registration view and anything else that
+signs users up (e.g. the benchmark).
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+
+class RegistrationError(Exception):
+    """The username or email is already taken; the message says which"""
+
+
+def taken_fields(username, email):
+    """'username' and/or 'email' if another account uses them, in one query"""
+    taken = set()
+    for existing_username, existing_email in (
+        User.objects.filter(Q(username=username) | Q(email=email)).values_list('username', 'email')[:2]
+    ):
+        if existing_username == username:
+            taken.add('username')
+        if existing_email == email:
+            taken.add('email')
+    return taken
+
+
+def register_user(username, email, password, first_name='', last_name=''):
+    """
+    Check that the username and email are free (one query), then create
+    the user in one transaction, in which the post_save signal in
+    store.signals creates the profile. Raises RegistrationError.
+    """
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+        first_name=first_name,
+        last_name=last_name,
+    )
+    # Hashing is most of the cost of a signup; keep it out of the transaction
+    user.set_password(password)
+
+    taken = taken_fields(user.username, user.email)
+    if 'username' in taken:
+        raise RegistrationError('Username already exists')
+    if 'email' in taken:
+        raise RegistrationError('Email already registered')
+    # Only writes inside: on SQLite, a transaction that reads first can't
+    # wait for the write lock and fails when another writer holds it
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        # Someone registered the same username since the check
+        raise RegistrationError('Username already exists')
+    return user
@@ -1,3 +1,230 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from fitpowerhub.testing import ActivityBufferMixin
+from nutrition.progress import log_metrics
+from store.activity import active_users_per_day, compact_activity, purge_activity, rollup_activity, top_paths
+from store.models import UserActivity, UserActivityHourly, UserProfile
+
+from .backends import BACKEND_PATH, CachedModelBackend, forget_user, make_snapshot, snapshot_key
+from .services import RegistrationError, register_user, taken_fields
+
+
+class UserActivityMiddlewareTests(ActivityBufferMixin, TestCase):
+    activity_buffer_options = {'max_size': 3, 'batch_size': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='athlete', password='pass12345')
+
+    def test_requests_are_buffered_until_flush(self):
+        self.client.force_login(self.user)
+        self.client.get('/store/')
+        self.client.get('/store/cart/')
+        self.assertEqual(UserActivity.objects.count(), 0)
+
+        self.activity_buffer.flush()
+        paths = set(UserActivity.objects.filter(user=self.user).values_list('path', flat=True))
+        self.assertEqual(paths, {'/store/', '/store/cart/'})
+        self.assertEqual(self.activity_buffer.written, 2)
+
+    def test_anonymous_requests_are_not_recorded(self):
+        self.client.get('/store/')
+        self.activity_buffer.flush()
+        self.assertEqual(UserActivity.objects.count(), 0)
+
+    def test_overflow_is_dropped_and_counted(self):
+        self.client.force_login(self.user)
+        for _ in range(5):
+            self.client.get('/store/')
+        self.assertEqual(self.activity_buffer.dropped, 2)
+        self.activity_buffer.flush()
+        self.assertEqual(UserActivity.objects.count(), 3)
+
+
+class ActivityCompactionTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+
+    def log(self, user, path, hours_ago):
+        UserActivity.objects.create(user=user, path=path, method='GET', timestamp=self.now - timedelta(hours=hours_ago))
+
+    def test_rollup_and_reports(self):
+        self.log(self.alice, '/store/', 3)
+        self.log(self.alice, '/store/', 3)
+        self.log(self.bob, '/store/', 2)
+        self.log(self.bob, '/nutrition/', 2)
+        self.log(self.bob, '/store/', 0)  # current hour, not settled yet
+
+        self.assertEqual(rollup_activity(now=self.now), 3)
+        self.assertEqual(UserActivityHourly.objects.get(user=self.alice).hits, 2)
+
+        start, end = self.now - timedelta(days=2), self.now + timedelta(days=1)
+        self.assertEqual(sum(day['users'] for day in active_users_per_day(start, end)), 2)
+        self.assertEqual(top_paths(start, end)[0], {'path': '/store/', 'hits': 3})
+
+        # Running again only recomputes the last hour
+        self.log(self.alice, '/nutrition/', 2)
+        rollup_activity(now=self.now)
+        self.assertEqual(top_paths(start, end), [{'path': '/store/', 'hits': 3}, {'path': '/nutrition/', 'hits': 2}])
+
+    def test_purge_keeps_recent_and_unrolled_rows(self):
+        self.log(self.alice, '/old/', 24 * 40)
+        self.log(self.alice, '/recent/', 24)
+        self.assertEqual(purge_activity(retention_days=30, now=self.now), 0)
+
+        stats = compact_activity(retention_days=30, batch_size=1, now=self.now)
+        self.assertEqual(stats['purged'], 1)
+        self.assertEqual(list(UserActivity.objects.values_list('path', flat=True)), ['/recent/'])
+
+
+class RegistrationTests(ActivityBufferMixin, TestCase):
+    def post(self, **overrides):
+        data = {
+            'username': 'newlifter', 'email': 'new@example.com',
+            'password1': 'strong-pass-123', 'password2': 'strong-pass-123',
+        }
+        return self.client.post(reverse('register'), {**data, **overrides})
+
+    def test_register_creates_user_and_one_profile_and_logs_in(self):
+        response = self.post(first_name='Nia')
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        user = User.objects.get(username='newlifter')
+        self.assertEqual(user.first_name, 'Nia')
+        self.assertEqual(UserProfile.objects.filter(user=user).count(), 1)
+        self.assertEqual(self.client.session['_auth_user_id'], str(user.id))
+
+    def test_taken_username_and_email_are_found_in_one_query(self):
+        User.objects.create_user('taken', email='taken@example.com', password='pass12345')
+        with self.assertNumQueries(1):
+            self.assertEqual(taken_fields('taken', 'taken@example.com'), {'username', 'email'})
+        with self.assertNumQueries(1):
+            self.assertEqual(taken_fields('other', 'taken@example.com'), {'email'})
+
+        with self.assertRaisesMessage(RegistrationError, 'Username already exists'):
+            register_user('taken', 'fresh@example.com', 'strong-pass-123')
+        response = self.post(email='taken@example.com')
+        self.assertContains(response, 'Email already registered')
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_username_race_is_reported_not_raised(self):
+        User.objects.create_user('racer', password='pass12345')
+        with mock.patch('users.services.taken_fields', return_value=set()):
+            with self.assertRaisesMessage(RegistrationError, 'Username already exists'):
+                register_user('racer', 'racer@example.com', 'strong-pass-123')
+
+
+class LoginQueryTests(ActivityBufferMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('returning', password='pass12345')
+
+    def test_login_does_not_write_the_profile(self):
+        # User lookup, session insert (existence check, savepoint pair),
+        # last_login update, session key cycle (savepoint pair); the profile
+        # is neither read nor written
+        with CaptureQueriesContext(connection) as context, self.assertNumQueries(9):
+            response = self.client.post(reverse('login'), {'username': 'returning', 'password': 'pass12345'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertFalse([query for query in context.captured_queries if 'store_userprofile' in query['sql']])
+
+    def test_user_saves_leave_the_profile_alone(self):
+        profile = self.user.profile
+        UserProfile.objects.filter(user=self.user).update(weight=82)
+        self.user.first_name = 'Sam'
+        self.user.save()
+        # Saving the user used to write back its stale cached profile
+        profile.refresh_from_db()
+        self.assertEqual(profile.weight, 82)
+
+
+@override_settings(
+    AUTHENTICATION_BACKENDS=[BACKEND_PATH, 'django.contrib.auth.backends.ModelBackend'],
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+)
+class CachedAuthTests(ActivityBufferMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user('cached', password='pass12345')
+        self.client.force_login(self.user)
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        tables = ('django_session', 'auth_user', 'store_userprofile')
+        return response, [query['sql'] for query in context.captured_queries
+                          if any(table in query['sql'] for table in tables)]
+
+    def test_warm_requests_make_no_auth_queries(self):
+        response, queries = self.auth_queries(reverse('profile'))
+        # Cold: one query for the user joined with the profile
+        self.assertEqual(len(queries), 1, queries)
+        self.assertIn('store_userprofile', queries[0])
+
+        response, queries = self.auth_queries(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_saves_and_updates_invalidate_the_snapshot(self):
+        self.client.get(reverse('profile'))
+        self.client.post(reverse('profile'), {'gender': 'F', 'fitness_goal': 'Deadlift 200'})
+        response, queries = self.auth_queries(reverse('profile'))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.context['user'].profile.fitness_goal, 'Deadlift 200')
+
+        log_metrics(self.user, timezone.localdate(), weight=77.5)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['user'].profile.weight, 77.5)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_change_committed_while_caching_is_not_served(self):
+        backend = CachedModelBackend()
+
+        def racing_snapshot(user, version):
+            # Deactivated after this request read the user, before it cached it
+            User.objects.filter(pk=user.pk).update(is_active=False)
+            forget_user(user.pk)
+            return make_snapshot(user, version)
+
+        with mock.patch('users.backends.make_snapshot', racing_snapshot), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNotNone(backend.get_user(self.user.pk))
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+    def test_snapshot_from_before_a_migration_is_reloaded(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        snapshot = cache.get(snapshot_key(self.user.pk))
+        # A column added since the snapshot was cached, one since removed
+        del snapshot['profile']['weight']
+        snapshot['user']['nickname'] = 'old'
+        cache.set(snapshot_key(self.user.pk), snapshot)
+
+        with self.assertNumQueries(1):
+            user = backend.get_user(self.user.pk)
+        self.assertEqual(user.username, 'cached')
+        self.assertIn('weight', cache.get(snapshot_key(self.user.pk))['profile'])
+
+    def test_users_without_a_profile(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        self.client.get(reverse('home'))
+        user = CachedModelBackend().get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(hasattr(user, 'profile'))
@@ -1,8 +1,8 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth.models import User
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, authenticate
-from store.models import UserProfile
+from .services import RegistrationError, register_user
 
 def register_view(request):
     """User registration view"""
@@ -28,35 +28,23 @@ def register_view(request):
             messages.error(request, 'Password must be at least 8 characters')
             return render(request, 'store/register.html')
         
-        if User.objects.filter(username=username).exists():
-            messages.error(request, 'Username already exists')
-            return render(request, 'store/register.html')
-        
-        if User.objects.filter(email=email).exists():
-            messages.error(request, 'Email already registered')
-            return render(request, 'store/register.html')
-        
         try:
-            # Create user
-            user = User.objects.create_user(
+            user = register_user(
                 username=username,
                 email=email,
                 password=password1,
                 first_name=first_name,
                 last_name=last_name
             )
-            
-            # Create profile
-            UserProfile.objects.create(user=user)
-            
-            # Login automatically
-            login(request, user)
-            
-            messages.success(request, 'Registration successful! Welcome to FitPower Hub.')
-            return redirect('home')
-            
-        except Exception as e:
-            messages.error(request, f'Error creating user: {str(e)}')
+        except RegistrationError as e:
+            messages.error(request, str(e))
+            return render(request, 'store/register.html')
+        
+        # Login automatically; the first backend, as several may be configured
+        login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
+        
+        messages.success(request, 'Registration successful! Welcome to FitPower Hub.')
+        return redirect('home')
     
     return render(request, 'store/register.html')
 